@@ -17,6 +17,7 @@ NAV_ITEMS = [
     ("Memnuniyet Sürücüleri", "/memnuniyet"),
     ("Finansal Özet", "/"),
     ("Portföy Optimizasyonu", "/satici-etkisi"),
+    ("Ürün Portföyü", "/urun-etkisi"),
     ("Metodoloji", "/hakkinda"),
 ]
 
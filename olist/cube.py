@@ -0,0 +1,230 @@
+import numpy as np
+import pandas as pd
+from olist.join_index import STARS, get_join_index, review_costs, star_stats
+from olist.keys import ids
+
+UNKNOWN_CATEGORY = "unknown"
+
+
+def month_code(date):
+    """
+    Returns the month index (year * 12 + month - 1) of `date` (string, Timestamp or Period).
+    """
+    period = pd.Period(date, freq="M")
+    return period.year * 12 + period.month - 1
+
+
+def _first_of_month(codes):
+    years, months = np.divmod(np.asarray(codes, dtype=np.int64), 12)
+    return pd.to_datetime({"year": years, "month": months + 1, "day": 1})
+
+
+class SalesCube:
+    """
+    Sales, item counts, star counts and review costs aggregated once by
+    seller x product category x month (of the order purchase), stored as the sparse list
+    of non-empty cells sorted by month.
+
+    A date range is then a contiguous slice of cells (binary search on the month) and a
+    category filter a mask over it, so sellers and categories are summarized in
+    milliseconds for any period instead of rerunning `get_training_data`.
+
+    Star counts are kept per cell, so the cost of reviews of any slice is re-priced for
+    any `cost_map` ({stars: cost}) with a dot product.
+
+    Reviews are counted once per (seller, order) as in `Seller.get_training_data()`: when
+    the items of a seller in an order span k categories, each of their cells gets 1/k of
+    the order's stars, so seller totals are exact and category totals are an even split.
+    """
+
+    def __init__(self, data):
+        index = get_join_index(data)
+        items = data.table("order_items", ["order_id", "seller_id", "product_id", "price"])
+        orders = data.table("orders", ["order_id", "order_purchase_timestamp", "order_approved_at"])
+        orders = orders.set_index("order_id")
+        orders.index = orders.index.astype(object)
+        per_item = orders.reindex(items["order_id"].astype(object))
+
+        # Category of every item (English name when translated)
+        products = data.table("products", ["product_id", "product_category_name"])
+        translation = data.table("product_category_name_translation",
+                                 ["product_category_name", "product_category_name_english"])
+        english = dict(zip(translation["product_category_name"].astype(object),
+                           translation["product_category_name_english"].astype(object)))
+        names = products["product_category_name"].astype(object)
+        labels = names.map(english).fillna(names).fillna(UNKNOWN_CATEGORY)
+        per_product = pd.Series(labels.to_numpy(), index=products["product_id"].astype(object))
+        per_product = per_product[~per_product.index.duplicated()]
+        item_labels = per_product.reindex(items["product_id"].astype(object)).fillna(UNKNOWN_CATEGORY)
+        self.categories = np.sort(item_labels.unique())
+        categories = np.searchsorted(self.categories, item_labels.to_numpy())
+
+        purchased = per_item["order_purchase_timestamp"]
+        sellers = ids.encode(items["seller_id"], "seller_id")
+        known = (sellers >= 0) & purchased.notna().to_numpy()
+        months = np.where(known, purchased.dt.year * 12 + purchased.dt.month - 1, 0).astype(np.int64)
+
+        # Cells: (month, seller, category) keys, month first so that cells are sorted by month
+        self.n_sellers = ids.size("seller_id")
+        n_categories = len(self.categories)
+        keys = (months * self.n_sellers + sellers) * n_categories + categories
+        cells, item_cells = np.unique(keys[known], return_inverse=True)
+        rest, self.category = np.divmod(cells, n_categories)
+        self.month, self.seller = np.divmod(rest, self.n_sellers)
+        n_cells = len(cells)
+
+        self.sales = np.bincount(item_cells, weights=np.nan_to_num(items["price"].to_numpy(dtype=float)[known]),
+                                 minlength=n_cells)
+        self.n_items = np.bincount(item_cells, minlength=n_cells)
+
+        # First and last approval of the orders of every cell (int64 ns)
+        approved = per_item["order_approved_at"].to_numpy(dtype="datetime64[ns]")[known]
+        dated = ~np.isnat(approved)
+        self.first_sale = np.full(n_cells, np.iinfo(np.int64).max)
+        self.last_sale = np.full(n_cells, np.iinfo(np.int64).min)
+        np.minimum.at(self.first_sale, item_cells[dated], approved[dated].view(np.int64))
+        np.maximum.at(self.last_sale, item_cells[dated], approved[dated].view(np.int64))
+
+        # Star histogram of every order, split over the categories of each (seller, order)
+        reviews = data.table("order_reviews", ["order_id", "review_score"])
+        review_orders = index.order_keys(reviews["order_id"])
+        scores = reviews["review_score"].to_numpy(dtype=float, na_value=np.nan)
+        valid = (review_orders >= 0) & np.isin(scores, STARS)
+        order_stars = np.zeros((index.n_orders, len(STARS)))
+        np.add.at(order_stars, (review_orders[valid], scores[valid].astype(np.int64) - 1), 1)
+
+        order_keys = index.order_keys(items["order_id"])[known]
+        triples = np.unique(np.stack([order_keys, sellers[known], item_cells]), axis=1)
+        pairs = triples[0] * self.n_sellers + triples[1]
+        _, pair_index, n_categories_of_pair = np.unique(pairs, return_inverse=True, return_counts=True)
+        weights = 1 / n_categories_of_pair[pair_index]
+        self.stars = np.zeros((n_cells, len(STARS)))
+        np.add.at(self.stars, triples[2], order_stars[triples[0]] * weights[:, None])
+
+    @property
+    def months(self):
+        """
+        Returns the months covered by the cube, as the first day of each month.
+        """
+        return _first_of_month(np.unique(self.month))
+
+    def cells(self, start=None, end=None, categories=None):
+        """
+        Returns the positions of the cells from the month of `start` to the month of `end`
+        (both included, open-ended when None), restricted to `categories` when given.
+        """
+        lo = 0 if start is None else np.searchsorted(self.month, month_code(start), side="left")
+        hi = len(self.month) if end is None else np.searchsorted(self.month, month_code(end), side="right")
+        positions = np.arange(lo, hi)
+        if categories is not None:
+            codes = pd.Index(self.categories).get_indexer(list(categories))
+            positions = positions[np.isin(self.category[positions], codes)]
+        return positions
+
+    def _totals(self, keys, n, positions):
+        # Sums of the measures of `positions` grouped by `keys` (int keys < n)
+        def total(weights=None):
+            return np.bincount(keys, weights=weights, minlength=n)
+
+        stars = np.column_stack([total(self.stars[positions, star]) for star in range(len(STARS))])
+        return {
+            "sales": total(self.sales[positions]),
+            "quantity": total(self.n_items[positions]).astype(np.int64),
+            "stars": stars,
+        }
+
+    def by_seller(self, start=None, end=None, categories=None, cost_map=None) -> pd.DataFrame:
+        """
+        Returns, for every seller with items in the period (and categories):
+        seller_id, sales, quantity, date_first_sale, date_last_sale, months_on_olist,
+        share_of_one_stars, share_of_five_stars, review_score, cost_of_reviews, revenues, profits
+        """
+        positions = self.cells(start, end, categories)
+        keys = self.seller[positions]
+        totals = self._totals(keys, self.n_sellers, positions)
+        first_sale = np.full(self.n_sellers, np.iinfo(np.int64).max)
+        last_sale = np.full(self.n_sellers, np.iinfo(np.int64).min)
+        np.minimum.at(first_sale, keys, self.first_sale[positions])
+        np.maximum.at(last_sale, keys, self.last_sale[positions])
+
+        keep = np.flatnonzero(totals["quantity"] > 0)
+        undated = first_sale[keep] > last_sale[keep]
+        df = pd.DataFrame({
+            "seller_id": ids.decode(keep, "seller_id"),
+            "sales": totals["sales"][keep],
+            "quantity": totals["quantity"][keep],
+            "date_first_sale": pd.Series(first_sale[keep].view("datetime64[ns]")).mask(undated),
+            "date_last_sale": pd.Series(last_sale[keep].view("datetime64[ns]")).mask(undated),
+        })
+        df["months_on_olist"] = ((df["date_last_sale"] - df["date_first_sale"]) / np.timedelta64(30, "D")).round()
+        stars = totals["stars"][keep]
+        df = pd.concat([df, star_stats(stars)], axis=1)
+        df["cost_of_reviews"] = review_costs(stars, cost_map)
+        df["revenues"] = 0.1 * df["sales"] + 80 * df["months_on_olist"].fillna(0)
+        df["profits"] = df["revenues"] - df["cost_of_reviews"]
+        return df
+
+    def by_category(self, start=None, end=None, categories=None, cost_map=None) -> pd.DataFrame:
+        """
+        Returns, for every category with items in the period:
+        category, sales, quantity, n_sellers, share_of_one_stars, share_of_five_stars,
+        review_score, cost_of_reviews, revenues, profits
+        """
+        positions = self.cells(start, end, categories)
+        keys = self.category[positions]
+        n = len(self.categories)
+        totals = self._totals(keys, n, positions)
+        pairs = np.unique(keys.astype(np.int64) * self.n_sellers + self.seller[positions])
+        n_sellers = np.bincount(pairs // self.n_sellers, minlength=n)
+
+        keep = np.flatnonzero(totals["quantity"] > 0)
+        stars = totals["stars"][keep]
+        df = pd.DataFrame({
+            "category": self.categories[keep],
+            "sales": totals["sales"][keep],
+            "quantity": totals["quantity"][keep],
+            "n_sellers": n_sellers[keep],
+        })
+        df = pd.concat([df, star_stats(stars)], axis=1)
+        df["cost_of_reviews"] = review_costs(stars, cost_map)
+        df["revenues"] = 0.1 * df["sales"]
+        df["profits"] = df["revenues"] - df["cost_of_reviews"]
+        return df
+
+    def by_month(self, start=None, end=None, categories=None, cost_map=None) -> pd.DataFrame:
+        """
+        Returns, for every month of the period: month, sales, quantity, cost_of_reviews
+        """
+        positions = self.cells(start, end, categories)
+        months, keys = np.unique(self.month[positions], return_inverse=True)
+        totals = self._totals(keys, len(months), positions)
+        return pd.DataFrame({
+            "month": _first_of_month(months),
+            "sales": totals["sales"],
+            "quantity": totals["quantity"],
+            "cost_of_reviews": review_costs(totals["stars"], cost_map),
+        })
+
+
+def get_sales_cube(data):
+    """
+    Returns the SalesCube of the (shared) tables `data`, built on first use only.
+    """
+    return data.derived("sales_cube", SalesCube)
+
+
+def category_rollup(products, agg="mean"):
+    """
+    Aggregates the numeric columns of a per-product DataFrame by `category` in one grouped pass.
+    `agg` is an aggregation ("mean", "median", "sum", ...) or a list of them (MultiIndex
+    columns) applied to every column, with `quantity` always summed; or a
+    {column: aggregation(s)} dict used as is.
+    """
+    if isinstance(agg, dict):
+        agg_params = agg
+    else:
+        columns = products.select_dtypes(include=["number"]).columns
+        agg_params = {column: agg for column in columns}
+        if "quantity" in agg_params:
+            agg_params["quantity"] = "sum" if isinstance(agg, str) else ["sum"]
+    return products.groupby("category", observed=True).agg(agg_params)
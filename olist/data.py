@@ -1,5 +1,226 @@
+from collections.abc import Mapping
 from pathlib import Path
+import hashlib
+import importlib.util
+import itertools
+import json
+import os
+import threading
 import pandas as pd
+from olist import schema
+
+DEFAULT_DATA_DIR = Path.home() / ".workintech" / "olist" / "data" / "csv"
+
+FILES = {
+    "customers": "olist_customers_dataset.csv",
+    "geolocation": "olist_geolocation_dataset.csv",
+    "order_items": "olist_order_items_dataset.csv",
+    "order_payments": "olist_order_payments_dataset.csv",
+    "order_reviews": "olist_order_reviews_dataset.csv",
+    "orders": "olist_orders_dataset.csv",
+    "products": "olist_products_dataset.csv",
+    "sellers": "olist_sellers_dataset.csv",
+    "product_category_name_translation": "product_category_name_translation.csv",
+}
+
+# Parquet cache lives next to the CSVs; bump the version to invalidate every cached table
+# (e.g. when olist.schema changes the stored column types)
+CACHE_DIRNAME = ".olist_cache"
+CACHE_VERSION = 2
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+# Every OlistTables state gets a new snapshot id, so results memoized on a snapshot go stale with it
+_SNAPSHOTS = itertools.count()
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """
+    Returns the blake2b hex digest of the file at `path`, read in chunks.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TableCache:
+    """
+    Columnar (Parquet) cache of the Olist CSVs, one file per table.
+
+    Each cached table has a small JSON manifest holding the (size, mtime, content hash)
+    fingerprint of its source CSV. A table is rebuilt only when that fingerprint changes:
+    size and mtime are checked first, and the content hash is only computed when they differ,
+    so a CSV that was merely touched keeps its cache.
+    """
+
+    def __init__(self, data_dir):
+        self.cache_dir = Path(data_dir) / CACHE_DIRNAME
+
+    def _paths(self, key):
+        return (self.cache_dir / f"{key}.parquet",
+                self.cache_dir / f"{key}.json")
+
+    def _read_manifest(self, key):
+        _, manifest_path = self._paths(key)
+        try:
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get("version") != CACHE_VERSION:
+            return None
+        return manifest
+
+    def _write_manifest(self, key, stat, digest):
+        _, manifest_path = self._paths(key)
+        manifest = {
+            "version": CACHE_VERSION,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "digest": digest,
+        }
+        tmp_path = manifest_path.with_suffix(f".json.{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+
+    def is_fresh(self, key, source_path):
+        """
+        Returns True when the cached table matches the fingerprint of `source_path`.
+        """
+        parquet_path, _ = self._paths(key)
+        manifest = self._read_manifest(key)
+        if manifest is None or not parquet_path.exists():
+            return False
+
+        stat = Path(source_path).stat()
+        if stat.st_size != manifest["size"]:
+            return False
+        if stat.st_mtime_ns == manifest["mtime_ns"]:
+            return True
+
+        # Same size but new mtime: only trust the cache if the content is unchanged
+        digest = file_digest(source_path)
+        if digest != manifest["digest"]:
+            return False
+        try:
+            self._write_manifest(key, stat, digest)
+        except OSError:
+            pass
+        return True
+
+    def read(self, key, columns=None):
+        parquet_path, _ = self._paths(key)
+        return pd.read_parquet(parquet_path, columns=columns)
+
+    def write(self, key, source_path, df):
+        """
+        Stores `df` as the cached version of `source_path`. Failures (read-only data dir,
+        columns Parquet cannot encode) are ignored: the cache is an optimisation only.
+        """
+        parquet_path, _ = self._paths(key)
+        stat = Path(source_path).stat()
+        try:
+            digest = file_digest(source_path)
+            self.cache_dir.mkdir(exist_ok=True)
+            tmp_path = parquet_path.with_suffix(f".parquet.{os.getpid()}.tmp")
+            df.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, parquet_path)
+            self._write_manifest(key, stat, digest)
+        except (OSError, ValueError, TypeError):
+            return False
+        return True
+
+
+class OlistTables(Mapping):
+    """
+    Lazy, read-only mapping {table: DataFrame} over the Olist datasets.
+
+    A table is only read when it is first accessed, and `table(name, columns)` only reads
+    the declared columns: columns requested later are read then and added to the table
+    kept in memory, so each column is read from disk at most once.
+    """
+
+    def __init__(self, olist):
+        self._olist = olist
+        self._frames = {}
+        self._complete = set()
+        self._derived = {}
+        self._lock = threading.RLock()
+        self.snapshot = next(_SNAPSHOTS)
+
+    def __getitem__(self, name):
+        return self.table(name)
+
+    def __iter__(self):
+        return iter(FILES)
+
+    def __len__(self):
+        return len(FILES)
+
+    def table(self, name, columns=None):
+        """
+        Returns the table `name`, restricted to `columns` when given (in that order).
+        """
+        if name not in FILES:
+            raise KeyError(name)
+
+        with self._lock:
+            frame = self._frames.get(name)
+
+            if columns is None:
+                if name not in self._complete:
+                    frame = self._olist.read_table(name)
+                    self._frames[name] = frame
+                    self._complete.add(name)
+                return frame
+
+            columns = list(columns)
+            loaded = set(frame.columns) if frame is not None else set()
+            missing = [column for column in columns if column not in loaded]
+            if missing and name not in self._complete:
+                extra = self._olist.read_table(name, columns=missing)
+                frame = extra if frame is None else pd.concat([frame, extra], axis=1)
+                self._frames[name] = frame
+
+            return frame[columns]
+
+    def derived(self, name, build):
+        """
+        Returns the structure `name` computed by `build(self)` from these tables (e.g. a join
+        index), building it on first request only. Evicting a table drops every derived structure.
+        """
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = build(self)
+            return self._derived[name]
+
+    def persisted(self, key, source, build):
+        """
+        Returns the DataFrame `build(self)` derived from the table `source` (e.g. an
+        aggregate), kept in the Parquet cache under `key` until the source CSV changes.
+        """
+        return self._olist.read_persisted(key, source, lambda: build(self))
+
+    def loaded(self):
+        """
+        Returns {table: [columns in memory]} for the tables read so far.
+        """
+        with self._lock:
+            return {name: list(frame.columns) for name, frame in self._frames.items()}
+
+    def evict(self, name=None):
+        """
+        Forgets the table `name` (every table by default); it is read again on next access.
+        """
+        with self._lock:
+            names = [name] if name is not None else list(self._frames)
+            for table_name in names:
+                self._frames.pop(table_name, None)
+                self._complete.discard(table_name)
+            self._derived.clear()
+            self.snapshot = next(_SNAPSHOTS)
 
 
 class Olist:
@@ -7,30 +228,63 @@ class Olist:
     The Olist class provides methods to interact with Olist's e-commerce data.
     """
 
-    def get_data(self):
+    def __init__(self, data_dir=None, use_cache=True):
+        self.data_dir = Path(data_dir) if data_dir else DEFAULT_DATA_DIR
+        self.cache = TableCache(self.data_dir) if use_cache and PARQUET_AVAILABLE else None
+        self.tables = OlistTables(self)
+
+    def read_table(self, key, columns=None):
         """
-        Loads Olist CSV files from ~/.workintech/olist/data/csv and returns them as a dict of DataFrames.
-        Keys are short dataset names (e.g. 'orders', 'order_items', 'sellers', ...).
+        Returns the dataset `key` as a DataFrame (only `columns` when given), typed as
+        declared in olist.schema. Served from the Parquet cache when it is up to date
+        and (re)built from the CSV otherwise.
         """
+        path = self.data_dir / FILES[key]
+        if self.cache is None:
+            return schema.read_csv(path, key, columns=columns)
 
-        data_dir = Path.home() / ".workintech" / "olist" / "data" / "csv"
+        if self.cache.is_fresh(key, path):
+            return self.cache.read(key, columns=columns)
 
-        files = {
-            "customers": "olist_customers_dataset.csv",
-            "geolocation": "olist_geolocation_dataset.csv",
-            "order_items": "olist_order_items_dataset.csv",
-            "order_payments": "olist_order_payments_dataset.csv",
-            "order_reviews": "olist_order_reviews_dataset.csv",
-            "orders": "olist_orders_dataset.csv",
-            "products": "olist_products_dataset.csv",
-            "sellers": "olist_sellers_dataset.csv",
-            "product_category_name_translation": "product_category_name_translation.csv",
-        }
+        df = schema.read_csv(path, key)
+        self.cache.write(key, path, df)
+        return df if columns is None else df[list(columns)]
+
+    def read_persisted(self, key, source, build):
+        """
+        Returns the DataFrame `build()` computed from the table `source`, served from the
+        Parquet cache (under `key`) while the source CSV is unchanged.
+        """
+        path = self.data_dir / FILES[source]
+        if self.cache is None:
+            return build()
+
+        if self.cache.is_fresh(key, path):
+            return self.cache.read(key)
+
+        df = build()
+        self.cache.write(key, path, df)
+        return df
+
+    def table(self, name, columns=None):
+        """
+        Returns a single table, loaded lazily and restricted to `columns` when given, e.g.
+        Olist().table("orders", columns=["order_id", "order_status"])
+        """
+        return self.tables.table(name, columns=columns)
+
+    def get_data(self, lazy=False):
+        """
+        Loads Olist CSV files from ~/.workintech/olist/data/csv (or `data_dir`) and returns them as a dict of DataFrames.
+        Keys are short dataset names (e.g. 'orders', 'order_items', 'sellers', ...).
+        With lazy=True, returns a mapping that only reads a table when it is first accessed.
+        """
+        if lazy:
+            return self.tables
 
         data = {}
-        for key, filename in files.items():
-            path = data_dir / filename
-            data[key] = pd.read_csv(path)
+        for key in FILES:
+            data[key] = self.read_table(key)
 
         return data
 
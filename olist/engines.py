@@ -0,0 +1,62 @@
+import pandas as pd
+from olist.polars_engine import PolarsEngine
+from olist.sql import BACKENDS, SqlEngine
+from olist.streaming import StreamingTrainingData
+
+# Engines selectable with the `engine=` flag of the Seller / Product classes
+ENGINES = ("pandas",) + BACKENDS + ("streaming", "polars")
+
+# Engines that also implement the Order training set
+ORDER_ENGINES = ("pandas", "polars")
+
+
+def get_engine(engine="pandas", data_dir=None, engines=ENGINES):
+    """
+    Returns the object computing `seller_training_data()` / `product_training_data()`
+    (and `order_training_data()` for ORDER_ENGINES) for `engine`, or None for "pandas"
+    (the feature methods of the classes themselves).
+    """
+    if engine not in engines:
+        raise ValueError(f"engine must be one of {engines}, got {engine!r}")
+    if engine == "pandas":
+        return None
+    if engine == "polars":
+        return PolarsEngine(data_dir)
+    if engine == "streaming":
+        return StreamingTrainingData(data_dir)
+    return SqlEngine(data_dir, backend=engine)
+
+
+def check_engine(engine, data_dir=None):
+    """
+    Asserts that `engine` returns the same training sets as the pandas engine (values and
+    dtypes) for seller_updated.Seller, product.Product, product_updated.Product and, for
+    ORDER_ENGINES, Order. `data_dir` is the data folder of Seller.
+    """
+    from olist import product, product_updated
+    from olist.order import Order
+    from olist.seller_updated import Seller
+
+    training_sets = {
+        "seller_updated.Seller": lambda name: Seller(data_dir=data_dir, engine=name).get_training_data(),
+        "product.Product": lambda name: product.Product(engine=name).get_training_data(),
+        "product_updated.Product": lambda name: product_updated.Product(engine=name).get_training_data(),
+    }
+    if engine in ORDER_ENGINES:
+        training_sets["Order"] = lambda name: Order(engine=name).get_training_data(
+            with_distance_seller_customer=True)
+
+    for name, training_set in training_sets.items():
+        expected, result = training_set("pandas"), training_set(engine)
+        try:
+            pd.testing.assert_frame_equal(result.reset_index(drop=True), expected.reset_index(drop=True),
+                                          check_categorical=False, rtol=1e-9)
+        except AssertionError as error:
+            raise AssertionError(f"{name}: engine={engine!r} differs from pandas\n{error}") from None
+
+
+if __name__ == "__main__":
+    # python -m olist.engines polars [data_dir]
+    import sys
+    check_engine(*sys.argv[1:3])
+    print(f"{sys.argv[1]}: same training sets as pandas")
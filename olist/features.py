@@ -0,0 +1,180 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import inspect
+import sys
+import threading
+import numpy as np
+import pandas as pd
+
+
+# Arguments that change how a feature is computed, not its result: left out of memo keys
+EXECUTION_ARGUMENTS = ("parallel", "max_workers")
+
+
+def _nbytes(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(index=True, deep=False)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    return sys.getsizeof(value)
+
+
+class FeatureCache:
+    """
+    Memo of feature results keyed by (dataset snapshot, feature node, arguments).
+
+    Entries are evicted least-recently-used first, whenever there are more than
+    `max_entries` of them or they take more than `max_bytes` in total. Concurrent
+    requests for the same key wait for a single computation.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=1 << 30):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key][0]
+            return False, None
+
+    def _store(self, key, value):
+        size = _nbytes(value)
+        with self._lock:
+            self.misses += 1
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self._nbytes += size
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self._nbytes > self.max_bytes):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._nbytes -= evicted_size
+
+    def get_or_compute(self, key, compute):
+        found, value = self._lookup(key)
+        if found:
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                found, value = self._lookup(key)
+                if not found:
+                    value = compute()
+                    self._store(key, value)
+        finally:
+            # Also when compute() raises: no lock is left behind for a failing key
+            with self._lock:
+                self._key_locks.pop(key, None)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def info(self):
+        with self._lock:
+            return {"entries": len(self._entries), "nbytes": self._nbytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+feature_cache = FeatureCache()
+
+
+def _freeze(value):
+    # Hashable form of list / tuple / set / dict arguments for the memo key; the container
+    # type is kept (a list and a tuple may not mean the same) and so is the dict order
+    if isinstance(value, dict):
+        return (dict, tuple((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return (type(value), tuple(_freeze(item) for item in value))
+    if isinstance(value, (set, frozenset)):
+        return (frozenset, frozenset(_freeze(item) for item in value))
+    return value
+
+
+def feature(*depends_on):
+    """
+    Declares a get_* method as a node of the feature graph.
+
+    `depends_on` lists the nodes it reads, as attribute paths from the instance
+    (e.g. "get_wait_time" or "order.get_review_score"). The result is memoized in
+    `feature_cache` per dataset snapshot (`self.data.snapshot`), engine (`self.engine`,
+    when the class has several) and arguments (lists and dicts included), so a node shared
+    by several classes or training sets is computed once per snapshot.
+    Memoized DataFrames are shared: treat them as read-only.
+    """
+    def decorate(method):
+        node = f"{method.__module__}.{method.__qualname__}"
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            snapshot = getattr(self.data, "snapshot", None)
+            if snapshot is None:
+                return method(self, *args, **kwargs)
+
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = tuple(
+                (name, _freeze(value)) for name, value in bound.arguments.items()
+                if name != "self" and name not in EXECUTION_ARGUMENTS
+            )
+            key = (snapshot, node, getattr(self, "engine", None), arguments)
+            try:
+                hash(key)
+            except TypeError:
+                return method(self, *args, **kwargs)
+
+            result = feature_cache.get_or_compute(key, lambda: method(self, *args, **kwargs))
+            # Shallow copy: callers may add or drop columns without touching the memo
+            if isinstance(result, (pd.DataFrame, pd.Series)):
+                return result.copy(deep=False)
+            return result
+
+        wrapper.node = node
+        wrapper.depends_on = depends_on
+        return wrapper
+
+    return decorate
+
+
+def compute_features(calls, parallel=False, max_workers=None):
+    """
+    Runs the independent feature `calls` (zero-argument callables, e.g. bound get_* methods)
+    and returns their results in the same order.
+
+    With parallel=True they run concurrently on a pool of `max_workers` threads. Threads
+    share the loaded tables without copying them, pandas/numpy kernels release the GIL,
+    and `feature_cache` makes sure a node needed by several calls is computed only once.
+    """
+    if not parallel or len(calls) < 2:
+        return [call() for call in calls]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(call) for call in calls]
+        return [future.result() for future in futures]
+
+
+def feature_graph(cls):
+    """
+    Returns {method name: dependencies} for the feature nodes declared on `cls`.
+    """
+    return {
+        name: member.depends_on
+        for name, member in inspect.getmembers(cls)
+        if hasattr(member, "depends_on")
+    }
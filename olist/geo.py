@@ -0,0 +1,105 @@
+import threading
+import numpy as np
+from olist.utils import haversine_distances
+
+CENTROIDS = ("mean", "median")
+
+# Brazilian zip code prefixes have 5 digits: the centroids fit in dense arrays indexed by prefix
+N_ZIP_PREFIXES = 100_000
+
+
+def zip_centroids(geolocation, how="mean"):
+    """
+    Returns a DataFrame (zip_code_prefix, lat, lng) with one centroid per zip code prefix,
+    the `how` ("mean" or "median") of all the coordinates listed for that prefix.
+    """
+    if how not in CENTROIDS:
+        raise ValueError(f"how must be one of {CENTROIDS}, got {how!r}")
+    centroids = geolocation.groupby('geolocation_zip_code_prefix')[
+        ['geolocation_lat', 'geolocation_lng']].agg(how)
+    centroids = centroids.reset_index()
+    centroids.columns = ['zip_code_prefix', 'lat', 'lng']
+    return centroids
+
+
+class GeoIndex:
+    """
+    Zip code prefix -> (lat, lng) centroid lookup, with a memo of the distances between
+    (seller_zip, customer_zip) pairs.
+
+    There are far fewer distinct zip pairs than order items, so `distances` only computes
+    the haversine distance of pairs it has not seen before.
+    """
+
+    def __init__(self, centroids):
+        self.lat = np.full(N_ZIP_PREFIXES, np.nan)
+        self.lng = np.full(N_ZIP_PREFIXES, np.nan)
+        zips = centroids['zip_code_prefix'].to_numpy(dtype=np.int64)
+        self.lat[zips] = centroids['lat'].to_numpy()
+        self.lng[zips] = centroids['lng'].to_numpy()
+
+        self._lock = threading.Lock()
+        self._pairs = np.empty(0, dtype=np.int64)
+        self._distances = np.empty(0)
+
+    def coordinates(self, zips):
+        """
+        Returns the (lat, lng) arrays of the zip code prefixes `zips` (NaN when unknown).
+        """
+        zips = np.asarray(zips, dtype=np.int64)
+        valid = (zips >= 0) & (zips < N_ZIP_PREFIXES)
+        zips = np.where(valid, zips, 0)
+        return (np.where(valid, self.lat[zips], np.nan),
+                np.where(valid, self.lng[zips], np.nan))
+
+    def distances(self, from_zips, to_zips):
+        """
+        Returns the distances (in km) between the centroids of the zip code prefixes
+        `from_zips` and `to_zips`, element-wise (NaN when a prefix is unknown).
+        """
+        pairs = (np.asarray(from_zips, dtype=np.int64) * N_ZIP_PREFIXES
+                 + np.asarray(to_zips, dtype=np.int64))
+        unique_pairs, inverse = np.unique(pairs, return_inverse=True)
+
+        with self._lock:
+            # Look up the memo (sorted by pair) and compute only the unseen pairs
+            positions = np.searchsorted(self._pairs, unique_pairs)
+            positions = np.minimum(positions, max(len(self._pairs) - 1, 0))
+            known = (self._pairs[positions] == unique_pairs if len(self._pairs)
+                     else np.zeros(len(unique_pairs), dtype=bool))
+
+            unique_distances = np.empty(len(unique_pairs))
+            unique_distances[known] = self._distances[positions[known]]
+
+            new_pairs = unique_pairs[~known]
+            from_lat, from_lng = self.coordinates(new_pairs // N_ZIP_PREFIXES)
+            to_lat, to_lng = self.coordinates(new_pairs % N_ZIP_PREFIXES)
+            new_distances = haversine_distances(from_lng, from_lat, to_lng, to_lat)
+            unique_distances[~known] = new_distances
+
+            if len(new_pairs):
+                memo_pairs = np.concatenate([self._pairs, new_pairs])
+                order = np.argsort(memo_pairs, kind="stable")
+                self._pairs = memo_pairs[order]
+                self._distances = np.concatenate([self._distances, new_distances])[order]
+
+        return unique_distances[inverse.reshape(-1)]
+
+    def memo_size(self):
+        return len(self._pairs)
+
+
+def get_geo_index(data, how="mean"):
+    """
+    Returns the GeoIndex of the (shared) tables `data`, with `how` centroids. The centroids
+    are persisted in the Parquet cache and only recomputed when the geolocation CSV changes.
+    """
+    def build(tables):
+        centroids = tables.persisted(
+            f'geolocation_centroids_{how}', 'geolocation',
+            lambda source: zip_centroids(source.table('geolocation', [
+                'geolocation_zip_code_prefix', 'geolocation_lat', 'geolocation_lng'
+            ]), how))
+        return GeoIndex(centroids)
+
+    return data.derived(f'geo_index_{how}', build)
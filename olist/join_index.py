@@ -0,0 +1,223 @@
+import numpy as np
+import pandas as pd
+from olist.keys import ids
+
+STARS = np.arange(1, 6)
+STAR_COLUMNS = [f"stars_{star}" for star in STARS]
+
+# Cost of a review for Olist, by number of stars
+COST_MAP = {1: 100, 2: 50, 3: 40, 4: 0, 5: 0}
+
+
+class CSRIndex:
+    """
+    Compressed sparse row mapping from the keys of one id space (rows) to the
+    keys of another (columns): the columns of row r are
+    indices[offsets[r]:offsets[r + 1]], without duplicates.
+
+    Aggregating a column-level metric over each row (e.g. the mean review score of
+    the orders of every seller) is then a segment reduction over `indices`.
+    """
+
+    def __init__(self, offsets, indices):
+        self.offsets = offsets
+        self.indices = indices
+        self.n_rows = len(offsets) - 1
+        self.row_ids = np.repeat(np.arange(self.n_rows), np.diff(offsets))
+
+    @classmethod
+    def from_pairs(cls, rows, columns, n_rows, n_columns):
+        """
+        Builds the index from (row, column) key pairs; pairs with a negative key are ignored.
+        """
+        valid = (rows >= 0) & (columns >= 0)
+        pairs = np.unique(rows[valid].astype(np.int64) * n_columns + columns[valid])
+        rows, columns = np.divmod(pairs, n_columns)
+        offsets = np.zeros(n_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n_rows), out=offsets[1:])
+        return cls(offsets, columns.astype(np.int32))
+
+    def transpose(self, n_columns):
+        return CSRIndex.from_pairs(self.indices, self.row_ids, n_columns, self.n_rows)
+
+    def counts(self):
+        return np.diff(self.offsets)
+
+    def _reduce(self, ufunc, gathered, empty_value):
+        out = np.full((self.n_rows,) + gathered.shape[1:], empty_value, dtype=gathered.dtype)
+        nonempty = self.counts() > 0
+        if gathered.shape[0]:
+            # Empty rows share their offset with the next row, so reduceat over the
+            # non-empty starts only covers each row's own segment
+            out[nonempty] = ufunc.reduceat(gathered, self.offsets[:-1][nonempty], axis=0)
+        return out
+
+    def segment_sum(self, values):
+        """
+        Sums `values` (indexed by column key, 1-D or 2-D) over the columns of every row.
+        NaN values count as 0.
+        """
+        gathered = np.asarray(values)[self.indices]
+        if gathered.dtype.kind == "f":
+            gathered = np.nan_to_num(gathered)
+        return self._reduce(np.add, gathered, 0)
+
+    def segment_count(self, mask):
+        """
+        Counts, for every row, the columns where `mask` is True.
+        """
+        return np.bincount(self.row_ids, weights=np.asarray(mask)[self.indices],
+                           minlength=self.n_rows).astype(np.int64)
+
+    def segment_min(self, values, mask):
+        """
+        Minimum of `values` over the columns of every row where `mask` is True
+        (meaningless for rows whose segment_count is 0). Works on int64 values.
+        """
+        sentinel = np.iinfo(np.int64).max
+        gathered = np.where(np.asarray(mask)[self.indices], values[self.indices], sentinel)
+        return self._reduce(np.minimum, gathered, sentinel)
+
+    def segment_max(self, values, mask):
+        """
+        Maximum of `values` over the columns of every row where `mask` is True
+        (meaningless for rows whose segment_count is 0). Works on int64 values.
+        """
+        sentinel = np.iinfo(np.int64).min
+        gathered = np.where(np.asarray(mask)[self.indices], values[self.indices], sentinel)
+        return self._reduce(np.maximum, gathered, sentinel)
+
+
+class OrderJoinIndex:
+    """
+    Order <-> seller and order <-> product CSR indexes, built once from order_items:
+    - order_sellers / seller_orders
+    - order_products / product_orders
+
+    Per-order metrics are scattered into dense arrays indexed by order key, and per-seller
+    or per-product aggregates are segment reductions over those arrays: no merge needed.
+    """
+
+    def __init__(self, order_items):
+        order_keys = ids.encode(order_items['order_id'], 'order_id')
+        seller_keys = ids.encode(order_items['seller_id'], 'seller_id')
+        product_keys = ids.encode(order_items['product_id'], 'product_id')
+
+        self.n_orders = ids.size('order_id')
+        self.n_sellers = ids.size('seller_id')
+        self.n_products = ids.size('product_id')
+
+        self.order_sellers = CSRIndex.from_pairs(order_keys, seller_keys,
+                                                 self.n_orders, self.n_sellers)
+        self.seller_orders = self.order_sellers.transpose(self.n_sellers)
+        self.order_products = CSRIndex.from_pairs(order_keys, product_keys,
+                                                  self.n_orders, self.n_products)
+        self.product_orders = self.order_products.transpose(self.n_products)
+
+    def order_keys(self, order_ids):
+        """
+        Returns the order keys of `order_ids`, with -1 for orders that have no items.
+        """
+        keys = ids.encode(order_ids, 'order_id')
+        return np.where(keys < self.n_orders, keys, -1)
+
+    def per_order(self, order_ids, values, fill=np.nan):
+        """
+        Scatters `values` of unique `order_ids` into a dense array indexed by order key,
+        together with a boolean mask of the orders that were given.
+        """
+        keys = self.order_keys(order_ids)
+        values = np.asarray(values)
+        valid = keys >= 0
+
+        dense = np.full(self.n_orders, fill, dtype=np.result_type(values.dtype, np.asarray(fill).dtype))
+        dense[keys[valid]] = values[valid]
+        present = np.zeros(self.n_orders, dtype=bool)
+        present[keys[valid]] = True
+        return dense, present
+
+    def first_last(self, csr, order_ids, timestamps):
+        """
+        Returns (n_orders, first, last) of the non-missing `timestamps` of unique `order_ids`
+        over the orders of every row of `csr` (seller_orders or product_orders).
+        """
+        timestamps = timestamps.to_numpy()
+        valid = ~np.isnat(timestamps)
+        dense, present = self.per_order(order_ids[valid], timestamps[valid].view(np.int64), fill=0)
+
+        n_orders = csr.segment_count(present)
+        first = csr.segment_min(dense, present).view(timestamps.dtype)
+        last = csr.segment_max(dense, present).view(timestamps.dtype)
+        return n_orders, first, last
+
+    def star_counts(self, reviews):
+        """
+        Returns an (n_orders, 5) array counting the 1..5 star reviews of every order.
+        """
+        keys = self.order_keys(reviews['order_id'])
+        scores = reviews['review_score'].to_numpy(dtype=float, na_value=np.nan)
+        valid = (keys >= 0) & np.isin(scores, STARS)
+        bins = keys[valid].astype(np.int64) * 5 + scores[valid].astype(np.int64) - 1
+        return np.bincount(bins, minlength=self.n_orders * 5).reshape(self.n_orders, 5)
+
+    def sellers(self, keys):
+        return ids.decode(keys, 'seller_id')
+
+    def products(self, keys):
+        return ids.decode(keys, 'product_id')
+
+
+def get_join_index(data):
+    """
+    Returns the OrderJoinIndex of the (shared) tables `data`, built on first use only.
+    """
+    return data.derived(
+        'order_join_index',
+        lambda tables: OrderJoinIndex(
+            tables.table('order_items', ['order_id', 'seller_id', 'product_id'])))
+
+
+def star_stats(histogram):
+    """
+    Turns an (n, 5) star histogram into the share of 1 and 5 stars and the mean score.
+    """
+    n_reviews = histogram.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return pd.DataFrame({
+            'share_of_one_stars': histogram[:, 0] / n_reviews,
+            'share_of_five_stars': histogram[:, 4] / n_reviews,
+            'review_score': histogram @ STARS / n_reviews,
+        })
+
+
+def review_costs(histogram, cost_map=None):
+    """
+    Returns the cost of reviews of an (n, 5) star histogram for `cost_map`
+    ({stars: cost}, COST_MAP by default): one dot product with the 5 costs.
+    """
+    cost_map = COST_MAP if cost_map is None else cost_map
+    missing = set(STARS.tolist()) - set(cost_map)
+    if missing:
+        raise ValueError(f"cost_map has no cost for {sorted(missing)} stars")
+    return np.asarray(histogram) @ np.array([cost_map[star] for star in STARS])
+
+
+def star_histogram_frame(histogram, key, labels):
+    """
+    Returns a DataFrame with `key` (= `labels`) and the STAR_COLUMNS of `histogram`.
+    """
+    df = pd.DataFrame(np.asarray(histogram), columns=STAR_COLUMNS)
+    df.insert(0, key, labels)
+    return df
+
+
+def reprice(training_set, histograms, key, cost_map=None):
+    """
+    Returns a copy of `training_set` with `cost_of_reviews` and `profits` re-evaluated
+    for `cost_map`, from the star `histograms` (`key` + STAR_COLUMNS) of its rows.
+    """
+    df = training_set.copy()
+    stars = histograms.set_index(key)[STAR_COLUMNS].reindex(df[key].to_numpy()).fillna(0)
+    df["cost_of_reviews"] = review_costs(stars.to_numpy(), cost_map)
+    df["profits"] = df["revenues"] - df["cost_of_reviews"]
+    return df
@@ -0,0 +1,120 @@
+import threading
+import numpy as np
+import pandas as pd
+
+
+class IdDictionary:
+    """
+    Process-wide dictionary mapping Olist hex ids to dense int32 surrogate keys,
+    one key space per id column (order_id, seller_id, product_id, ...).
+
+    Keys are assigned on first sight and never change, so keys encoded at different
+    times (or from different tables) can be compared and joined directly. For a
+    categorical column only its categories are hashed, never its rows.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = {}
+
+    def size(self, kind):
+        """
+        Returns the number of keys assigned so far for `kind`.
+        """
+        index = self._index.get(kind)
+        return 0 if index is None else len(index)
+
+    def _lookup(self, kind, labels):
+        # Positions of `labels` in the dictionary of `kind`, extending it with unseen labels
+        with self._lock:
+            index = self._index.get(kind, pd.Index([], dtype=object))
+            positions = index.get_indexer(labels)
+            unseen = positions == -1
+            if unseen.any():
+                new_labels = pd.Index(labels[unseen]).unique()
+                index = index.append(new_labels)
+                self._index[kind] = index
+                positions[unseen] = index.get_indexer(labels[unseen])
+            return positions.astype(np.int32)
+
+    def encode(self, values, kind=None):
+        """
+        Returns the int32 surrogate keys of the Series `values` (-1 for missing ids).
+        `kind` defaults to the name of the Series.
+        """
+        kind = kind or values.name
+        if not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype("category")
+
+        categories = values.cat.categories
+        codes = values.cat.codes.to_numpy()
+        lookup = self._lookup(kind, categories.to_numpy(dtype=object))
+        if len(lookup) == 0:
+            return np.full(len(codes), -1, dtype=np.int32)
+        return np.where(codes >= 0, lookup[codes], -1).astype(np.int32)
+
+    def decode(self, keys, kind):
+        """
+        Returns the hex ids of the surrogate `keys` of `kind`.
+        """
+        return self._index[kind].take(keys)
+
+    def clear(self):
+        with self._lock:
+            self._index.clear()
+
+
+ids = IdDictionary()
+
+
+def _key_column(frame, on):
+    # Accept frames keyed by their index (e.g. the output of groupby(on).sum())
+    if on not in frame.columns and frame.index.name == on:
+        return frame.reset_index()
+    return frame
+
+
+def merge_on_keys(frames, on):
+    """
+    Inner-joins `frames` on the id column `on`, with the same rows as
+    frames[0].merge(frames[1], on=on).merge(frames[2], on=on)...
+
+    The join runs on int32 surrogate keys: each right frame is sorted once by key,
+    the matching row positions are computed with array operations, and every frame
+    is gathered a single time at the end instead of materializing each merge step.
+    Rows with a missing id are dropped.
+    """
+    frames = [_key_column(frame, on) for frame in frames]
+    keys = [ids.encode(frame[on], on) for frame in frames]
+    size = ids.size(on)
+
+    rows = np.flatnonzero(keys[0] >= 0)
+    positions = [rows]
+    current = keys[0][rows]
+
+    for right_keys in keys[1:]:
+        valid = np.flatnonzero(right_keys >= 0)
+        order = valid[np.argsort(right_keys[valid], kind="stable")]
+        counts = np.bincount(right_keys[valid], minlength=size)
+        starts = np.cumsum(counts) - counts
+
+        # Repeat every left row once per matching right row (0 times when there is none)
+        matches = counts[current]
+        take = np.repeat(np.arange(len(current)), matches)
+        within = np.arange(len(take)) - np.repeat(np.cumsum(matches) - matches, matches)
+
+        positions = [position[take] for position in positions]
+        current = current[take]
+        positions.append(order[starts[current] + within])
+
+    parts = [frames[0].iloc[positions[0]].reset_index(drop=True)]
+    seen = set(frames[0].columns)
+    for frame, position in zip(frames[1:], positions[1:]):
+        columns = [column for column in frame.columns if column != on]
+        overlap = seen.intersection(columns)
+        if overlap:
+            raise ValueError(f"Columns {sorted(overlap)} appear in more than one frame")
+        seen.update(columns)
+        parts.append(frame[columns].iloc[position].reset_index(drop=True))
+
+    return pd.concat(parts, axis=1)
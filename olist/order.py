@@ -1,7 +1,12 @@
+import functools
 import pandas as pd
 import numpy as np
-from olist.utils import haversine_distance
-from olist.data import Olist
+from olist.geo import get_geo_index
+from olist.features import compute_features, feature
+from olist.keys import merge_on_keys
+from olist.engines import ORDER_ENGINES, get_engine
+from olist.registry import registry
+from olist.timeline import as_of_ns, get_time_index
 
 
 class Order:
@@ -9,243 +14,228 @@ class Order:
     DataFrames containing all orders as index,
     and various properties of these orders as columns
     '''
-    def __init__(self):
+    def __init__(self, engine='pandas'):
         # Assign an attribute ".data" to all new instances of Order
-        self.data = Olist().get_data()
+        # Datasets are shared (read-only) across all feature classes of the process
+        self.data = registry.acquire()
+        # engine='polars' computes get_training_data with Polars LazyFrames (see olist/polars_engine.py)
+        self.engine = engine
+        self.backend = get_engine(engine, engines=ORDER_ENGINES)
 
-    def get_wait_time(self, is_delivered=True):
+    def release(self):
+        """
+        Releases this instance's reference on the shared datasets
+        """
+        registry.release(tables=self.data)
+
+    @feature()
+    def get_wait_time(self, is_delivered=True, as_of=None):
         """
         Returns a DataFrame with:
         [order_id, wait_time, expected_wait_time, delay_vs_expected, order_status]
         and filters out non-delivered orders unless specified
+        With `as_of`, only orders purchased by then, and deliveries made by then, are seen.
         """
         # Hint: Within this instance method, you have access to the instance of the class Order in the variable self, as well as all its attributes
         # $CHALLENGIFY_BEGIN
-        # make sure to create a copy rather than a "view"
-        orders = self.data['orders'].copy()
+        # only read the columns we need (datetimes are already parsed, see olist.schema)
+        orders = self.data.table('orders', [
+            'order_id', 'order_status', 'order_purchase_timestamp',
+            'order_delivered_customer_date', 'order_estimated_delivery_date'
+        ])
+
+        delivered = orders['order_delivered_customer_date']
+        if as_of is not None:
+            # Orders purchased by `as_of` (binary-searched prefix), not yet delivered if delivered later
+            orders = orders.iloc[get_time_index(self.data, 'orders').rows(as_of)]
+            delivered = orders['order_delivered_customer_date']
+            delivered = delivered.mask(delivered > pd.Timestamp(as_of_ns(as_of)))
+            # An order delivered after `as_of` is not delivered yet
+            pending = delivered.isna() & orders['order_delivered_customer_date'].notna()
+            is_delivered_status = (orders['order_status'] == 'delivered') & ~pending
+        else:
+            is_delivered_status = orders['order_status'] == 'delivered'
 
         # filter delivered orders
         if is_delivered:
-            orders = orders.query("order_status=='delivered'").copy()
-
-        # handle datetime
-        orders.loc[:, 'order_delivered_customer_date'] = \
-            pd.to_datetime(orders['order_delivered_customer_date'])
-        orders.loc[:, 'order_estimated_delivery_date'] = \
-            pd.to_datetime(orders['order_estimated_delivery_date'])
-        orders.loc[:, 'order_purchase_timestamp'] = \
-            pd.to_datetime(orders['order_purchase_timestamp'])
-
-        # compute delay vs expected
-        orders.loc[:, 'delay_vs_expected'] = \
-            (orders['order_delivered_customer_date'] -
-             orders['order_estimated_delivery_date']) / np.timedelta64(24, 'h')
-
-        def handle_delay(x):
-            # We only want to keep delay where wait_time is longer than expected (not the other way around)
-            # This is what drives customer dissatisfaction!
-            if x > 0:
-                return x
-            else:
-                return 0
-
-        orders.loc[:, 'delay_vs_expected'] = \
-            orders['delay_vs_expected'].apply(handle_delay)
-
-        # compute wait time
-        orders.loc[:, 'wait_time'] = \
-            (orders['order_delivered_customer_date'] -
-             orders['order_purchase_timestamp']) / np.timedelta64(24, 'h')
-
-        # compute expected wait time
-        orders.loc[:, 'expected_wait_time'] = \
-            (orders['order_estimated_delivery_date'] -
-             orders['order_purchase_timestamp']) / np.timedelta64(24, 'h')
-
-        return orders[[
-            'order_id', 'wait_time', 'expected_wait_time', 'delay_vs_expected',
-            'order_status'
-        ]]
+            orders = orders[is_delivered_status]
+            delivered = delivered[is_delivered_status]
+
+        purchased = orders['order_purchase_timestamp']
+        estimated = orders['order_estimated_delivery_date']
+        one_day = np.timedelta64(24, 'h')
+
+        # We only want to keep delay where wait_time is longer than expected (not the other way around)
+        # This is what drives customer dissatisfaction! (orders without delivery date count as no delay)
+        delay_vs_expected = ((delivered - estimated) / one_day).clip(lower=0).fillna(0)
+
+        return pd.DataFrame({
+            'order_id': orders['order_id'],
+            'wait_time': (delivered - purchased) / one_day,
+            'expected_wait_time': (estimated - purchased) / one_day,
+            'delay_vs_expected': delay_vs_expected,
+            'order_status': orders['order_status'],
+        })
         # $CHALLENGIFY_END
 
-    def get_review_score(self):
+    @feature()
+    def get_review_score(self, as_of=None):
         """
         Returns a DataFrame with:
         order_id, dim_is_five_star, dim_is_one_star, review_score
+        With `as_of`, only reviews created by then are seen.
         """
         # $CHALLENGIFY_BEGIN
-        # import data
-        reviews = self.data['order_reviews']
-
-        def dim_five_star(d):
-            if d == 5:
-                return 1
-            else:
-                return 0
-
-        def dim_one_star(d):
-            if d == 1:
-                return 1
-            else:
-                return 0
-
-        reviews.loc[:, 'dim_is_five_star'] =\
-            reviews['review_score'].apply(dim_five_star)
-
-        reviews.loc[:, 'dim_is_one_star'] =\
-            reviews['review_score'].apply(dim_one_star)
+        # build new columns: the shared datasets must not be mutated
+        reviews = self.data.table('order_reviews', ['order_id', 'review_score'])
+        if as_of is not None:
+            reviews = reviews.iloc[get_time_index(self.data, 'order_reviews').rows(as_of)]
+        review_score = reviews['review_score']
+
+        return pd.DataFrame({
+            'order_id': reviews['order_id'],
+            'dim_is_five_star': (review_score == 5).astype(np.int64),
+            'dim_is_one_star': (review_score == 1).astype(np.int64),
+            'review_score': review_score,
+        })
+        # $CHALLENGIFY_END
 
-        return reviews[[
-            'order_id', 'dim_is_five_star', 'dim_is_one_star', 'review_score'
-        ]]
+    @feature()
+    def get_order_items_features(self, as_of=None):
+        """
+        Returns a DataFrame with:
+        order_id, number_of_items, number_of_sellers, price, freight_value
+        computed in a single grouped aggregation over order_items
+        With `as_of`, only the items of orders purchased by then are seen.
+        """
+        # $CHALLENGIFY_BEGIN
+        order_items = self.data.table('order_items', [
+            'order_id', 'order_item_id', 'seller_id', 'price', 'freight_value'
+        ])
+        if as_of is not None:
+            order_items = order_items.iloc[get_time_index(self.data, 'order_items').rows(as_of)]
+        return order_items.groupby('order_id', observed=True, as_index=False).agg(
+            number_of_items=('order_item_id', 'count'),
+            number_of_sellers=('seller_id', 'nunique'),
+            price=('price', 'sum'),
+            freight_value=('freight_value', 'sum'),
+        )
         # $CHALLENGIFY_END
 
+    @feature('get_order_items_features')
     def get_number_items(self):
         """
         Returns a DataFrame with:
         order_id, number_of_items
         """
-        # $CHALLENGIFY_BEGIN
-        data = self.data
-        items = \
-            data['order_items']\
-            .groupby('order_id',
-                     as_index=False).agg({'order_item_id': 'count'})
-        items.columns = ['order_id', 'number_of_items']
-        return items
-        # $CHALLENGIFY_END
+        return self.get_order_items_features()[['order_id', 'number_of_items']]
 
+    @feature('get_order_items_features')
     def get_number_sellers(self):
         """
         Returns a DataFrame with:
         order_id, number_of_sellers
         """
-        # $CHALLENGIFY_BEGIN
-        data = self.data
-        sellers = \
-            data['order_items']\
-            .groupby('order_id')['seller_id'].nunique().reset_index()
-        sellers.columns = ['order_id', 'number_of_sellers']
-
-        return sellers
-        # $CHALLENGIFY_END
+        return self.get_order_items_features()[['order_id', 'number_of_sellers']]
 
+    @feature('get_order_items_features')
     def get_price_and_freight(self):
         """
         Returns a DataFrame with:
         order_id, price, freight_value
         """
-        # $CHALLENGIFY_BEGIN
-        data = self.data
-        price_freight = \
-            data['order_items']\
-            .groupby('order_id',
-                     as_index=False).agg({'price': 'sum',
-                                          'freight_value': 'sum'})
-
-        return price_freight
-        # $CHALLENGIFY_END
+        return self.get_order_items_features()[['order_id', 'price', 'freight_value']]
 
     # Optional
-    def get_distance_seller_customer(self):
+    @feature()
+    def get_distance_seller_customer(self, centroid='mean'):
         """
         Returns a DataFrame with:
         order_id, distance_seller_customer
+        Zip codes are located at the `centroid` ('mean' or 'median') of their coordinates.
         """
         # $CHALLENGIFY_BEGIN
 
         # import data
         data = self.data
-        orders = data['orders']
-        order_items = data['order_items']
-        sellers = data['sellers']
-        customers = data['customers']
-
-        # Since one zip code can map to multiple (lat, lng), take the first one
-        geo = data['geolocation']
-        geo = geo.groupby('geolocation_zip_code_prefix',
-                          as_index=False).first()
-
-        # Merge geo_location for sellers
-        sellers_mask_columns = [
-            'seller_id', 'seller_zip_code_prefix', 'geolocation_lat', 'geolocation_lng'
-        ]
-
-        sellers_geo = sellers.merge(
-            geo,
-            how='left',
-            left_on='seller_zip_code_prefix',
-            right_on='geolocation_zip_code_prefix')[sellers_mask_columns]
-
-        # Merge geo_location for customers
-        customers_mask_columns = ['customer_id', 'customer_zip_code_prefix', 'geolocation_lat', 'geolocation_lng']
-
-        customers_geo = customers.merge(
-            geo,
-            how='left',
-            left_on='customer_zip_code_prefix',
-            right_on='geolocation_zip_code_prefix')[customers_mask_columns]
-
-        # Match customers with sellers in one table
-        customers_sellers = customers.merge(orders, on='customer_id')\
-            .merge(order_items, on='order_id')\
-            .merge(sellers, on='seller_id')\
-            [['order_id', 'customer_id','customer_zip_code_prefix', 'seller_id', 'seller_zip_code_prefix']]
-
-        # Add the geoloc
-        matching_geo = customers_sellers.merge(sellers_geo,
-                                            on='seller_id')\
-            .merge(customers_geo,
-                   on='customer_id',
-                   suffixes=('_seller',
-                             '_customer'))
-        # Remove na()
+        orders = data.table('orders', ['order_id', 'customer_id'])
+        order_items = data.table('order_items', ['order_id', 'seller_id'])
+        sellers = data.table('sellers', ['seller_id', 'seller_zip_code_prefix'])
+        customers = data.table('customers', ['customer_id', 'customer_zip_code_prefix'])
+
+        # Zip code of the seller and of the customer of every order item
+        # (Series.map on categorical ids maps each distinct id once)
+        seller_zip = order_items['seller_id'].map(
+            sellers.set_index('seller_id')['seller_zip_code_prefix'])
+        order_customer_zip = orders.set_index('order_id')['customer_id'].map(
+            customers.set_index('customer_id')['customer_zip_code_prefix'])
+        customer_zip = order_items['order_id'].map(order_customer_zip)
+
+        matching_geo = pd.DataFrame({
+            'order_id': order_items['order_id'],
+            'seller_zip_code_prefix': seller_zip.astype(float),
+            'customer_zip_code_prefix': customer_zip.astype(float),
+        }).dropna()
+
+        # One lookup per distinct (seller zip, customer zip) pair in the memoized geo index
+        geo = get_geo_index(data, centroid)
+        matching_geo['distance_seller_customer'] = geo.distances(
+            matching_geo['seller_zip_code_prefix'].to_numpy(),
+            matching_geo['customer_zip_code_prefix'].to_numpy())
+        # Zip codes without coordinates
         matching_geo = matching_geo.dropna()
 
-        matching_geo.loc[:, 'distance_seller_customer'] =\
-            matching_geo.apply(lambda row:
-                               haversine_distance(row['geolocation_lng_seller'],
-                                                  row['geolocation_lat_seller'],
-                                                  row['geolocation_lng_customer'],
-                                                  row['geolocation_lat_customer']),
-                               axis=1)
         # Since an order can have multiple sellers,
         # return the average of the distance per order
         order_distance =\
-            matching_geo.groupby('order_id',
+            matching_geo.groupby('order_id', observed=True,
                                  as_index=False).agg({'distance_seller_customer':
                                                       'mean'})
 
         return order_distance
         # $CHALLENGIFY_END
 
+    @feature(
+        'get_wait_time',
+        'get_review_score',
+        'get_order_items_features',
+        'get_distance_seller_customer',
+    )
     def get_training_data(self,
                           is_delivered=True,
-                          with_distance_seller_customer=False):
+                          with_distance_seller_customer=False,
+                          parallel=False,
+                          max_workers=None,
+                          as_of=None):
         """
         Returns a clean DataFrame (without NaN), with the all following columns:
         ['order_id', 'wait_time', 'expected_wait_time', 'delay_vs_expected',
         'order_status', 'dim_is_five_star', 'dim_is_one_star', 'review_score',
         'number_of_items', 'number_of_sellers', 'price', 'freight_value',
         'distance_seller_customer']
+        With parallel=True, the features are computed concurrently on `max_workers` threads.
+        With `as_of`, the features are a point-in-time snapshot of that date.
         """
         # Hint: make sure to re-use your instance methods defined above
         # $CHALLENGIFY_BEGIN
-        training_set =\
-            self.get_wait_time(is_delivered)\
-                .merge(
-                self.get_review_score(), on='order_id'
-            ).merge(
-                self.get_number_items(), on='order_id'
-            ).merge(
-                self.get_number_sellers(), on='order_id'
-            ).merge(
-                self.get_price_and_freight(), on='order_id'
-            )
+        if self.backend is not None:
+            if as_of is not None:
+                raise ValueError(f"as_of is only supported by the pandas engine (engine={self.engine!r})")
+            return self.backend.order_training_data(is_delivered, with_distance_seller_customer)
+
+        calls = [
+            functools.partial(self.get_wait_time, is_delivered, as_of),
+            functools.partial(self.get_review_score, as_of),
+            functools.partial(self.get_order_items_features, as_of),
+        ]
         # Skip heavy computation of distance_seller_customer unless specified
         if with_distance_seller_customer:
-            training_set = training_set.merge(
-                self.get_distance_seller_customer(), on='order_id')
+            calls.append(self.get_distance_seller_customer)
+
+        features = compute_features(calls, parallel=parallel, max_workers=max_workers)
+
+        # Join on int32 surrogate keys rather than merging on hex strings
+        training_set = merge_on_keys(features, on='order_id')
 
         return training_set.dropna()
         # $CHALLENGIFY_END
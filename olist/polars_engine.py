@@ -0,0 +1,272 @@
+import importlib.util
+import math
+from olist import schema
+from olist.data import FILES, Olist
+from olist.join_index import COST_MAP
+
+POLARS_AVAILABLE = importlib.util.find_spec("polars") is not None
+if POLARS_AVAILABLE:
+    import polars as pl
+
+ONE_DAY_US = 86_400e6
+EARTH_RADIUS_KM = 6371
+
+
+def _days(end, start):
+    # Fractional days between two Datetime expressions (null when either is missing)
+    return (end - start).dt.total_microseconds() / ONE_DAY_US
+
+
+def _haversine(lon1, lat1, lon2, lat2):
+    # Same formula as olist.utils.haversine_distances, as a Polars expression
+    lon1, lat1, lon2, lat2 = (x * (math.pi / 180) for x in (lon1, lat1, lon2, lat2))
+    a = ((lat2 - lat1) / 2).sin() ** 2 + lat1.cos() * lat2.cos() * ((lon2 - lon1) / 2).sin() ** 2
+    return 2 * EARTH_RADIUS_KM * a.clip(0, 1).sqrt().arcsin()
+
+
+class PolarsEngine:
+    """
+    Order, Seller and Product training sets computed with Polars LazyFrames: every table is
+    scanned lazily (only the columns a query uses are read), and each training set is a
+    single query plan that Polars optimizes and runs on all cores.
+
+    Results are returned as pandas DataFrames with the same columns and rows as the pandas
+    engine: `Order.get_training_data()`, `Seller.get_training_data()` in
+    olist/seller_updated.py and `Product.get_training_data()` in olist/product_updated.py.
+    """
+
+    def __init__(self, data_dir=None):
+        if not POLARS_AVAILABLE:
+            raise ImportError("The polars engine requires `pip install polars`")
+        self.data_dir = Olist(data_dir).data_dir
+
+    def _collect(self, plan, tables, datetimes=()):
+        # Runs `plan` and returns it with the dtypes of the pandas engine: ids and labels of
+        # `tables` typed by olist.schema, `datetimes` in nanoseconds
+        df = plan.collect().to_pandas()
+        for table in tables:
+            df = schema.apply_schema(table, df)
+        for column in datetimes:
+            df[column] = df[column].astype("datetime64[ns]")
+        return df
+
+    def scan(self, table):
+        """
+        Returns a LazyFrame over the CSV of `table`, typed as declared in olist.schema
+        (ids and labels as strings, parsed datetimes, 64-bit integers).
+        """
+        types = {"category": pl.String, "datetime": pl.Datetime("us"), "int": pl.Int64}
+        overrides = {column: types[kind] for column, kind in schema.SCHEMA[table].items()}
+        return pl.scan_csv(self.data_dir / FILES[table], schema_overrides=overrides)
+
+    # -----------------------------
+    # Shared building blocks
+    # -----------------------------
+    def _pairs(self, key):
+        # Distinct (key, order_id) pairs of order_items
+        return (self.scan("order_items").select(key, "order_id")
+                .drop_nulls().unique())
+
+    def _reviews(self, key):
+        # Share of 1 and 5 stars, mean score and cost of reviews over the orders of each `key`
+        reviews = self.scan("order_reviews").select("order_id", "review_score")
+        score = pl.col("review_score")
+        cost = sum(pl.col(f"n{star}") * cost for star, cost in COST_MAP.items())
+        return (
+            self._pairs(key).join(reviews, on="order_id")
+            .filter(score.is_between(1, 5))
+            .group_by(key)
+            .agg(pl.len().alias("n_reviews"), score.sum().alias("total_score"),
+                 *[(score == star).sum().alias(f"n{star}") for star in COST_MAP])
+            .select(
+                key,
+                (pl.col("n1") / pl.col("n_reviews")).alias("share_of_one_stars"),
+                (pl.col("n5") / pl.col("n_reviews")).alias("share_of_five_stars"),
+                (pl.col("total_score") / pl.col("n_reviews")).alias("review_score"),
+                cost.cast(pl.Int64).alias("cost_of_reviews"),
+            )
+        )
+
+    # -----------------------------
+    # Order
+    # -----------------------------
+    def _order_wait_time(self, is_delivered=True):
+        orders = self.scan("orders")
+        if is_delivered:
+            orders = orders.filter(pl.col("order_status") == "delivered")
+        purchased = pl.col("order_purchase_timestamp")
+        delivered = pl.col("order_delivered_customer_date")
+        estimated = pl.col("order_estimated_delivery_date")
+        return orders.select(
+            "order_id",
+            _days(delivered, purchased).alias("wait_time"),
+            _days(estimated, purchased).alias("expected_wait_time"),
+            _days(delivered, estimated).clip(lower_bound=0).fill_null(0).alias("delay_vs_expected"),
+            "order_status",
+        )
+
+    def _order_distance(self):
+        # Mean centroid of every zip code prefix (as Order.get_distance_seller_customer)
+        centroids = (self.scan("geolocation")
+                     .group_by("geolocation_zip_code_prefix")
+                     .agg(pl.col("geolocation_lat").mean().alias("lat"),
+                          pl.col("geolocation_lng").mean().alias("lng")))
+        sellers = self.scan("sellers").select("seller_id", "seller_zip_code_prefix")
+        customers = self.scan("customers").select("customer_id", "customer_zip_code_prefix")
+        orders = self.scan("orders").select("order_id", "customer_id")
+        return (
+            self.scan("order_items").select("order_id", "seller_id")
+            .join(sellers, on="seller_id")
+            .join(orders, on="order_id")
+            .join(customers, on="customer_id")
+            .join(centroids, left_on="seller_zip_code_prefix",
+                  right_on="geolocation_zip_code_prefix")
+            .join(centroids, left_on="customer_zip_code_prefix",
+                  right_on="geolocation_zip_code_prefix", suffix="_customer")
+            .select("order_id", _haversine(pl.col("lng"), pl.col("lat"),
+                                           pl.col("lng_customer"), pl.col("lat_customer"))
+                    .alias("distance_seller_customer"))
+            .drop_nulls()
+            .group_by("order_id")
+            .agg(pl.col("distance_seller_customer").mean())
+        )
+
+    def order_training_data(self, is_delivered=True, with_distance_seller_customer=False):
+        """
+        Returns the columns of `Order.get_training_data()`.
+        """
+        score = pl.col("review_score")
+        reviews = self.scan("order_reviews").select(
+            "order_id",
+            (score == 5).cast(pl.Int64).alias("dim_is_five_star"),
+            (score == 1).cast(pl.Int64).alias("dim_is_one_star"),
+            score,
+        ).with_row_index("_review")
+        items = self.scan("order_items").group_by("order_id").agg(
+            pl.col("order_item_id").count().cast(pl.Int64).alias("number_of_items"),
+            pl.col("seller_id").drop_nulls().n_unique().cast(pl.Int64).alias("number_of_sellers"),
+            pl.col("price").sum(),
+            pl.col("freight_value").sum(),
+        )
+
+        training_set = (self._order_wait_time(is_delivered).with_row_index("_order")
+                        .join(reviews, on="order_id")
+                        .join(items, on="order_id"))
+        if with_distance_seller_customer:
+            training_set = training_set.join(self._order_distance(), on="order_id")
+
+        # Rows in the order of the pandas merges: orders, then their reviews
+        training_set = (training_set.sort("_order", "_review")
+                        .drop("_order", "_review")
+                        .fill_nan(None)
+                        .drop_nulls())
+        return self._collect(training_set, ["orders", "order_reviews"])
+
+    # -----------------------------
+    # Seller
+    # -----------------------------
+    def seller_training_data(self):
+        """
+        Returns the columns of `Seller.get_training_data()` (olist/seller_updated.py).
+        """
+        items = self.scan("order_items")
+        orders = self.scan("orders")
+        sellers = (self.scan("sellers").select("seller_id", "seller_city", "seller_state")
+                   .unique(maintain_order=True).with_row_index("_seller"))
+
+        delays = (
+            items.join(orders.filter(pl.col("order_status") == "delivered"), on="order_id")
+            .group_by("seller_id")
+            .agg(_days(pl.col("order_delivered_carrier_date"), pl.col("shipping_limit_date"))
+                 .clip(lower_bound=0).mean().alias("delay_to_carrier"),
+                 _days(pl.col("order_delivered_customer_date"), pl.col("order_purchase_timestamp"))
+                 .mean().alias("wait_time"))
+        )
+        approved = pl.col("order_approved_at")
+        dates = (
+            self._pairs("seller_id").join(orders.select("order_id", "order_approved_at"), on="order_id")
+            .filter(approved.is_not_null())
+            .group_by("seller_id")
+            .agg(approved.min().alias("date_first_sale"), approved.max().alias("date_last_sale"))
+            .with_columns(
+                (_days(pl.col("date_last_sale"), pl.col("date_first_sale")) / 30)
+                .round(0).alias("months_on_olist"))
+        )
+        quantities = (
+            items.group_by("seller_id")
+            .agg(pl.col("order_id").drop_nulls().n_unique().cast(pl.Int64).alias("n_orders"),
+                 pl.col("order_id").count().cast(pl.Int64).alias("quantity"),
+                 pl.col("price").sum().alias("sales"))
+            .with_columns((pl.col("quantity") / pl.col("n_orders")).alias("quantity_per_order"))
+        )
+
+        training_set = (
+            sellers.join(delays, on="seller_id")
+            .join(dates, on="seller_id")
+            .join(quantities, on="seller_id")
+            .join(self._reviews("seller_id"), on="seller_id")
+            .sort("_seller")
+            .with_columns((0.1 * pl.col("sales") + 80 * pl.col("months_on_olist")).alias("revenues"))
+            .with_columns((pl.col("revenues") - pl.col("cost_of_reviews")).alias("profits"))
+            .select(
+                "seller_id", "seller_city", "seller_state",
+                "delay_to_carrier", "wait_time",
+                "date_first_sale", "date_last_sale", "months_on_olist",
+                "n_orders", "quantity", "quantity_per_order", "sales",
+                "share_of_one_stars", "share_of_five_stars", "review_score",
+                "cost_of_reviews", "revenues", "profits",
+            )
+        )
+        return self._collect(training_set, ["sellers"], datetimes=["date_first_sale", "date_last_sale"])
+
+    # -----------------------------
+    # Product
+    # -----------------------------
+    def product_training_data(self):
+        """
+        Returns the columns of `Product.get_training_data()` (olist/product_updated.py).
+        """
+        items = self.scan("order_items")
+        products = (
+            self.scan("products").with_row_index("_product")
+            .join(self.scan("product_category_name_translation"), on="product_category_name")
+            .drop("product_category_name")
+            .rename({
+                "product_category_name_english": "category",
+                "product_name_lenght": "product_name_length",
+                "product_description_lenght": "product_description_length",
+            })
+        )
+        wait_time = (
+            self._pairs("product_id").join(self._order_wait_time(), on="order_id")
+            .group_by("product_id")
+            .agg(pl.col("wait_time").mean())
+        )
+        quantities = items.group_by("product_id").agg(
+            pl.col("price").mean(),
+            pl.col("order_id").drop_nulls().n_unique().cast(pl.Int64).alias("n_orders"),
+            pl.col("order_id").count().cast(pl.Int64).alias("quantity"),
+            pl.col("price").sum().alias("sales"),
+        )
+
+        olist_sales_cut = 0.1
+        training_set = (
+            products.join(wait_time, on="product_id")
+            .join(quantities, on="product_id")
+            .join(self._reviews("product_id"), on="product_id")
+            .sort("_product")
+            .drop("_product")
+            .with_columns((olist_sales_cut * pl.col("sales")).alias("revenues"))
+            .with_columns((pl.col("revenues") - pl.col("cost_of_reviews")).alias("profits"))
+        )
+        # Product measures have missing values in the CSV: pandas reads them as floats
+        measures = [
+            "product_name_length", "product_description_length", "product_photos_qty",
+            "product_weight_g", "product_length_cm", "product_height_cm", "product_width_cm",
+        ]
+        training_set = training_set.with_columns(pl.col(measures).cast(pl.Float64)).select(
+            "product_id", *measures, "category", "wait_time",
+            "price", "share_of_one_stars", "share_of_five_stars", "review_score",
+            "cost_of_reviews", "n_orders", "quantity", "sales", "revenues", "profits",
+        )
+        return self._collect(training_set, ["products"])
@@ -0,0 +1,334 @@
+import numpy as np
+import pandas as pd
+from olist.keys import ids
+
+# IT / operations cost model of the dashboard (pages/home.py, pages/seller_impact.py)
+ALPHA, BETA = 3157.27, 978.23
+
+LEVELS = ("product", "category")
+
+# Seller metrics that can rank the removal scenario: metric -> +1 when higher is better,
+# -1 when higher is worse (units are removed worst first)
+RANKINGS = {
+    "profits": 1,
+    "review_score": 1,
+    "share_of_one_stars": -1,
+    "delay_to_carrier": -1,
+    "wait_time": -1,
+}
+
+# Default weights of the "composite" ranking (weighted sum of standardized metrics)
+COMPOSITE_WEIGHTS = {
+    "profits": 0.5,
+    "review_score": 0.2,
+    "share_of_one_stars": 0.1,
+    "delay_to_carrier": 0.1,
+    "wait_time": 0.1,
+}
+
+COMPOSITE = "composite"
+
+
+def it_cost(n_sellers, n_items):
+    """
+    IT / operations cost of a portfolio of `n_sellers` sellers selling `n_items` items
+    (scalars or arrays).
+    """
+    return ALPHA * np.sqrt(n_sellers) + BETA * np.sqrt(n_items)
+
+
+class RemovalCurve:
+    """
+    Net profit of every "remove the k worst units" scenario (k = 0 .. n), units being
+    sellers, products or categories sorted by ascending gross profit (or `score`).
+
+    Kept revenues, review costs and items are suffix sums of the sorted units, and the
+    number of kept sellers comes from the rank at which each seller loses its last unit,
+    so the whole curve and its optimum are computed in one vectorized pass; a scenario
+    is then an array lookup.
+    """
+
+    def __init__(self, labels, revenues, cost_of_reviews, quantity, unit_sellers=None, score=None):
+        """
+        `labels`, `revenues`, `cost_of_reviews` and `quantity` describe the units.
+        `unit_sellers` = (unit positions, seller keys) pairs of the sellers selling each
+        unit; by default every unit is its own seller.
+        `score` ranks the units (lowest removed first); by default their gross profit.
+        """
+        revenues = np.asarray(revenues, dtype=float)
+        cost_of_reviews = np.asarray(cost_of_reviews, dtype=float)
+        quantity = np.asarray(quantity, dtype=float)
+        n = len(revenues)
+
+        if score is None:
+            score = revenues - cost_of_reviews
+        self.order = np.argsort(np.asarray(score, dtype=float), kind="stable")
+        self.labels = np.asarray(labels)[self.order]
+
+        def kept(values):
+            # kept(values)[k]: total of the units left after removing the k first ones
+            suffix = np.zeros(n + 1)
+            suffix[:n] = np.cumsum(values[self.order][::-1])[::-1]
+            return suffix
+
+        self.revenues = kept(revenues)
+        self.cost_of_reviews = kept(cost_of_reviews)
+        self.n_items = kept(quantity)
+        self.gross_profit = self.revenues - self.cost_of_reviews
+
+        # A seller is kept while one of its units is: it leaves once its highest-ranked
+        # unit is removed, i.e. for k > max rank of its units
+        if unit_sellers is None:
+            unit_sellers = (np.arange(n), np.arange(n))
+        units, sellers = (np.asarray(values, dtype=np.int64) for values in unit_sellers)
+        rank = np.empty(n, dtype=np.int64)
+        rank[self.order] = np.arange(n)
+        last_rank = np.full(sellers.max() + 1 if len(sellers) else 0, -1, dtype=np.int64)
+        np.maximum.at(last_rank, sellers, rank[units])
+        last_rank = last_rank[last_rank >= 0]
+        gone = np.cumsum(np.bincount(last_rank + 1, minlength=n + 1))
+        self.n_sellers = len(last_rank) - gone
+
+        self.it_cost = it_cost(self.n_sellers, self.n_items)
+        self.net_profit = self.gross_profit - self.it_cost
+        self.best_remove = int(np.argmax(self.net_profit))
+
+    def __len__(self):
+        return len(self.labels)
+
+    @property
+    def best_net_profit(self):
+        return float(self.net_profit[self.best_remove])
+
+    def totals(self, n_removed):
+        """
+        Returns the scenario totals after removing the `n_removed` worst units.
+        """
+        k = int(np.clip(n_removed, 0, len(self)))
+        return {
+            "n_removed": k,
+            "n_kept": len(self) - k,
+            "n_sellers": int(self.n_sellers[k]),
+            "n_items": int(self.n_items[k]),
+            "revenue": float(self.revenues[k]),
+            "review_cost": float(self.cost_of_reviews[k]),
+            "gross_profit": float(self.gross_profit[k]),
+            "it_cost": float(self.it_cost[k]),
+            "net_profit": float(self.net_profit[k]),
+        }
+
+    def removed(self, n_removed):
+        """
+        Returns the labels of the `n_removed` worst units.
+        """
+        return self.labels[:int(n_removed)]
+
+    def frame(self):
+        """
+        Returns the curve as a DataFrame indexed by the number of removed units.
+        """
+        return pd.DataFrame({
+            "n_kept": len(self) - np.arange(len(self) + 1),
+            "n_sellers": self.n_sellers,
+            "n_items": self.n_items,
+            "revenue": self.revenues,
+            "review_cost": self.cost_of_reviews,
+            "gross_profit": self.gross_profit,
+            "it_cost": self.it_cost,
+            "net_profit": self.net_profit,
+        }).rename_axis("n_removed")
+
+
+def ranking_score(sellers, metric="profits", weights=None):
+    """
+    Returns the score ranking `sellers` for `metric` (a RANKINGS metric or "composite"),
+    lowest for the worst sellers. The composite score is the weighted sum of the
+    standardized metrics of `weights` (COMPOSITE_WEIGHTS by default). Missing values
+    rank as the average seller.
+    """
+    if metric == COMPOSITE:
+        weights = weights or COMPOSITE_WEIGHTS
+        unknown = [name for name in weights if name not in RANKINGS]
+        if unknown:
+            raise ValueError(f"weights must be metrics of {tuple(RANKINGS)}, got {unknown}")
+        missing = [name for name in weights if name not in sellers.columns]
+        if missing:
+            raise ValueError(f"sellers is missing the ranking columns {missing}")
+        score = np.zeros(len(sellers))
+        for name, weight in weights.items():
+            values = sellers[name].to_numpy(dtype=float)
+            std = np.nanstd(values) if len(values) else 0
+            if std > 0:
+                score += weight * RANKINGS[name] * np.nan_to_num((values - np.nanmean(values)) / std)
+        return score
+    if metric not in RANKINGS:
+        raise ValueError(f"metric must be one of {tuple(RANKINGS) + (COMPOSITE,)}, got {metric!r}")
+    if metric not in sellers.columns:
+        raise ValueError(f"sellers has no column {metric!r} to rank by")
+    values = sellers[metric].to_numpy(dtype=float)
+    if len(values) and np.isnan(values).any():
+        values = np.where(np.isnan(values), np.nanmean(values), values)
+    return RANKINGS[metric] * values
+
+
+def seller_removal_curve(sellers, metric="profits", weights=None):
+    """
+    Returns the RemovalCurve of removing the worst sellers of `sellers`
+    (Seller.get_training_data(): seller_id, revenues, cost_of_reviews, quantity and the
+    ranking metrics), ranked by `metric` (see ranking_score).
+    """
+    # profits = revenues - cost_of_reviews: the default ranking of RemovalCurve
+    score = None if metric == "profits" else ranking_score(sellers, metric, weights)
+    return RemovalCurve(sellers["seller_id"].to_numpy(), sellers["revenues"].to_numpy(),
+                        sellers["cost_of_reviews"].to_numpy(), sellers["quantity"].to_numpy(),
+                        score=score)
+
+
+def seller_removal_curves(sellers, metrics=tuple(RANKINGS) + (COMPOSITE,)):
+    """
+    Returns {metric: RemovalCurve} of `sellers` for every metric of `metrics`: the sort
+    permutation and suffix sums of each ranking are computed once, so switching ranking
+    is a dict lookup.
+    """
+    return {metric: seller_removal_curve(sellers, metric) for metric in metrics}
+
+
+def product_removal_curve(products, order_items, level="product"):
+    """
+    Returns the RemovalCurve of removing the worst products (level="product") or whole
+    categories (level="category") of `products` (Product.get_training_data(): product_id,
+    category, revenues, cost_of_reviews, quantity). Sellers are counted from the
+    (product_id, seller_id) pairs of `order_items`.
+    """
+    if level not in LEVELS:
+        raise ValueError(f"level must be one of {LEVELS}, got {level!r}")
+
+    if level == "product":
+        units = products["product_id"].astype(object)
+        unit_of_product = pd.Series(np.arange(len(products)), index=units)
+        labels, revenues = units.to_numpy(), products["revenues"].to_numpy()
+        cost_of_reviews, quantity = products["cost_of_reviews"].to_numpy(), products["quantity"].to_numpy()
+    else:
+        categories = products.groupby("category", observed=True, sort=True)[
+            ["revenues", "cost_of_reviews", "quantity"]].sum()
+        unit_of_category = pd.Series(np.arange(len(categories)), index=categories.index.astype(object))
+        unit_of_product = pd.Series(
+            unit_of_category.reindex(products["category"].astype(object)).to_numpy(),
+            index=products["product_id"].astype(object))
+        labels, revenues = categories.index.to_numpy(), categories["revenues"].to_numpy()
+        cost_of_reviews, quantity = categories["cost_of_reviews"].to_numpy(), categories["quantity"].to_numpy()
+
+    # Sellers of the items of the products kept in the training set
+    unit_of_item = unit_of_product.reindex(order_items["product_id"].astype(object)).to_numpy()
+    sellers = ids.encode(order_items["seller_id"], "seller_id")
+    sold = ~pd.isna(unit_of_item) & (sellers >= 0)
+    unit_sellers = (unit_of_item[sold].astype(np.int64), sellers[sold])
+    return RemovalCurve(labels, revenues, cost_of_reviews, quantity, unit_sellers)
+
+
+class SubsetOptimum:
+    """
+    Best subset of sellers to keep found by `seller_subset_optimum`, compared to the best
+    greedy cut (removing a prefix of the worst sellers by gross profit).
+    """
+
+    def __init__(self, labels, revenues, cost_of_reviews, quantity, kept, item_penalty, greedy):
+        self.labels = np.asarray(labels)
+        self.kept = kept
+        self.item_penalty = item_penalty
+        self.greedy = greedy
+        self._totals = {
+            "n_removed": int((~kept).sum()),
+            "n_kept": int(kept.sum()),
+            "n_sellers": int(kept.sum()),
+            "n_items": int(quantity[kept].sum()),
+            "revenue": float(revenues[kept].sum()),
+            "review_cost": float(cost_of_reviews[kept].sum()),
+        }
+        totals = self._totals
+        totals["gross_profit"] = totals["revenue"] - totals["review_cost"]
+        totals["it_cost"] = float(it_cost(totals["n_sellers"], totals["n_items"]))
+        totals["net_profit"] = totals["gross_profit"] - totals["it_cost"]
+
+    @property
+    def net_profit(self):
+        return self._totals["net_profit"]
+
+    @property
+    def gap(self):
+        """
+        Net profit gained over the best greedy cut (>= 0).
+        """
+        return max(0.0, self.net_profit - self.greedy.best_net_profit)
+
+    @property
+    def removed(self):
+        return self.labels[~self.kept]
+
+    def totals(self):
+        """
+        Returns the totals of the subset, as RemovalCurve.totals.
+        """
+        return dict(self._totals)
+
+
+def _best_prefixes(gross, quantity, penalties, chunk_size=4_000_000):
+    # For every item penalty mu, sellers sorted by gross - mu * quantity: a seller penalty
+    # lambda keeps a prefix of that order, so all lambdas are one cumsum per mu.
+    # Returns (net profit, mu, kept prefix) of the best prefix over all (lambda, mu).
+    n = len(gross)
+    best = (-np.inf, 0.0, np.zeros(0, dtype=np.int64))
+    step = max(1, chunk_size // max(n, 1))
+    for start in range(0, len(penalties), step):
+        mus = penalties[start:start + step]
+        orders = np.argsort(-(gross[None, :] - mus[:, None] * quantity[None, :]), axis=1, kind="stable")
+        kept_gross = np.zeros((len(mus), n + 1))
+        kept_items = np.zeros((len(mus), n + 1))
+        kept_gross[:, 1:] = np.cumsum(gross[orders], axis=1)
+        kept_items[:, 1:] = np.cumsum(quantity[orders], axis=1)
+        net = kept_gross - it_cost(np.arange(n + 1)[None, :], kept_items)
+        row, k = np.unravel_index(np.argmax(net), net.shape)
+        if net[row, k] > best[0]:
+            best = (float(net[row, k]), float(mus[row]), orders[row, :k])
+    return best
+
+
+def seller_subset_optimum(sellers, n_penalties=64, n_refine=5):
+    """
+    Searches the subset of `sellers` (Seller.get_training_data()) to keep that maximizes
+    net profit, without restricting removals to the worst sellers by gross profit.
+
+    The IT cost is concave in the numbers of sellers and items, so the optimum keeps the
+    sellers with gross profit above a seller penalty lambda plus an item penalty mu per
+    item. The sweep covers every lambda exactly (prefixes of one sort) for `n_penalties`
+    values of mu spread over the marginal item costs BETA / (2 sqrt(items)), then
+    `n_refine` times around the mu of the best subset found. Every subset is evaluated
+    with the exact cost model, so the result is never worse than the greedy cut.
+    """
+    revenues = sellers["revenues"].to_numpy(dtype=float)
+    cost_of_reviews = sellers["cost_of_reviews"].to_numpy(dtype=float)
+    quantity = sellers["quantity"].to_numpy(dtype=float)
+    gross = revenues - cost_of_reviews
+    greedy = seller_removal_curve(sellers)
+
+    # Greedy cut as the starting point
+    kept = np.zeros(len(gross), dtype=bool)
+    kept[greedy.order[greedy.best_remove:]] = True
+    best_net, best_mu = greedy.best_net_profit, 0.0
+
+    total_items = max(quantity.sum(), 1.0)
+    penalties = np.concatenate([[0.0], BETA / (2 * np.sqrt(np.geomspace(1.0, total_items, n_penalties)))])
+    for step in range(n_refine + 1):
+        net, mu, prefix = _best_prefixes(gross, quantity, penalties)
+        if net > best_net + 1e-9:
+            best_net, best_mu = net, mu
+            kept = np.zeros(len(gross), dtype=bool)
+            kept[prefix] = True
+        elif step:
+            break
+        # Finer grid around the linearized item cost of the best subset
+        items = max(quantity[kept].sum(), 1.0)
+        center = max(best_mu, BETA / (2 * np.sqrt(items)))
+        penalties = center * np.geomspace(0.5, 2.0, n_penalties)
+    return SubsetOptimum(sellers["seller_id"].to_numpy(), revenues, cost_of_reviews, quantity,
+                         kept, best_mu, greedy)
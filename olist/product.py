@@ -1,17 +1,34 @@
 
 import pandas as pd
 import numpy as np
-from olist.data import Olist
+from olist.registry import registry
 from olist.order import Order
+from olist.join_index import get_join_index, star_stats
+from olist.features import compute_features, feature
+from olist.keys import merge_on_keys
+from olist.engines import get_engine
+from olist.cube import category_rollup, get_sales_cube
 
 
 class Product:
-    def __init__(self):
-        # Import data only once
-        olist = Olist()
-        self.data = olist.get_data()
+    def __init__(self, engine='pandas'):
+        # Import data only once (shared with every other feature class of the process)
+        self.data = registry.acquire()
         self.order = Order()
+        # engine='duckdb' or 'sqlite' computes get_training_data as SQL (see olist/sql.py),
+        # engine='streaming' reads the large tables in chunks (see olist/streaming.py),
+        # engine='polars' runs Polars LazyFrames (see olist/polars_engine.py)
+        self.engine = engine
+        self.backend = get_engine(engine)
 
+    def release(self):
+        """
+        Releases this instance's references on the shared datasets
+        """
+        self.order.release()
+        registry.release(tables=self.data)
+
+    @feature()
     def get_product_features(self):
         """
         Returns a DataFrame with:
@@ -34,6 +51,7 @@ class Product:
 
         return df
 
+    @feature()
     def get_price(self):
         """
         Return a DataFrame with:
@@ -42,45 +60,49 @@ class Product:
         order_items = self.data['order_items']
         # There are many different order_items per product_id, each with different prices. Take the mean of the various prices
         return order_items[['product_id',
-                            'price']].groupby('product_id').mean()
+                            'price']].groupby('product_id', observed=True).mean()
 
+    @feature('order.get_wait_time')
     def get_wait_time(self):
         """
         Returns a DataFrame with:
         'product_id', 'wait_time'
         """
+        index = get_join_index(self.data)
         orders_wait_time = self.order.get_wait_time()
-        orders_products = self.data['order_items'][['order_id', 'product_id']].drop_duplicates()
-        orders_products_with_time = orders_products.merge(orders_wait_time, on='order_id')
 
-        return orders_products_with_time.groupby('product_id',
-                          as_index=False).agg({'wait_time': 'mean'})
+        # Mean wait time over the (delivered) orders of each product, via the product -> orders index
+        wait_time, delivered = index.per_order(orders_wait_time['order_id'],
+                                               orders_wait_time['wait_time'])
+        n_orders = index.product_orders.segment_count(delivered)
+        n_timed = index.product_orders.segment_count(delivered & ~np.isnan(wait_time))
+        keep = np.flatnonzero(n_orders > 0)
 
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_wait_time = index.product_orders.segment_sum(wait_time)[keep] / n_timed[keep]
+        return pd.DataFrame({'product_id': index.products(keep),
+                             'wait_time': mean_wait_time})
+
+    @feature()
     def get_review_score(self):
         """
         Returns a DataFrame with:
         'product_id', 'share_of_five_stars', 'share_of_one_stars',
         'review_score'
         """
-        orders_reviews = self.order.get_review_score()
-        orders_products = self.data['order_items'][['order_id',
-                                         'product_id']].drop_duplicates()
-        df = orders_products.merge(orders_reviews, on='order_id')
-        result = df.groupby('product_id', as_index=False).agg({
-            'dim_is_one_star':
-            'mean',
-            'dim_is_five_star':
-            'mean',
-            'review_score':
-            'mean',
-        })
-        result.columns = [
-            'product_id', 'share_of_one_stars', 'share_of_five_stars',
-            'review_score'
-        ]
+        index = get_join_index(self.data)
+        reviews = self.data.table('order_reviews', ['order_id', 'review_score'])
+
+        # Star histogram of each product, summed over its orders (product -> orders index)
+        stars = index.product_orders.segment_sum(index.star_counts(reviews))
+        keep = np.flatnonzero(stars.sum(axis=1) > 0)
+
+        result = star_stats(stars[keep])
+        result.insert(0, 'product_id', index.products(keep))
 
         return result
 
+    @feature()
     def get_quantity(self):
         """
         Returns a DataFrame with:
@@ -89,27 +111,36 @@ class Product:
         order_items = self.data['order_items']
 
         n_orders =\
-            order_items.groupby('product_id')['order_id'].nunique().reset_index()
+            order_items.groupby('product_id', observed=True)['order_id'].nunique().reset_index()
         n_orders.columns = ['product_id', 'n_orders']
 
         quantity = \
-            order_items.groupby('product_id',
+            order_items.groupby('product_id', observed=True,
                                    as_index=False).agg({'order_id': 'count'})
         quantity.columns = ['product_id', 'quantity']
 
         return n_orders.merge(quantity, on='product_id')
 
+    @feature()
     def get_sales(self):
         """
         Returns a DataFrame with:
         'product_id', 'sales'
         """
         return self.data['order_items'][['product_id', 'price']]\
-            .groupby('product_id')\
+            .groupby('product_id', observed=True)\
             .sum()\
             .rename(columns={'price': 'sales'})
 
-    def get_training_data(self):
+    @feature(
+        'get_product_features',
+        'get_wait_time',
+        'get_price',
+        'get_review_score',
+        'get_quantity',
+        'get_sales',
+    )
+    def get_training_data(self, parallel=False, max_workers=None):
         """
         Returns a DataFrame with:
         ['product_id', 'product_name_length', 'product_description_length',
@@ -118,28 +149,41 @@ class Product:
        'price', 'share_of_one_stars', 'share_of_five_stars', 'review_score',
        'n_orders', 'quantity', 'sales'],
         """
-        training_set =\
-            self.get_product_features()\
-                .merge(
-                self.get_wait_time(), on='product_id'
-               ).merge(
-                self.get_price(), on='product_id'
-               ).merge(
-                self.get_review_score(), on='product_id'
-               ).merge(
-                self.get_quantity(), on='product_id'
-               ).merge(
-                self.get_sales(), on='product_id'
-               )
+        if self.backend is not None:
+            # Aggregations computed by the selected engine (SQL or streaming)
+            return self.backend.product_training_data().drop(
+                columns=['cost_of_reviews', 'revenues', 'profits'])
+
+        # Join on int32 surrogate keys rather than merging on hex strings
+        training_set = merge_on_keys(compute_features([
+            self.get_product_features,
+            self.get_wait_time,
+            self.get_price,
+            self.get_review_score,
+            self.get_quantity,
+            self.get_sales,
+        ], parallel=parallel, max_workers=max_workers), on='product_id')
 
         return training_set
 
+    def get_category_summary(self, start=None, end=None, categories=None, cost_map=None):
+        """
+        Returns sales, quantity, number of sellers, review scores, cost of reviews,
+        revenues and profits of every category over the months from `start` to `end`,
+        sliced from the precomputed seller x category x month cube (see olist/cube.py),
+        with reviews priced by `cost_map` ({stars: cost}, COST_MAP by default).
+        """
+        return get_sales_cube(self.data).by_category(start, end, categories, cost_map)
+
+    @feature('get_training_data')
     def get_product_cat(self, agg="mean"):
         '''
         Returns a DataFrame with `category` as index, and aggregating various properties for each category in columns such as:
         - `quantity`: total number of products sold for this category.
         - `product_weight_g`: mean or median weight per category
         - ...
+        `agg` can also be a list (e.g. ('mean', 'median')) or a {column: agg} dict.
+        The per-product training set is built once and memoized, so is each rollup
         '''
-        pass  # YOUR CODE HERE
+        return category_rollup(self.get_training_data(), agg)
 
@@ -3,17 +3,35 @@
 # - `04-Logistic-Regression/Recap/product_updated_solution.py`
 import pandas as pd
 import numpy as np
-from olist.data import Olist
+from olist.registry import registry
 from olist.order import Order
+from olist.join_index import get_join_index, reprice, review_costs, star_histogram_frame, star_stats, STAR_COLUMNS
+from olist.features import compute_features, feature
+from olist.keys import merge_on_keys
+from olist.engines import get_engine
+from olist.cube import category_rollup, get_sales_cube
+from olist.portfolio import product_removal_curve
 
 
 class Product:
-    def __init__(self):
-        # Import data only once
-        olist = Olist()
-        self.data = olist.get_data()
+    def __init__(self, engine='pandas'):
+        # Import data only once (shared with every other feature class of the process)
+        self.data = registry.acquire()
         self.order = Order()
+        # engine='duckdb' or 'sqlite' computes get_training_data as SQL (see olist/sql.py),
+        # engine='streaming' reads the large tables in chunks (see olist/streaming.py),
+        # engine='polars' runs Polars LazyFrames (see olist/polars_engine.py)
+        self.engine = engine
+        self.backend = get_engine(engine)
 
+    def release(self):
+        """
+        Releases this instance's references on the shared datasets
+        """
+        self.order.release()
+        registry.release(tables=self.data)
+
+    @feature()
     def get_product_features(self):
         """
         Returns a DataFrame with:
@@ -36,6 +54,7 @@ class Product:
 
         return df
 
+    @feature()
     def get_price(self):
         """
         Return a DataFrame with:
@@ -44,20 +63,30 @@ class Product:
         order_items = self.data['order_items']
         # There are many different order_items per product_id, each with different prices. Take the mean of the various prices
         return order_items[['product_id',
-                            'price']].groupby('product_id').mean()
+                            'price']].groupby('product_id', observed=True).mean()
 
+    @feature('order.get_wait_time')
     def get_wait_time(self):
         """
         Returns a DataFrame with:
         'product_id', 'wait_time'
         """
+        index = get_join_index(self.data)
         orders_wait_time = self.order.get_wait_time()
-        orders_products = self.data['order_items'][['order_id', 'product_id']].drop_duplicates()
-        orders_products_with_time = orders_products.merge(orders_wait_time, on='order_id')
 
-        return orders_products_with_time.groupby('product_id',
-                          as_index=False).agg({'wait_time': 'mean'})
+        # Mean wait time over the (delivered) orders of each product, via the product -> orders index
+        wait_time, delivered = index.per_order(orders_wait_time['order_id'],
+                                               orders_wait_time['wait_time'])
+        n_orders = index.product_orders.segment_count(delivered)
+        n_timed = index.product_orders.segment_count(delivered & ~np.isnan(wait_time))
+        keep = np.flatnonzero(n_orders > 0)
 
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_wait_time = index.product_orders.segment_sum(wait_time)[keep] / n_timed[keep]
+        return pd.DataFrame({'product_id': index.products(keep),
+                             'wait_time': mean_wait_time})
+
+    @feature()
     def get_quantity(self):
         """
         Returns a DataFrame with:
@@ -66,64 +95,69 @@ class Product:
         order_items = self.data['order_items']
 
         n_orders =\
-            order_items.groupby('product_id')['order_id'].nunique().reset_index()
+            order_items.groupby('product_id', observed=True)['order_id'].nunique().reset_index()
         n_orders.columns = ['product_id', 'n_orders']
 
         quantity = \
-            order_items.groupby('product_id',
+            order_items.groupby('product_id', observed=True,
                                    as_index=False).agg({'order_id': 'count'})
         quantity.columns = ['product_id', 'quantity']
 
         return n_orders.merge(quantity, on='product_id')
 
+    @feature()
     def get_sales(self):
         """
         Returns a DataFrame with:
         'product_id', 'sales'
         """
         return self.data['order_items'][['product_id', 'price']]\
-            .groupby('product_id')\
+            .groupby('product_id', observed=True)\
             .sum()\
             .rename(columns={'price': 'sales'})
 
-    def get_review_score(self):
+    @feature()
+    def get_star_histogram(self):
+        """
+        Returns a DataFrame with:
+        'product_id', 'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5'
+        (number of reviews with each score, for every reviewed product)
+        """
+        index = get_join_index(self.data)
+        reviews = self.data.table('order_reviews', ['order_id', 'review_score'])
+
+        # Star histogram of each product, summed over its orders (product -> orders index)
+        stars = index.product_orders.segment_sum(index.star_counts(reviews))
+        keep = np.flatnonzero(stars.sum(axis=1) > 0)
+        return star_histogram_frame(stars[keep], 'product_id', index.products(keep))
+
+    @feature('get_star_histogram')
+    def get_review_score(self, cost_map=None):
         """
         Returns a DataFrame with:
         'product_id', 'share_of_five_stars', 'share_of_one_stars',
-        'review_score'
-        """
-        orders_reviews = self.order.get_review_score()
-        orders_products = self.data['order_items'][['order_id',
-                                         'product_id']].drop_duplicates()
-        df = orders_products.merge(orders_reviews, on='order_id')
-
-        df['cost_of_reviews'] = df.review_score.map({
-            1: 100,
-            2: 50,
-            3: 40,
-            4: 0,
-            5: 0
-        })
-
-        df = df.groupby('product_id', as_index=False).agg({
-            'dim_is_one_star':
-            'mean',
-            'dim_is_five_star':
-            'mean',
-            'review_score':
-            'mean',
-            'cost_of_reviews':
-            'sum'
-        })
-        df.columns = [
-            'product_id', 'share_of_one_stars', 'share_of_five_stars',
-            'review_score', 'cost_of_reviews'
-        ]
+        'review_score', 'cost_of_reviews'
+        `cost_map` ({stars: cost}) defaults to olist.join_index.COST_MAP
+        """
+        histogram = self.get_star_histogram()
+        stars = histogram[STAR_COLUMNS].to_numpy()
+
+        df = star_stats(stars)
+        df.insert(0, 'product_id', histogram['product_id'].to_numpy())
+        df['cost_of_reviews'] = review_costs(stars, cost_map)
 
         return df
 
 
-    def get_training_data(self):
+    @feature(
+        'get_product_features',
+        'get_wait_time',
+        'get_price',
+        'get_review_score',
+        'get_quantity',
+        'get_sales',
+    )
+    def get_training_data(self, parallel=False, max_workers=None):
         """
         Returns a DataFrame with:
         ['product_id', 'product_name_length', 'product_description_length',
@@ -133,19 +167,19 @@ class Product:
         'cost_of_reviews', 'n_orders', 'quantity', 'sales', 'revenues',
         'profits']
         """
-        training_set =\
-            self.get_product_features()\
-                .merge(
-                self.get_wait_time(), on='product_id'
-               ).merge(
-                self.get_price(), on='product_id'
-               ).merge(
-                self.get_review_score(), on='product_id'
-               ).merge(
-                self.get_quantity(), on='product_id'
-               ).merge(
-                self.get_sales(), on='product_id'
-               )
+        if self.backend is not None:
+            # Aggregations computed by the selected engine (SQL or streaming)
+            return self.backend.product_training_data()
+
+        # Join on int32 surrogate keys rather than merging on hex strings
+        training_set = merge_on_keys(compute_features([
+            self.get_product_features,
+            self.get_wait_time,
+            self.get_price,
+            self.get_review_score,
+            self.get_quantity,
+            self.get_sales,
+        ], parallel=parallel, max_workers=max_workers), on='product_id')
 
         # compute the economics (revenues, profits)
         olist_sales_cut = 0.1
@@ -154,18 +188,44 @@ class Product:
             'cost_of_reviews']
         return training_set
 
+    def reprice(self, cost_map, training_set=None):
+        """
+        Returns the training set (get_training_data() by default) with cost_of_reviews
+        and profits re-evaluated for `cost_map` ({stars: cost}) from the stored star
+        histograms, without rebuilding any feature.
+        """
+        if training_set is None:
+            training_set = self.get_training_data()
+        return reprice(training_set, self.get_star_histogram(), 'product_id', cost_map)
+
+    @feature('get_training_data')
+    def get_removal_curve(self, level='product', cost_map=None):
+        """
+        Returns the RemovalCurve (olist/portfolio.py) of removing the worst products
+        (level='product') or categories (level='category'): net profit after IT costs
+        of every cut, and the optimal one. `cost_map` re-prices the reviews first.
+        """
+        products = self.get_training_data() if cost_map is None else self.reprice(cost_map)
+        order_items = self.data.table('order_items', ['product_id', 'seller_id'])
+        return product_removal_curve(products, order_items, level)
+
+    def get_category_summary(self, start=None, end=None, categories=None, cost_map=None):
+        """
+        Returns sales, quantity, number of sellers, review scores, cost of reviews,
+        revenues and profits of every category over the months from `start` to `end`,
+        sliced from the precomputed seller x category x month cube (see olist/cube.py),
+        with reviews priced by `cost_map` ({stars: cost}, COST_MAP by default).
+        """
+        return get_sales_cube(self.data).by_category(start, end, categories, cost_map)
+
+    @feature('get_training_data')
     def get_product_cat(self, agg="mean"):
         '''
         Returns a DataFrame with `category` as index, and aggregating various properties for each category in columns such as:
         - `quantity`: total number of products sold for this category.
         - `product_weight_g`: mean or median weight per category
         - ...
+        `agg` can also be a list (e.g. ('mean', 'median')) or a {column: agg} dict.
+        The per-product training set is built once and memoized, so is each rollup
         '''
-        products = self.get_training_data()
-
-        columns = list(products.select_dtypes(exclude=['object']).columns)
-        agg_params = dict(zip(columns, [agg] * len(columns)))
-        agg_params['quantity'] = 'sum'
-
-        product_cat = products.groupby("category").agg(agg_params)
-        return product_cat
+        return category_rollup(self.get_training_data(), agg)
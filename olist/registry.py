@@ -0,0 +1,131 @@
+from collections.abc import Mapping
+import threading
+from olist.data import Olist, FILES
+
+
+class SharedTables(Mapping):
+    """
+    Read-only view on the tables a feature class acquired from the registry.
+    Tables are loaded lazily (on first access) and shared with every other view.
+    """
+
+    def __init__(self, tables, names):
+        self._tables = tables
+        self._names = tuple(names)
+        # Set once the reference of this view is released (see DatasetRegistry.release)
+        self.released = False
+
+    def __getitem__(self, name):
+        if name not in self._names:
+            raise KeyError(name)
+        return self._tables[name]
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def table(self, name, columns=None):
+        """
+        Returns the table `name`, reading only `columns` when given.
+        """
+        if name not in self._names:
+            raise KeyError(name)
+        return self._tables.table(name, columns=columns)
+
+    @property
+    def snapshot(self):
+        return self._tables.snapshot
+
+    def derived(self, name, build):
+        """
+        Returns the structure `name` built once from the shared tables (see OlistTables.derived).
+        """
+        return self._tables.derived(name, build)
+
+    def persisted(self, key, source, build):
+        """
+        Returns the DataFrame `key` derived from the table `source` (see OlistTables.persisted).
+        """
+        if source not in self._names:
+            raise KeyError(source)
+        return self._tables.persisted(key, source, build)
+
+
+class DatasetRegistry:
+    """
+    Process-wide, reference-counted store of Olist tables.
+
+    Every feature class (Order, Seller, Product, Review) resolves its `.data` from here,
+    so each table is read at most once per process and the same DataFrame is shared by
+    all instances. The shared frames must be treated as read-only: copy before mutating.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._datasets = {}
+        self._refcounts = {}
+
+    def acquire(self, data_dir=None, tables=None):
+        """
+        Returns a read-only, lazy mapping {table: DataFrame} for `tables` (all Olist tables
+        by default) and takes one reference on each of them.
+        """
+        olist = Olist(data_dir)
+        data_dir = olist.data_dir.resolve()
+        tables = list(tables) if tables is not None else list(FILES)
+
+        with self._lock:
+            shared = self._datasets.setdefault(data_dir, olist.tables)
+            for table in tables:
+                key = (data_dir, table)
+                self._refcounts[key] = self._refcounts.get(key, 0) + 1
+
+        return SharedTables(shared, tables)
+
+    def release(self, data_dir=None, tables=None):
+        """
+        Drops one reference on each of `tables` (all Olist tables by default).
+        A table is evicted from memory once nobody holds a reference anymore.
+        When `tables` is the view returned by `acquire`, its references are dropped
+        only once: releasing the same view again is a no-op.
+        """
+        data_dir = Olist(data_dir).data_dir.resolve()
+        view = tables if isinstance(tables, SharedTables) else None
+        tables = list(tables) if tables is not None else list(FILES)
+
+        with self._lock:
+            if view is not None:
+                if view.released:
+                    return
+                view.released = True
+            for table in tables:
+                key = (data_dir, table)
+                if key not in self._refcounts:
+                    continue
+                self._refcounts[key] -= 1
+                if self._refcounts[key] <= 0:
+                    del self._refcounts[key]
+                    self._datasets[data_dir].evict(table)
+
+            if not any(key[0] == data_dir for key in self._refcounts):
+                self._datasets.pop(data_dir, None)
+
+    def clear(self):
+        """
+        Evicts every table regardless of outstanding references.
+        """
+        with self._lock:
+            self._datasets.clear()
+            self._refcounts.clear()
+
+    def loaded_tables(self):
+        """
+        Returns {(data_dir, table): refcount} for the tables currently referenced.
+        """
+        with self._lock:
+            return dict(self._refcounts)
+
+
+registry = DatasetRegistry()
@@ -1,18 +1,24 @@
 import pandas as pd
 import numpy as np
 import math
-from olist.data import Olist
+from olist.registry import registry
 from olist.order import Order
 
 
 class Review:
 
     def __init__(self):
-        # Import data only once
-        olist = Olist()
-        self.data = olist.get_data()
+        # Import data only once (shared with every other feature class of the process)
+        self.data = registry.acquire()
         self.order = Order()
 
+    def release(self):
+        """
+        Releases this instance's references on the shared datasets
+        """
+        self.order.release()
+        registry.release(tables=self.data)
+
     def get_review_length(self):
         """
         Returns a DataFrame with:
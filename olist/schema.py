@@ -0,0 +1,118 @@
+import pandas as pd
+
+# Column types of the Olist tables, applied once at load time:
+# - "category": hex ids, cities, states and other repeated labels (stored once, int codes per row)
+# - "datetime": timestamps, parsed once so that feature methods never call pd.to_datetime again
+# - "int": integer columns, downcast to the smallest integer type that fits
+# Columns that are not declared (prices, coordinates, free text) keep the type read_csv infers.
+SCHEMA = {
+    "customers": {
+        "customer_id": "category",
+        "customer_unique_id": "category",
+        "customer_zip_code_prefix": "int",
+        "customer_city": "category",
+        "customer_state": "category",
+    },
+    "geolocation": {
+        "geolocation_zip_code_prefix": "int",
+        "geolocation_city": "category",
+        "geolocation_state": "category",
+    },
+    "order_items": {
+        "order_id": "category",
+        "order_item_id": "int",
+        "product_id": "category",
+        "seller_id": "category",
+        "shipping_limit_date": "datetime",
+    },
+    "order_payments": {
+        "order_id": "category",
+        "payment_sequential": "int",
+        "payment_type": "category",
+        "payment_installments": "int",
+    },
+    "order_reviews": {
+        "review_id": "category",
+        "order_id": "category",
+        "review_score": "int",
+        "review_creation_date": "datetime",
+        "review_answer_timestamp": "datetime",
+    },
+    "orders": {
+        "order_id": "category",
+        "customer_id": "category",
+        "order_status": "category",
+        "order_purchase_timestamp": "datetime",
+        "order_approved_at": "datetime",
+        "order_delivered_carrier_date": "datetime",
+        "order_delivered_customer_date": "datetime",
+        "order_estimated_delivery_date": "datetime",
+    },
+    "products": {
+        "product_id": "category",
+        "product_category_name": "category",
+    },
+    "sellers": {
+        "seller_id": "category",
+        "seller_zip_code_prefix": "int",
+        "seller_city": "category",
+        "seller_state": "category",
+    },
+    "product_category_name_translation": {},
+}
+
+
+def columns_of_type(table, kind, columns=None):
+    """
+    Returns the columns of `table` declared as `kind`, restricted to `columns` when given.
+    """
+    spec = SCHEMA.get(table, {})
+    return [
+        column for column, column_kind in spec.items()
+        if column_kind == kind and (columns is None or column in columns)
+    ]
+
+
+def apply_schema(table, df):
+    """
+    Casts the columns of `df` to the types declared for `table`. Columns already
+    of the right type are left untouched.
+    """
+    for column, kind in SCHEMA.get(table, {}).items():
+        if column not in df.columns:
+            continue
+        if kind == "category" and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype("category")
+        elif kind == "datetime" and not pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = pd.to_datetime(df[column], errors="coerce")
+        elif kind == "int" and pd.api.types.is_integer_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column], downcast="integer")
+    return df
+
+
+def read_csv(path, table, columns=None):
+    """
+    Reads an Olist CSV with the column types declared in SCHEMA
+    (only `columns`, in that order, when given).
+    """
+    dtype = {column: "category" for column in columns_of_type(table, "category", columns)}
+    parse_dates = columns_of_type(table, "datetime", columns)
+
+    df = apply_schema(table, pd.read_csv(path, usecols=columns, dtype=dtype, parse_dates=parse_dates))
+    if columns is not None:
+        df = df[list(columns)]
+    return df
+
+
+def read_csv_chunks(path, table, columns=None, chunksize=100_000):
+    """
+    Reads an Olist CSV like read_csv, as an iterator of DataFrames of at most `chunksize` rows.
+    Categorical columns are typed per chunk (their categories differ from chunk to chunk).
+    """
+    dtype = {column: "category" for column in columns_of_type(table, "category", columns)}
+    parse_dates = columns_of_type(table, "datetime", columns)
+
+    for chunk in pd.read_csv(path, usecols=columns, dtype=dtype, parse_dates=parse_dates,
+                             chunksize=chunksize):
+        chunk = apply_schema(table, chunk)
+        yield chunk if columns is None else chunk[list(columns)]
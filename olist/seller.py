@@ -1,16 +1,26 @@
 import pandas as pd
 import numpy as np
-from olist.data import Olist
+from olist.registry import registry
 from olist.order import Order
+from olist.join_index import get_join_index, star_stats
+from olist.features import compute_features, feature
+from olist.keys import merge_on_keys
 
 
 class Seller:
     def __init__(self):
-        # Import data only once
-        olist = Olist()
-        self.data = olist.get_data()
+        # Import data only once (shared with every other feature class of the process)
+        self.data = registry.acquire()
         self.order = Order()
 
+    def release(self):
+        """
+        Releases this instance's references on the shared datasets
+        """
+        self.order.release()
+        registry.release(tables=self.data)
+
+    @feature()
     def get_seller_features(self):
         """
         Returns a DataFrame with:
@@ -23,26 +33,23 @@ class Seller:
             inplace=True)  # There can be multiple rows per seller
         return sellers
 
+    @feature()
     def get_seller_delay_wait_time(self):
         """
         Returns a DataFrame with:
         'seller_id', 'delay_to_carrier', 'wait_time'
         """
         # Get data
-        order_items = self.data['order_items'].copy()
-        orders = self.data['orders'].query("order_status=='delivered'").copy()
+        order_items = self.data.table(
+            'order_items', ['order_id', 'seller_id', 'shipping_limit_date'])
+        orders = self.data.table('orders', [
+            'order_id', 'order_status', 'order_purchase_timestamp',
+            'order_delivered_carrier_date', 'order_delivered_customer_date'
+        ]).query("order_status=='delivered'").copy()
 
         ship = order_items.merge(orders, on='order_id')
 
-        # Handle datetime
-        ship.loc[:, 'shipping_limit_date'] = pd.to_datetime(
-            ship['shipping_limit_date'])
-        ship.loc[:, 'order_delivered_carrier_date'] = pd.to_datetime(
-            ship['order_delivered_carrier_date'])
-        ship.loc[:, 'order_delivered_customer_date'] = pd.to_datetime(
-            ship['order_delivered_customer_date'])
-        ship.loc[:, 'order_purchase_timestamp'] = pd.to_datetime(
-            ship['order_purchase_timestamp'])
+        # Datetimes are already parsed at load time (see olist.schema)
 
         # Compute delay and wait_time
         def delay_to_logistic_partner(d):
@@ -60,12 +67,12 @@ class Seller:
                 / np.timedelta64(24, 'h'))
             return days
 
-        delay = ship.groupby('seller_id')\
+        delay = ship.groupby('seller_id', observed=True)\
                     .apply(delay_to_logistic_partner)\
                     .reset_index()
         delay.columns = ['seller_id', 'delay_to_carrier']
 
-        wait = ship.groupby('seller_id')\
+        wait = ship.groupby('seller_id', observed=True)\
                    .apply(order_wait_time)\
                    .reset_index()
         wait.columns = ['seller_id', 'wait_time']
@@ -74,50 +81,44 @@ class Seller:
 
         return df
 
+    @feature()
     def get_active_dates(self):
         """
         Returns a DataFrame with:
         'seller_id', 'date_first_sale', 'date_last_sale', 'months_on_olist'
         """
-        # First, get only orders that are approved
-        orders_approved = self.data['orders'][[
-            'order_id', 'order_approved_at'
-        ]].dropna()
-
-        # Then, create a (orders <> sellers) join table because a seller can appear multiple times in the same order
-        orders_sellers = orders_approved.merge(self.data['order_items'],
-                                               on='order_id')[[
-                                                   'order_id', 'seller_id',
-                                                   'order_approved_at'
-                                               ]].drop_duplicates()
-        orders_sellers["order_approved_at"] = pd.to_datetime(
-            orders_sellers["order_approved_at"])
-
-        # Compute dates
-        orders_sellers["date_first_sale"] = orders_sellers["order_approved_at"]
-        orders_sellers["date_last_sale"] = orders_sellers["order_approved_at"]
-        df = orders_sellers.groupby('seller_id').agg({
-            "date_first_sale": "min",
-            "date_last_sale": "max"
-        })
+        index = get_join_index(self.data)
+        orders = self.data.table('orders', ['order_id', 'order_approved_at'])
+
+        # Min/max approval date over the (deduplicated) orders of each seller,
+        # read from the seller -> orders index instead of an (orders <> sellers) join table
+        n_orders, first, last = index.first_last(
+            index.seller_orders, orders['order_id'], orders['order_approved_at'])
+        keep = np.flatnonzero(n_orders > 0)
+
+        df = pd.DataFrame({
+            "date_first_sale": first[keep],
+            "date_last_sale": last[keep]
+        }, index=pd.Index(index.sellers(keep), name='seller_id'))
         df['months_on_olist'] = round(
             (df['date_last_sale'] - df['date_first_sale']) /
             np.timedelta64(30, 'D'))
         return df
 
+    @feature()
     def get_quantity(self):
         """
         Returns a DataFrame with:
         'seller_id', 'n_orders', 'quantity', 'quantity_per_order'
         """
-        order_items = self.data['order_items']
+        order_items = self.data.table('order_items', ['order_id', 'seller_id'])
 
-        n_orders = order_items.groupby('seller_id')['order_id']\
+        n_orders = order_items.groupby('seller_id', observed=True)['order_id']\
             .nunique()\
             .reset_index()
         n_orders.columns = ['seller_id', 'n_orders']
 
-        quantity = order_items.groupby('seller_id', as_index=False).agg(
+        quantity = order_items.groupby('seller_id', observed=True, as_index=False).agg(
             {'order_id': 'count'})
         quantity.columns = ['seller_id', 'quantity']
 
@@ -125,52 +126,53 @@ class Seller:
         result['quantity_per_order'] = result['quantity'] / result['n_orders']
         return result
 
+    @feature()
     def get_sales(self):
         """
         Returns a DataFrame with:
         'seller_id', 'sales'
         """
-        return self.data['order_items'][['seller_id', 'price']]\
-            .groupby('seller_id')\
+        return self.data.table('order_items', ['seller_id', 'price'])\
+            .groupby('seller_id', observed=True)\
             .sum()\
             .rename(columns={'price': 'sales'})
 
 
+    @feature()
     def get_review_score(self):
-        orders_reviews = self.order.get_review_score()
-        orders_sellers = self.data['order_items'][['order_id', 'seller_id']].drop_duplicates()
-
-        df = orders_sellers.merge(orders_reviews, on='order_id')
-
-        res = df.groupby('seller_id', as_index=False).agg({
-            'dim_is_one_star': 'mean',
-            'dim_is_five_star': 'mean',
-            'review_score': 'mean'
-        })
-
-        res.columns = [
-            'seller_id',
-            'share_of_one_stars',
-            'share_of_five_stars',
-            'review_score'
-        ]
+        index = get_join_index(self.data)
+        reviews = self.data.table('order_reviews', ['order_id', 'review_score'])
+
+        # Star histogram of each seller, summed over its orders (seller -> orders index)
+        stars = index.seller_orders.segment_sum(index.star_counts(reviews))
+        keep = np.flatnonzero(stars.sum(axis=1) > 0)
+
+        res = star_stats(stars[keep])
+        res.insert(0, 'seller_id', index.sellers(keep))
 
         res['cost_of_reviews'] = 0.0
         return res
 
 
 
-    def get_training_data(self):
-        training_set = (
-            self.get_seller_features()
-                .merge(self.get_seller_delay_wait_time(), on='seller_id')
-                .merge(self.get_active_dates(), on='seller_id')
-                .merge(self.get_quantity(), on='seller_id')
-                .merge(self.get_sales().reset_index(), on='seller_id')
-        )
-
-        review_df = self.get_review_score()
-        training_set = training_set.merge(review_df, on='seller_id')
+    @feature(
+        'get_seller_features',
+        'get_seller_delay_wait_time',
+        'get_active_dates',
+        'get_quantity',
+        'get_sales',
+        'get_review_score',
+    )
+    def get_training_data(self, parallel=False, max_workers=None):
+        # Join on int32 surrogate keys rather than merging on hex strings
+        training_set = merge_on_keys(compute_features([
+            self.get_seller_features,
+            self.get_seller_delay_wait_time,
+            self.get_active_dates,
+            self.get_quantity,
+            self.get_sales,
+            self.get_review_score,
+        ], parallel=parallel, max_workers=max_workers), on='seller_id')
 
         training_set['revenues'] = training_set['sales']
         training_set['profits'] = training_set['revenues'] - training_set['cost_of_reviews']
@@ -0,0 +1,282 @@
+import threading
+import numpy as np
+import pandas as pd
+
+from olist import schema
+from olist.join_index import STARS, review_costs, star_stats
+from olist.keys import ids, merge_on_keys
+
+ORDER_COLUMNS = [
+    "order_id", "order_status", "order_purchase_timestamp", "order_approved_at",
+    "order_delivered_carrier_date", "order_delivered_customer_date",
+]
+ITEM_COLUMNS = ["order_id", "seller_id", "shipping_limit_date", "price"]
+REVIEW_COLUMNS = ["order_id", "review_score"]
+SELLER_COLUMNS = ["seller_id", "seller_city", "seller_state"]
+
+# Per-seller partial state: every aggregate of the training set is a sum, a count,
+# a min or a max of these, so merging a batch is an element-wise update
+SUMS = ["delay_sum", "wait_sum", "sales"]
+COUNTS = ["delay_count", "wait_count", "delivered_items", "dated_orders", "n_orders", "quantity", "n_items"]
+
+
+def _typed(table, frame, columns):
+    # Batch rows may come straight from a CSV: cast them like the loaded tables
+    return schema.apply_schema(table, frame[columns].copy())
+
+
+def _days(delta):
+    return delta / np.timedelta64(1, "D")
+
+
+def seller_training_set(sellers, state, first_sale, last_sale, stars):
+    """
+    Builds the columns of `Seller.get_training_data()` from per-seller partial state
+    (arrays indexed by seller key: SUMS, COUNTS, first/last approval dates as int64 ns
+    and the (n_sellers, 5) star histogram).
+    """
+    def frame(present, **columns):
+        keep = np.flatnonzero(present)
+        out = pd.DataFrame({name: values[keep] for name, values in columns.items()})
+        out.insert(0, "seller_id", ids.decode(keep, "seller_id"))
+        return out
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        delays = frame(
+            state["delivered_items"] > 0,
+            delay_to_carrier=state["delay_sum"] / np.where(state["delay_count"] > 0, state["delay_count"], np.nan),
+            wait_time=state["wait_sum"] / np.where(state["wait_count"] > 0, state["wait_count"], np.nan),
+        )
+        quantity = frame(
+            state["n_items"] > 0,
+            n_orders=state["n_orders"],
+            quantity=state["quantity"],
+            quantity_per_order=state["quantity"] / state["n_orders"],
+        )
+
+    dates = frame(
+        state["dated_orders"] > 0,
+        date_first_sale=first_sale.view("datetime64[ns]"),
+        date_last_sale=last_sale.view("datetime64[ns]"),
+    )
+    dates["months_on_olist"] = (
+        (dates["date_last_sale"] - dates["date_first_sale"]) / np.timedelta64(30, "D")
+    ).round()
+
+    sales = frame(state["n_items"] > 0, sales=state["sales"])
+
+    reviewed = stars.sum(axis=1) > 0
+    reviews = star_stats(stars[reviewed])
+    reviews.insert(0, "seller_id", ids.decode(np.flatnonzero(reviewed), "seller_id"))
+    reviews["cost_of_reviews"] = review_costs(stars[reviewed])
+
+    df = merge_on_keys([sellers, delays, dates, quantity, sales, reviews], on="seller_id")
+    df["revenues"] = 0.1 * df["sales"] + 80 * df["months_on_olist"]
+    df["profits"] = df["revenues"] - df["cost_of_reviews"]
+
+    keep_cols = [
+        "seller_id", "seller_city", "seller_state",
+        "delay_to_carrier", "wait_time",
+        "date_first_sale", "date_last_sale", "months_on_olist",
+        "n_orders", "quantity", "quantity_per_order", "sales",
+        "share_of_one_stars", "share_of_five_stars", "review_score",
+        "cost_of_reviews", "revenues", "profits",
+    ]
+    return df[keep_cols]
+
+
+class SellerAggregates:
+    """
+    Mergeable per-seller state behind `Seller.get_training_data()` (olist/seller_updated.py).
+
+    `append(orders, order_items, order_reviews)` folds a batch of new rows into the state and
+    only updates the sellers of that batch, so its cost tracks the size of the batch, not of
+    the history. `training_set()` returns the same columns as `Seller.get_training_data()`.
+
+    Appended orders must be new (an order id is only appended once) and come with their
+    items. Reviews may refer to orders of any batch, including later ones. Seller rows are
+    only added for sellers not listed yet. A batch is typed and checked before any state
+    changes, so a failing `append` leaves the state untouched.
+    """
+
+    def __init__(self, sellers: pd.DataFrame):
+        self._lock = threading.Lock()
+        # Seller rows, kept as one frame per batch (concatenated on read) so that appending
+        # new sellers does not copy the ones already listed
+        self._seller_rows = []
+        self._listed = np.zeros(0, dtype=bool)
+        self._list_sellers(sellers[SELLER_COLUMNS].drop_duplicates())
+        self._state = {name: np.zeros(0) for name in SUMS}
+        self._state.update({name: np.zeros(0, dtype=np.int64) for name in COUNTS})
+        self._first_sale = np.zeros(0, dtype=np.int64)
+        self._last_sale = np.zeros(0, dtype=np.int64)
+        self._stars = np.zeros((0, len(STARS)), dtype=np.int64)
+
+        # order key -> seller keys of that order, and star counts of orders not appended yet
+        self._order_sellers = {}
+        self._pending_stars = {}
+
+    # -----------------------------
+    # State
+    # -----------------------------
+    def _grow(self):
+        size = ids.size("seller_id")
+        extra = size - len(self._first_sale)
+        if extra <= 0:
+            return
+        for name, values in self._state.items():
+            self._state[name] = np.concatenate([values, np.zeros(extra, dtype=values.dtype)])
+        self._first_sale = np.concatenate([self._first_sale, np.full(extra, np.iinfo(np.int64).max)])
+        self._last_sale = np.concatenate([self._last_sale, np.full(extra, np.iinfo(np.int64).min)])
+        self._stars = np.concatenate([self._stars, np.zeros((extra, len(STARS)), dtype=np.int64)])
+
+    @property
+    def sellers(self) -> pd.DataFrame:
+        """
+        Returns the seller_id, seller_city and seller_state rows of the listed sellers.
+        """
+        with self._lock:
+            if len(self._seller_rows) != 1:
+                rows = pd.concat(self._seller_rows, ignore_index=True) if self._seller_rows else None
+                self._seller_rows = [schema.apply_schema("sellers", rows)] if rows is not None else []
+            return self._seller_rows[0] if self._seller_rows else pd.DataFrame(columns=SELLER_COLUMNS)
+
+    def _new_sellers(self, rows):
+        # Rows of `rows` whose seller is not listed yet (first row of each seller)
+        keys = ids.encode(rows["seller_id"], "seller_id")
+        listed = np.zeros(max(ids.size("seller_id"), len(self._listed)), dtype=bool)
+        listed[:len(self._listed)] = self._listed
+        first = ~pd.Series(keys).duplicated().to_numpy()
+        new = (keys >= 0) & first & ~listed[np.maximum(keys, 0)]
+        return rows[new], keys[new], listed
+
+    def _list_sellers(self, rows):
+        rows, keys, listed = self._new_sellers(rows)
+        listed[keys] = True
+        self._listed = listed
+        if len(rows):
+            self._seller_rows.append(rows.reset_index(drop=True))
+
+    def _add(self, name, sellers, values=1):
+        np.add.at(self._state[name], sellers, values)
+
+    def _add_stars(self, order, stars):
+        sellers = self._order_sellers.get(order)
+        if sellers is None:
+            pending = self._pending_stars.setdefault(order, np.zeros(len(STARS), dtype=np.int64))
+            pending += stars
+            return ()
+        self._stars[list(sellers)] += stars
+        return sellers
+
+    # -----------------------------
+    # Append a batch
+    # -----------------------------
+    def append(self, orders: pd.DataFrame, order_items: pd.DataFrame,
+               order_reviews: pd.DataFrame | None = None, sellers: pd.DataFrame | None = None):
+        """
+        Folds a batch of new `orders` (with their `order_items`), `order_reviews` and
+        `sellers` rows into the state. Returns the ids of the sellers it updated.
+        """
+        # The whole batch is typed and checked before any state changes
+        orders = _typed("orders", orders, ORDER_COLUMNS)
+        items = _typed("order_items", order_items, ITEM_COLUMNS)
+        reviews = None if order_reviews is None else _typed("order_reviews", order_reviews, REVIEW_COLUMNS)
+        seller_rows = None if sellers is None else _typed("sellers", sellers, SELLER_COLUMNS)
+
+        with self._lock:
+            order_keys = ids.encode(orders["order_id"], "order_id")
+            known = [key for key in order_keys if key in self._order_sellers]
+            if known:
+                raise ValueError(f"{len(known)} orders were already appended: "
+                                 f"{list(ids.decode(known[:5], 'order_id'))}")
+            item_orders = ids.encode(items["order_id"], "order_id")
+            item_sellers = ids.encode(items["seller_id"], "seller_id")
+            if reviews is not None:
+                review_orders = ids.encode(reviews["order_id"], "order_id")
+                scores = reviews["review_score"].to_numpy(dtype=float, na_value=np.nan)
+
+            # Only sellers not listed yet are added: cost of the batch, not of the history
+            if seller_rows is not None:
+                self._list_sellers(seller_rows)
+            self._grow()
+            updated = set()
+
+            # Quantity and sales: every item row
+            has_seller = item_sellers >= 0
+            self._add("n_items", item_sellers[has_seller])
+            self._add("quantity", item_sellers[has_seller & (item_orders >= 0)])
+            self._add("sales", item_sellers[has_seller],
+                      np.nan_to_num(items["price"].to_numpy(dtype=float)[has_seller]))
+            updated.update(item_sellers[has_seller].tolist())
+
+            # Distinct (order, seller) pairs: n_orders, and the sellers reviews are credited to
+            pairs = pd.DataFrame({"order": item_orders, "seller": item_sellers})
+            pairs = pairs[(pairs["order"] >= 0) & has_seller].drop_duplicates()
+            new_orders = set()
+            for order, seller in zip(pairs["order"].tolist(), pairs["seller"].tolist()):
+                sellers_of_order = self._order_sellers.setdefault(order, [])
+                if seller not in sellers_of_order:
+                    sellers_of_order.append(seller)
+                    self._state["n_orders"][seller] += 1
+                    new_orders.add(order)
+
+            # Delivery delays and active dates: items joined with the orders of the batch
+            batch_orders = orders.assign(order=order_keys)
+            shipped = pd.DataFrame({
+                "order": item_orders, "seller": item_sellers,
+                "shipping_limit_date": items["shipping_limit_date"].to_numpy(),
+            })[has_seller].merge(batch_orders, on="order", how="inner")
+
+            delivered = shipped[shipped["order_status"] == "delivered"]
+            delay = _days(delivered["order_delivered_carrier_date"] - delivered["shipping_limit_date"])
+            delay = delay.clip(lower=0).to_numpy()
+            wait = _days(delivered["order_delivered_customer_date"]
+                         - delivered["order_purchase_timestamp"]).to_numpy()
+            delivered_sellers = delivered["seller"].to_numpy()
+            self._add("delivered_items", delivered_sellers)
+            self._add("delay_sum", delivered_sellers, np.nan_to_num(delay))
+            self._add("delay_count", delivered_sellers, ~np.isnan(delay))
+            self._add("wait_sum", delivered_sellers, np.nan_to_num(wait))
+            self._add("wait_count", delivered_sellers, ~np.isnan(wait))
+
+            dated = shipped[["order", "seller", "order_approved_at"]].drop_duplicates(["order", "seller"])
+            dated = dated[dated["order_approved_at"].notna()]
+            dated_sellers = dated["seller"].to_numpy()
+            approved = dated["order_approved_at"].to_numpy().view(np.int64)
+            self._add("dated_orders", dated_sellers)
+            np.minimum.at(self._first_sale, dated_sellers, approved)
+            np.maximum.at(self._last_sale, dated_sellers, approved)
+
+            # Reviews received before their order was appended
+            for order in new_orders:
+                stars = self._pending_stars.pop(order, None)
+                if stars is not None:
+                    updated.update(self._add_stars(order, stars))
+
+            if reviews is not None:
+                valid = (review_orders >= 0) & np.isin(scores, STARS)
+                if not valid.any():
+                    return ids.decode(sorted(updated), "seller_id")
+                histogram = pd.crosstab(review_orders[valid], scores[valid].astype(np.int64))
+                histogram = histogram.reindex(columns=STARS, fill_value=0)
+                for order, stars in zip(histogram.index.tolist(), histogram.to_numpy()):
+                    updated.update(self._add_stars(order, stars))
+
+        return ids.decode(sorted(updated), "seller_id")
+
+    # -----------------------------
+    # Training set
+    # -----------------------------
+    def training_set(self) -> pd.DataFrame:
+        """
+        Returns the seller training set of everything appended so far, with the
+        columns of `Seller.get_training_data()`.
+        """
+        with self._lock:
+            self._grow()
+            state = {name: values.copy() for name, values in self._state.items()}
+            first_sale, last_sale = self._first_sale.copy(), self._last_sale.copy()
+            stars = self._stars.copy()
+
+        return seller_training_set(self.sellers, state, first_sale, last_sale, stars)
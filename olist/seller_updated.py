@@ -2,31 +2,49 @@
 from __future__ import annotations
 
 from pathlib import Path
+from typing import Mapping
 import pandas as pd
 import numpy as np
 
+from olist.features import compute_features, feature
+from olist.join_index import get_join_index, reprice, review_costs, star_histogram_frame, star_stats, STAR_COLUMNS
+from olist.keys import ids, merge_on_keys
+from olist.registry import registry
+from olist.engines import get_engine
+from olist.seller_incremental import (ITEM_COLUMNS, ORDER_COLUMNS, REVIEW_COLUMNS, SellerAggregates,
+                                      seller_training_set)
+from olist.timeline import get_seller_timeline
+from olist.cube import get_sales_cube
+
 
 class Seller:
     """
     CEO_request projesi için seller bazlı eğitim datası üretir.
     CSV'leri repo kökündeki `data/` klasöründen Path ile okur.
+
+    engine="duckdb" veya "sqlite" ile get_training_data SQL olarak gömülü bir veritabanında
+    hesaplanır (bkz. olist/sql.py), engine="streaming" ile büyük tablolar parça parça okunur
+    (bkz. olist/streaming.py), engine="polars" ile Polars LazyFrame kullanılır
+    (bkz. olist/polars_engine.py); varsayılan "pandas".
     """
 
-    def __init__(self, data_dir: str | Path | None = None):
+    REQUIRED_FILES = {
+        "sellers": "olist_sellers_dataset.csv",
+        "orders": "olist_orders_dataset.csv",
+        "order_items": "olist_order_items_dataset.csv",
+        "order_reviews": "olist_order_reviews_dataset.csv",
+    }
+
+    def __init__(self, data_dir: str | Path | None = None, engine: str = "pandas"):
         base_dir = Path(__file__).resolve().parent          # .../olist
         project_root = base_dir.parent                      # .../CEO_talebi_takim1
         self.data_dir = Path(data_dir) if data_dir else (project_root / "data")
         self.data = self._load_data()
+        self.engine = engine
+        self.backend = get_engine(engine, self.data_dir)
 
-    def _load_data(self) -> dict[str, pd.DataFrame]:
-        required = {
-            "sellers": "olist_sellers_dataset.csv",
-            "orders": "olist_orders_dataset.csv",
-            "order_items": "olist_order_items_dataset.csv",
-            "order_reviews": "olist_order_reviews_dataset.csv",
-        }
-
-        missing = [f for f in required.values() if not (self.data_dir / f).exists()]
+    def _load_data(self) -> Mapping[str, pd.DataFrame]:
+        missing = [f for f in self.REQUIRED_FILES.values() if not (self.data_dir / f).exists()]
         if missing:
             raise FileNotFoundError(
                 "Gerekli CSV dosyaları bulunamadı.\n"
@@ -34,44 +52,36 @@ class Seller:
                 f"Eksik dosyalar: {missing}"
             )
 
-        sellers = pd.read_csv(self.data_dir / required["sellers"], dtype={"seller_id": "string"})
-        orders = pd.read_csv(self.data_dir / required["orders"], dtype={"order_id": "string"})
-        order_items = pd.read_csv(
-            self.data_dir / required["order_items"],
-            dtype={"order_id": "string", "seller_id": "string"},
-        )
-        order_reviews = pd.read_csv(self.data_dir / required["order_reviews"], dtype={"order_id": "string"})
+        # Tables are shared process-wide (read-only): each one is read at most once
+        return registry.acquire(self.data_dir, tables=self.REQUIRED_FILES)
 
-        return {
-            "sellers": sellers,
-            "orders": orders,
-            "order_items": order_items,
-            "order_reviews": order_reviews,
-        }
+    def release(self) -> None:
+        """Releases this instance's reference on the shared tables."""
+        registry.release(self.data_dir, tables=self.data)
 
     # -----------------------------
     # Basic seller features
     # -----------------------------
+    @feature()
     def get_seller_features(self) -> pd.DataFrame:
-        return self.data["sellers"][["seller_id", "seller_city", "seller_state"]].drop_duplicates()
+        return self.data.table("sellers", ["seller_id", "seller_city", "seller_state"]).drop_duplicates()
 
     # -----------------------------
     # Delay to carrier & wait time (delivered orders only)
     # -----------------------------
+    @feature()
     def get_seller_delay_wait_time(self) -> pd.DataFrame:
-        order_items = self.data["order_items"][["order_id", "seller_id", "shipping_limit_date"]].copy()
-        orders = self.data["orders"][
+        order_items = self.data.table("order_items", ["order_id", "seller_id", "shipping_limit_date"])
+        orders = self.data.table(
+            "orders",
             ["order_id", "order_status", "order_purchase_timestamp",
-             "order_delivered_carrier_date", "order_delivered_customer_date"]
-        ].copy()
+             "order_delivered_carrier_date", "order_delivered_customer_date"],
+        )
 
         orders = orders.query("order_status == 'delivered'").copy()
         ship = order_items.merge(orders, on="order_id", how="inner")
 
-        for col in ["shipping_limit_date", "order_purchase_timestamp",
-                    "order_delivered_carrier_date", "order_delivered_customer_date"]:
-            ship[col] = pd.to_datetime(ship[col], errors="coerce")
-
+        # Datetimes are already parsed at load time (see olist.schema)
         ship["delay_to_carrier_days"] = (
             (ship["order_delivered_carrier_date"] - ship["shipping_limit_date"]) / np.timedelta64(1, "D")
         ).clip(lower=0)
@@ -80,7 +90,7 @@ class Seller:
             (ship["order_delivered_customer_date"] - ship["order_purchase_timestamp"]) / np.timedelta64(1, "D")
         )
 
-        out = ship.groupby("seller_id", as_index=False).agg(
+        out = ship.groupby("seller_id", observed=True, as_index=False).agg(
             delay_to_carrier=("delay_to_carrier_days", "mean"),
             wait_time=("wait_time_days", "mean"),
         )
@@ -89,17 +99,35 @@ class Seller:
     # -----------------------------
     # Active dates
     # -----------------------------
-    def get_active_dates(self) -> pd.DataFrame:
-        orders = self.data["orders"][["order_id", "order_approved_at"]].dropna().copy()
-        order_items = self.data["order_items"][["order_id", "seller_id"]].drop_duplicates()
-
-        orders_sellers = order_items.merge(orders, on="order_id", how="inner")
-        orders_sellers["order_approved_at"] = pd.to_datetime(orders_sellers["order_approved_at"], errors="coerce")
-
-        dates = orders_sellers.groupby("seller_id", as_index=False).agg(
-            date_first_sale=("order_approved_at", "min"),
-            date_last_sale=("order_approved_at", "max"),
+    @feature()
+    def get_active_dates(self, as_of=None) -> pd.DataFrame:
+        if as_of is not None:
+            # First/last approval up to `as_of`, from the time-sorted seller events
+            _, first, last, _ = get_seller_timeline(self.data).state(as_of)
+            keep = np.flatnonzero(first <= last)
+            dates = pd.DataFrame({
+                "seller_id": ids.decode(keep, "seller_id"),
+                "date_first_sale": first[keep].view("datetime64[ns]"),
+                "date_last_sale": last[keep].view("datetime64[ns]"),
+            })
+            dates["months_on_olist"] = (
+                (dates["date_last_sale"] - dates["date_first_sale"]) / np.timedelta64(30, "D")
+            ).round()
+            return dates
+
+        index = get_join_index(self.data)
+        orders = self.data.table("orders", ["order_id", "order_approved_at"])
+
+        # First/last approval date over each seller's orders (seller -> orders index, no merge)
+        n_orders, first, last = index.first_last(
+            index.seller_orders, orders["order_id"], orders["order_approved_at"]
         )
+        keep = np.flatnonzero(n_orders > 0)
+        dates = pd.DataFrame({
+            "seller_id": index.sellers(keep),
+            "date_first_sale": first[keep],
+            "date_last_sale": last[keep],
+        })
 
         dates["months_on_olist"] = (
             (dates["date_last_sale"] - dates["date_first_sale"]) / np.timedelta64(30, "D")
@@ -110,13 +138,14 @@ class Seller:
     # -----------------------------
     # Quantity + number of orders
     # -----------------------------
+    @feature()
     def get_quantity(self) -> pd.DataFrame:
-        order_items = self.data["order_items"][["order_id", "seller_id"]].copy()
+        order_items = self.data.table("order_items", ["order_id", "seller_id"])
 
-        n_orders = order_items.groupby("seller_id", as_index=False)["order_id"].nunique().rename(
+        n_orders = order_items.groupby("seller_id", observed=True, as_index=False)["order_id"].nunique().rename(
             columns={"order_id": "n_orders"}
         )
-        quantity = order_items.groupby("seller_id", as_index=False)["order_id"].count().rename(
+        quantity = order_items.groupby("seller_id", observed=True, as_index=False)["order_id"].count().rename(
             columns={"order_id": "quantity"}
         )
 
@@ -127,47 +156,67 @@ class Seller:
     # -----------------------------
     # Sales (sum of item prices)
     # -----------------------------
+    @feature()
     def get_sales(self) -> pd.DataFrame:
-        order_items = self.data["order_items"][["seller_id", "price"]].copy()
-        return order_items.groupby("seller_id", as_index=False)["price"].sum().rename(columns={"price": "sales"})
+        order_items = self.data.table("order_items", ["seller_id", "price"])
+        return order_items.groupby("seller_id", observed=True, as_index=False)["price"].sum().rename(columns={"price": "sales"})
 
     # -----------------------------
     # Reviews: mean score + shares + cost_of_reviews
     # -----------------------------
-    def get_review_score(self) -> pd.DataFrame:
-        order_items = self.data["order_items"][["order_id", "seller_id"]].drop_duplicates()
-        reviews = self.data["order_reviews"][["order_id", "review_score"]].copy()
-
-        merged = order_items.merge(reviews, on="order_id", how="inner").dropna(subset=["review_score"]).copy()
-        merged["review_score"] = merged["review_score"].astype(float)
-
-        merged["dim_is_one_star"] = (merged["review_score"] == 1).astype(int)
-        merged["dim_is_five_star"] = (merged["review_score"] == 5).astype(int)
-
-        cost_map = {1: 100, 2: 50, 3: 40, 4: 0, 5: 0}
-        merged["review_cost"] = merged["review_score"].map(cost_map).fillna(0)
-
-        out = merged.groupby("seller_id", as_index=False).agg(
-            share_of_one_stars=("dim_is_one_star", "mean"),
-            share_of_five_stars=("dim_is_five_star", "mean"),
-            review_score=("review_score", "mean"),
-            cost_of_reviews=("review_cost", "sum"),
-        )
+    @feature()
+    def get_star_histogram(self) -> pd.DataFrame:
+        """Number of 1..5 star reviews (stars_1 .. stars_5) of every reviewed seller."""
+        index = get_join_index(self.data)
+        reviews = self.data.table("order_reviews", ["order_id", "review_score"])
+
+        # 1..5 star histogram of every seller, summed over its orders (seller -> orders index)
+        stars = index.seller_orders.segment_sum(index.star_counts(reviews))
+        keep = np.flatnonzero(stars.sum(axis=1) > 0)
+        return star_histogram_frame(stars[keep], "seller_id", index.sellers(keep))
+
+    @feature("get_star_histogram")
+    def get_review_score(self, cost_map=None) -> pd.DataFrame:
+        histogram = self.get_star_histogram()
+        stars = histogram[STAR_COLUMNS].to_numpy()
+
+        # cost_map: {stars: cost}, olist.join_index.COST_MAP by default
+        out = star_stats(stars)
+        out.insert(0, "seller_id", histogram["seller_id"].to_numpy())
+        out["cost_of_reviews"] = review_costs(stars, cost_map)
         return out
 
     # -----------------------------
     # Final training set (CEO_request version)
     # -----------------------------
-    def get_training_data(self) -> pd.DataFrame:
-        base = (
-            self.get_seller_features()
-            .merge(self.get_seller_delay_wait_time(), on="seller_id", how="inner")
-            .merge(self.get_active_dates(), on="seller_id", how="inner")
-            .merge(self.get_quantity(), on="seller_id", how="inner")
-            .merge(self.get_sales(), on="seller_id", how="inner")
-        )
-
-        df = base.merge(self.get_review_score(), on="seller_id", how="inner")
+    @feature(
+        "get_seller_features",
+        "get_seller_delay_wait_time",
+        "get_active_dates",
+        "get_quantity",
+        "get_sales",
+        "get_review_score",
+    )
+    def get_training_data(self, parallel=False, max_workers=None, as_of=None) -> pd.DataFrame:
+        if as_of is not None:
+            if self.backend is not None:
+                raise ValueError(f"as_of yalnızca pandas engine ile kullanılabilir (engine={self.engine!r})")
+            # Point-in-time snapshot: per-seller state from binary-searched, time-sorted prefixes
+            return seller_training_set(self.get_seller_features(), *get_seller_timeline(self.data).state(as_of))
+
+        if self.backend is not None:
+            # Aggregations computed by the selected engine (SQL or streaming)
+            return self.backend.seller_training_data()
+
+        # Inner join on int32 surrogate keys rather than merging on hex strings
+        df = merge_on_keys(compute_features([
+            self.get_seller_features,
+            self.get_seller_delay_wait_time,
+            self.get_active_dates,
+            self.get_quantity,
+            self.get_sales,
+            self.get_review_score,
+        ], parallel=parallel, max_workers=max_workers), on="seller_id")
 
         df["revenues"] = 0.1 * df["sales"] + 80 * df["months_on_olist"]
         df["profits"] = df["revenues"] - df["cost_of_reviews"]
@@ -181,3 +230,45 @@ class Seller:
             "cost_of_reviews", "revenues", "profits",
         ]
         return df[keep_cols]
+
+    # -----------------------------
+    # Incremental mode
+    # -----------------------------
+    def incremental(self) -> SellerAggregates:
+        """
+        Returns the mergeable per-seller state of the current tables: new days of orders
+        are then folded in with `.append(orders, order_items, order_reviews)` and
+        `.training_set()` gives the columns of get_training_data without a full rebuild.
+        """
+        aggregates = SellerAggregates(self.data.table("sellers", ["seller_id", "seller_city", "seller_state"]))
+        aggregates.append(
+            self.data.table("orders", ORDER_COLUMNS),
+            self.data.table("order_items", ITEM_COLUMNS),
+            self.data.table("order_reviews", REVIEW_COLUMNS),
+        )
+        return aggregates
+
+    # -----------------------------
+    # Period summaries
+    # -----------------------------
+    def get_period_summary(self, start=None, end=None, categories=None, cost_map=None) -> pd.DataFrame:
+        """
+        Returns sales, quantity, active dates, review scores, cost of reviews, revenues and
+        profits of every seller over the months from `start` to `end` (and `categories`),
+        sliced from the precomputed seller x category x month cube (see olist/cube.py),
+        with reviews priced by `cost_map` ({stars: cost}, COST_MAP by default).
+        """
+        return get_sales_cube(self.data).by_seller(start, end, categories, cost_map)
+
+    # -----------------------------
+    # Review cost assumptions
+    # -----------------------------
+    def reprice(self, cost_map, training_set=None) -> pd.DataFrame:
+        """
+        Returns the training set (get_training_data() by default) with cost_of_reviews and
+        profits re-evaluated for `cost_map` ({stars: cost}) from the stored star histograms,
+        without rebuilding any feature.
+        """
+        if training_set is None:
+            training_set = self.get_training_data()
+        return reprice(training_set, self.get_star_histogram(), "seller_id", cost_map)
@@ -0,0 +1,307 @@
+import importlib.util
+import sqlite3
+import threading
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from olist import schema
+from olist.data import CACHE_DIRNAME, FILES, Olist
+from olist.join_index import COST_MAP
+
+DUCKDB_AVAILABLE = importlib.util.find_spec("duckdb") is not None
+BACKENDS = ("duckdb", "sqlite")
+
+# Tables read by the training-set queries: only these are registered / imported
+TABLES = ("orders", "order_items", "order_reviews", "products", "sellers",
+          "product_category_name_translation")
+
+# Rows per chunk when importing a CSV into SQLite (bounds the memory of the import)
+SQLITE_CHUNK_ROWS = 100_000
+
+
+def _star_columns(key):
+    # Star histogram, mean score and cost of reviews over the (key, order) pairs of `pairs`
+    cost = " + ".join(f"{cost} * n{star}" for star, cost in COST_MAP.items())
+    counts = ",\n".join(
+        f"SUM(CASE WHEN r.review_score = {star} THEN 1 ELSE 0 END) AS n{star}"
+        for star in COST_MAP
+    )
+    return f"""
+    stars AS (
+        SELECT p.{key},
+               COUNT(*) AS n_reviews,
+               SUM(r.review_score) AS total_score,
+               {counts}
+        FROM pairs p
+        JOIN order_reviews r ON r.order_id = p.order_id
+        WHERE r.review_score BETWEEN 1 AND 5
+        GROUP BY p.{key}
+    ),
+    reviews AS (
+        SELECT {key},
+               n1 * 1.0 / n_reviews AS share_of_one_stars,
+               n5 * 1.0 / n_reviews AS share_of_five_stars,
+               total_score * 1.0 / n_reviews AS review_score,
+               CAST({cost} AS BIGINT) AS cost_of_reviews
+        FROM stars
+    )"""
+
+
+class SqlEngine:
+    """
+    Runs the Seller and Product training-set aggregations as SQL in an embedded database,
+    so that only the aggregated result is materialized in pandas.
+
+    - "duckdb": the CSVs are queried in place (views over read_csv), with DuckDB's
+      multi-threaded, out-of-core execution.
+    - "sqlite": the CSVs are imported once, in chunks, into `<data_dir>/.olist_cache/olist.sqlite`
+      and re-imported when a CSV changes.
+
+    `backend` defaults to DuckDB when it is installed, and SQLite (standard library) otherwise.
+    Only the TABLES the queries read are registered, and only those whose CSV exists.
+    """
+
+    def __init__(self, data_dir=None, backend=None):
+        self.data_dir = Olist(data_dir).data_dir
+        backend = backend or ("duckdb" if DUCKDB_AVAILABLE else "sqlite")
+        if backend not in BACKENDS:
+            raise ValueError(f"backend must be one of {BACKENDS}, got {backend!r}")
+        if backend == "duckdb" and not DUCKDB_AVAILABLE:
+            raise ImportError("The duckdb backend requires `pip install duckdb`")
+        self.backend = backend
+        self._lock = threading.Lock()
+        self._connection = None
+
+    # -----------------------------
+    # Connection
+    # -----------------------------
+    def _sources(self):
+        # (table, path) of the TABLES present in data_dir
+        paths = ((table, self.data_dir / FILES[table]) for table in TABLES)
+        return [(table, path) for table, path in paths if path.exists()]
+
+    def _connect(self):
+        if self._connection is None:
+            if self.backend == "duckdb":
+                self._connection = self._connect_duckdb()
+            else:
+                self._connection = self._connect_sqlite()
+        return self._connection
+
+    def _connect_duckdb(self):
+        import duckdb
+
+        connection = duckdb.connect()
+        for table, path in self._sources():
+            # Ids are hex strings: never let the CSV sniffer turn an all-digit id into a number
+            types = ", ".join(f"'{column}': 'VARCHAR'"
+                              for column in schema.columns_of_type(table, "category")
+                              if column.endswith("_id"))
+            options = f", types = {{{types}}}" if types else ""
+            path = path.as_posix().replace("'", "''")
+            connection.execute(
+                f"CREATE OR REPLACE VIEW {table} AS "
+                f"SELECT row_number() OVER () - 1 AS _row, * "
+                f"FROM read_csv('{path}', header = true{options})"
+            )
+        return connection
+
+    def _connect_sqlite(self):
+        cache_dir = self.data_dir / CACHE_DIRNAME
+        cache_dir.mkdir(exist_ok=True)
+        connection = sqlite3.connect(cache_dir / "olist.sqlite", check_same_thread=False)
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS _sources (name TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER)"
+        )
+        imported = [self._import_sqlite(connection, table, path) for table, path in self._sources()]
+        if any(imported):
+            # Table statistics let the planner index-join the aggregated CTEs
+            connection.execute("ANALYZE")
+            connection.commit()
+        return connection
+
+    def _import_sqlite(self, connection, table, path):
+        stat = Path(path).stat()
+        source = connection.execute(
+            "SELECT size, mtime_ns FROM _sources WHERE name = ?", (table,)
+        ).fetchone()
+        if source == (stat.st_size, stat.st_mtime_ns):
+            return False
+
+        # Dates stay ISO strings (julianday() parses them); the row number keeps the file order.
+        # Ids are read as strings so that an all-digit hex id never becomes a number
+        id_columns = {column: str for column in schema.columns_of_type(table, "category")
+                      if column.endswith("_id")}
+        connection.execute(f"DROP TABLE IF EXISTS {table}")
+        offset = 0
+        for chunk in pd.read_csv(path, dtype=id_columns, chunksize=SQLITE_CHUNK_ROWS):
+            chunk.index = pd.RangeIndex(offset, offset + len(chunk), name="_row")
+            chunk.to_sql(table, connection, if_exists="append")
+            offset += len(chunk)
+        columns = pd.read_csv(path, nrows=0).columns
+        for column in ("order_id", "seller_id", "product_id", "product_category_name"):
+            if column in columns:
+                connection.execute(
+                    f"CREATE INDEX IF NOT EXISTS {table}_{column} ON {table} ({column})")
+        connection.execute("INSERT OR REPLACE INTO _sources VALUES (?, ?, ?)",
+                           (table, stat.st_size, stat.st_mtime_ns))
+        connection.commit()
+        return True
+
+    def query(self, sql):
+        """
+        Returns the result of the SQL query `sql` over the Olist TABLES as a DataFrame.
+        """
+        with self._lock:
+            connection = self._connect()
+            if self.backend == "duckdb":
+                return connection.execute(sql).df()
+            return pd.read_sql_query(sql, connection)
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    # -----------------------------
+    # Dialect
+    # -----------------------------
+    def _days(self, end, start):
+        if self.backend == "duckdb":
+            return f"((epoch({end}) - epoch({start})) / 86400.0)"
+        return f"(julianday({end}) - julianday({start}))"
+
+    # -----------------------------
+    # Training sets
+    # -----------------------------
+    def seller_training_data(self):
+        """
+        Returns the columns of `Seller.get_training_data()` (olist/seller_updated.py).
+        """
+        delay = self._days("o.order_delivered_carrier_date", "i.shipping_limit_date")
+        wait = self._days("o.order_delivered_customer_date", "o.order_purchase_timestamp")
+        df = self.query(f"""
+        WITH
+        seller_features AS (
+            SELECT seller_id, seller_city, seller_state, MIN(_row) AS _row
+            FROM sellers
+            GROUP BY seller_id, seller_city, seller_state
+        ),
+        delays AS (
+            SELECT i.seller_id,
+                   AVG(CASE WHEN {delay} < 0 THEN 0 ELSE {delay} END) AS delay_to_carrier,
+                   AVG({wait}) AS wait_time
+            FROM order_items i
+            JOIN orders o ON o.order_id = i.order_id
+            WHERE o.order_status = 'delivered'
+            GROUP BY i.seller_id
+        ),
+        pairs AS (
+            SELECT DISTINCT seller_id, order_id
+            FROM order_items
+            WHERE seller_id IS NOT NULL AND order_id IS NOT NULL
+        ),
+        dates AS (
+            SELECT p.seller_id,
+                   MIN(o.order_approved_at) AS date_first_sale,
+                   MAX(o.order_approved_at) AS date_last_sale
+            FROM pairs p
+            JOIN orders o ON o.order_id = p.order_id
+            WHERE o.order_approved_at IS NOT NULL
+            GROUP BY p.seller_id
+        ),
+        quantities AS (
+            SELECT seller_id,
+                   COUNT(DISTINCT order_id) AS n_orders,
+                   COUNT(order_id) AS quantity,
+                   COALESCE(SUM(price), 0) AS sales
+            FROM order_items
+            GROUP BY seller_id
+        ),
+        {_star_columns("seller_id")}
+        SELECT f.seller_id, f.seller_city, f.seller_state,
+               d.delay_to_carrier, d.wait_time,
+               a.date_first_sale, a.date_last_sale,
+               q.n_orders, q.quantity, q.quantity * 1.0 / q.n_orders AS quantity_per_order, q.sales,
+               r.share_of_one_stars, r.share_of_five_stars, r.review_score, r.cost_of_reviews
+        FROM seller_features f
+        JOIN delays d ON d.seller_id = f.seller_id
+        JOIN dates a ON a.seller_id = f.seller_id
+        JOIN quantities q ON q.seller_id = f.seller_id
+        JOIN reviews r ON r.seller_id = f.seller_id
+        ORDER BY f._row
+        """)
+
+        # Row-wise arithmetic on the (small) aggregated result
+        for column in ("date_first_sale", "date_last_sale"):
+            df[column] = pd.to_datetime(df[column]).astype("datetime64[ns]")
+        df.insert(7, "months_on_olist", (
+            (df["date_last_sale"] - df["date_first_sale"]) / np.timedelta64(30, "D")
+        ).round())
+        df["revenues"] = 0.1 * df["sales"] + 80 * df["months_on_olist"]
+        df["profits"] = df["revenues"] - df["cost_of_reviews"]
+        # Ids and labels typed as in the pandas engine
+        return schema.apply_schema("sellers", df)
+
+    def product_training_data(self):
+        """
+        Returns the columns of `Product.get_training_data()` (olist/product_updated.py).
+        """
+        wait = self._days("o.order_delivered_customer_date", "o.order_purchase_timestamp")
+        df = self.query(f"""
+        WITH
+        product_features AS (
+            -- Measures as floats, as pandas reads them (the CSV has missing values)
+            SELECT p._row, p.product_id,
+                   CAST(p.product_name_lenght AS DOUBLE) AS product_name_length,
+                   CAST(p.product_description_lenght AS DOUBLE) AS product_description_length,
+                   CAST(p.product_photos_qty AS DOUBLE) AS product_photos_qty,
+                   CAST(p.product_weight_g AS DOUBLE) AS product_weight_g,
+                   CAST(p.product_length_cm AS DOUBLE) AS product_length_cm,
+                   CAST(p.product_height_cm AS DOUBLE) AS product_height_cm,
+                   CAST(p.product_width_cm AS DOUBLE) AS product_width_cm,
+                   t.product_category_name_english AS category
+            FROM products p
+            JOIN product_category_name_translation t
+              ON t.product_category_name = p.product_category_name
+        ),
+        pairs AS (
+            SELECT DISTINCT product_id, order_id
+            FROM order_items
+            WHERE product_id IS NOT NULL AND order_id IS NOT NULL
+        ),
+        wait_times AS (
+            SELECT p.product_id, AVG({wait}) AS wait_time
+            FROM pairs p
+            JOIN orders o ON o.order_id = p.order_id
+            WHERE o.order_status = 'delivered'
+            GROUP BY p.product_id
+        ),
+        quantities AS (
+            SELECT product_id,
+                   AVG(price) AS price,
+                   COUNT(DISTINCT order_id) AS n_orders,
+                   COUNT(order_id) AS quantity,
+                   COALESCE(SUM(price), 0) AS sales
+            FROM order_items
+            GROUP BY product_id
+        ),
+        {_star_columns("product_id")}
+        SELECT f.product_id, f.product_name_length, f.product_description_length,
+               f.product_photos_qty, f.product_weight_g, f.product_length_cm,
+               f.product_height_cm, f.product_width_cm, f.category,
+               w.wait_time, q.price,
+               r.share_of_one_stars, r.share_of_five_stars, r.review_score, r.cost_of_reviews,
+               q.n_orders, q.quantity, q.sales
+        FROM product_features f
+        JOIN wait_times w ON w.product_id = f.product_id
+        JOIN quantities q ON q.product_id = f.product_id
+        JOIN reviews r ON r.product_id = f.product_id
+        ORDER BY f._row
+        """)
+
+        olist_sales_cut = 0.1
+        df["revenues"] = olist_sales_cut * df["sales"]
+        df["profits"] = df["revenues"] - df["cost_of_reviews"]
+        return schema.apply_schema("products", df)
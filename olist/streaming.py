@@ -0,0 +1,295 @@
+import threading
+import numpy as np
+import pandas as pd
+from olist import schema
+from olist.data import FILES, Olist
+from olist.join_index import STARS, review_costs, star_stats
+from olist.keys import ids, merge_on_keys
+from olist.seller_incremental import COUNTS, SUMS, seller_training_set
+
+DEFAULT_CHUNK_ROWS = 100_000
+
+NAT = np.iinfo(np.int64).min
+
+
+def _grow(values, size, fill):
+    # Extends a per-key array (1-D or 2-D) to `size` rows
+    extra = size - len(values)
+    if extra <= 0:
+        return values
+    return np.concatenate([values, np.full((extra,) + values.shape[1:], fill, dtype=values.dtype)])
+
+
+def _pairs(rows, columns):
+    # Distinct (row, column) key pairs of a chunk
+    pairs = np.unique(rows.astype(np.int64) << 32 | columns.astype(np.int64))
+    return (pairs >> 32).astype(np.int64), (pairs & 0xFFFFFFFF).astype(np.int64)
+
+
+class StreamingTrainingData:
+    """
+    Seller and Product training sets built by streaming the large tables
+    (orders, order_reviews, order_items) in chunks of at most `chunksize` rows.
+
+    Each chunk of order_items is folded into partial aggregates (sums, counts, min/max
+    dates and star histograms per seller and per product) and dropped. order_items is
+    expected grouped by order_id, as the Olist export is: the rows of the last order of a
+    chunk are carried over to the next one, so the distinct (order, seller) and
+    (order, product) pairs are counted within each chunk (a ValueError is raised when an
+    order shows up again in a later chunk).
+
+    Memory is not fully bounded by the chunk size: items are joined with their order's
+    status, timestamps and reviews through per-order arrays read in a first pass over
+    orders and order_reviews (about 75 bytes per order, plus the order ids in the
+    process-wide key dictionary). Memory thus grows with the number of orders, but no
+    table is held whole and nothing grows with the number of items. The small dimension
+    tables (sellers, products, category names) are read whole.
+
+    The results have the same columns (and rows) as `Seller.get_training_data()` in
+    olist/seller_updated.py and `Product.get_training_data()` in olist/product_updated.py.
+    """
+
+    def __init__(self, data_dir=None, chunksize=DEFAULT_CHUNK_ROWS):
+        self.data_dir = Olist(data_dir).data_dir
+        self.chunksize = chunksize
+        self._lock = threading.Lock()
+        self._state = None
+
+    def _chunks(self, table, columns):
+        return schema.read_csv_chunks(self.data_dir / FILES[table], table,
+                                      columns=columns, chunksize=self.chunksize)
+
+    def _grouped_chunks(self, table, columns, key):
+        # Chunks of `table` that never split the rows of one `key` value: the trailing rows
+        # of the last value of a chunk are carried over to the next chunk
+        carry = None
+        for chunk in self._chunks(table, columns):
+            if carry is not None and len(carry):
+                chunk = pd.concat([carry, chunk], ignore_index=True)
+            values = chunk[key].to_numpy(dtype=object)
+            same = (values == values[-1])[::-1]
+            run = len(values) if same.all() else int(np.argmin(same))
+            carry, chunk = chunk.iloc[len(values) - run:], chunk.iloc[:len(values) - run]
+            if len(chunk):
+                yield chunk
+        if carry is not None and len(carry):
+            yield carry
+
+    # -----------------------------
+    # Streaming passes
+    # -----------------------------
+    def _read_orders(self):
+        # Per order key: delivered flag and the timestamps the features need (int64 ns, NaT = min)
+        timestamps = ["order_purchase_timestamp", "order_approved_at",
+                      "order_delivered_carrier_date", "order_delivered_customer_date"]
+        known = np.zeros(0, dtype=bool)
+        delivered = np.zeros(0, dtype=bool)
+        times = np.zeros((0, len(timestamps)), dtype=np.int64)
+
+        for chunk in self._chunks("orders", ["order_id", "order_status"] + timestamps):
+            keys = ids.encode(chunk["order_id"], "order_id")
+            size = ids.size("order_id")
+            known, delivered = _grow(known, size, False), _grow(delivered, size, False)
+            times = _grow(times, size, NAT)
+
+            valid = keys >= 0
+            known[keys[valid]] = True
+            delivered[keys[valid]] = (chunk["order_status"] == "delivered").to_numpy()[valid]
+            times[keys[valid]] = np.column_stack([
+                chunk[column].to_numpy(dtype="datetime64[ns]").view(np.int64) for column in timestamps
+            ])[valid]
+
+        return {"known": known, "delivered": delivered,
+                **{column: times[:, i] for i, column in enumerate(timestamps)}}
+
+    def _read_reviews(self):
+        # Per order key: 1..5 star counts
+        stars = np.zeros((0, len(STARS)), dtype=np.int64)
+        for chunk in self._chunks("order_reviews", ["order_id", "review_score"]):
+            keys = ids.encode(chunk["order_id"], "order_id")
+            scores = chunk["review_score"].to_numpy(dtype=float, na_value=np.nan)
+            valid = (keys >= 0) & np.isin(scores, STARS)
+            stars = _grow(stars, ids.size("order_id"), 0)
+            np.add.at(stars, (keys[valid], scores[valid].astype(np.int64) - 1), 1)
+        return stars
+
+    def _aggregate(self):
+        orders = self._read_orders()
+        order_stars = self._read_reviews()
+
+        def order_values(values, keys, fill):
+            # Looks up per-order values for `keys`, with `fill` for orders absent from the table
+            inside = (keys >= 0) & (keys < len(values))
+            out = np.full((len(keys),) + values.shape[1:], fill, dtype=values.dtype)
+            out[inside] = values[keys[inside]]
+            return out
+
+        seller = {name: np.zeros(0) for name in SUMS}
+        seller.update({name: np.zeros(0, dtype=np.int64) for name in COUNTS})
+        seller_first = np.zeros(0, dtype=np.int64)
+        seller_last = np.zeros(0, dtype=np.int64)
+        seller_stars = np.zeros((0, len(STARS)), dtype=np.int64)
+        product = {name: np.zeros(0) for name in ("price_sum", "sales", "wait_sum")}
+        product.update({name: np.zeros(0, dtype=np.int64) for name in (
+            "n_items", "quantity", "price_count", "n_orders", "delivered_orders", "wait_count")})
+        product_stars = np.zeros((0, len(STARS)), dtype=np.int64)
+        # Orders of the chunks already folded (their pairs must not come back)
+        folded = np.zeros(0, dtype=bool)
+
+        columns = ["order_id", "seller_id", "product_id", "shipping_limit_date", "price"]
+        for chunk in self._grouped_chunks("order_items", columns, "order_id"):
+            order_keys = ids.encode(chunk["order_id"], "order_id")
+            folded = _grow(folded, ids.size("order_id"), False)
+            chunk_orders = order_keys[order_keys >= 0]
+            if folded[chunk_orders].any():
+                raise ValueError("order_items must be grouped by order_id to be streamed")
+            folded[chunk_orders] = True
+            seller_keys = ids.encode(chunk["seller_id"], "seller_id")
+            product_keys = ids.encode(chunk["product_id"], "product_id")
+            n_sellers, n_products = ids.size("seller_id"), ids.size("product_id")
+            seller = {name: _grow(values, n_sellers, 0) for name, values in seller.items()}
+            seller_first = _grow(seller_first, n_sellers, np.iinfo(np.int64).max)
+            seller_last = _grow(seller_last, n_sellers, np.iinfo(np.int64).min)
+            seller_stars = _grow(seller_stars, n_sellers, 0)
+            product = {name: _grow(values, n_products, 0) for name, values in product.items()}
+            product_stars = _grow(product_stars, n_products, 0)
+
+            price = chunk["price"].to_numpy(dtype=float)
+            has_order = order_keys >= 0
+            delivered = order_values(orders["known"] & orders["delivered"], order_keys, False)
+            purchased = order_values(orders["order_purchase_timestamp"], order_keys, NAT)
+            arrived = order_values(orders["order_delivered_customer_date"], order_keys, NAT)
+            with np.errstate(invalid="ignore"):
+                wait = np.where((purchased == NAT) | (arrived == NAT), np.nan,
+                                (arrived - purchased) / 86400e9)
+
+            # Sellers: item-level sums and counts
+            s = seller_keys >= 0
+            np.add.at(seller["n_items"], seller_keys[s], 1)
+            np.add.at(seller["quantity"], seller_keys[s & has_order], 1)
+            np.add.at(seller["sales"], seller_keys[s], np.nan_to_num(price[s]))
+
+            d = s & delivered
+            carrier = order_values(orders["order_delivered_carrier_date"], order_keys, NAT)[d]
+            limit = chunk["shipping_limit_date"].to_numpy(dtype="datetime64[ns]").view(np.int64)[d]
+            with np.errstate(invalid="ignore"):
+                delay = np.where((carrier == NAT) | (limit == NAT), np.nan,
+                                 np.maximum((carrier - limit) / 86400e9, 0))
+            np.add.at(seller["delivered_items"], seller_keys[d], 1)
+            np.add.at(seller["delay_sum"], seller_keys[d], np.nan_to_num(delay))
+            np.add.at(seller["delay_count"], seller_keys[d], ~np.isnan(delay))
+            np.add.at(seller["wait_sum"], seller_keys[d], np.nan_to_num(wait[d]))
+            np.add.at(seller["wait_count"], seller_keys[d], ~np.isnan(wait[d]))
+
+            # Sellers: distinct (order, seller) pairs
+            pair_orders, pair_sellers = _pairs(order_keys[s & has_order], seller_keys[s & has_order])
+            np.add.at(seller["n_orders"], pair_sellers, 1)
+            approved = order_values(orders["order_approved_at"], pair_orders, NAT)
+            dated = approved != NAT
+            np.add.at(seller["dated_orders"], pair_sellers[dated], 1)
+            np.minimum.at(seller_first, pair_sellers[dated], approved[dated])
+            np.maximum.at(seller_last, pair_sellers[dated], approved[dated])
+            np.add.at(seller_stars, pair_sellers, order_values(order_stars, pair_orders, 0))
+
+            # Products: item-level sums and counts
+            p = product_keys >= 0
+            np.add.at(product["n_items"], product_keys[p], 1)
+            np.add.at(product["quantity"], product_keys[p & has_order], 1)
+            np.add.at(product["sales"], product_keys[p], np.nan_to_num(price[p]))
+            np.add.at(product["price_sum"], product_keys[p], np.nan_to_num(price[p]))
+            np.add.at(product["price_count"], product_keys[p], ~np.isnan(price[p]))
+
+            # Products: distinct (order, product) pairs
+            pair_orders, pair_products = _pairs(order_keys[p & has_order], product_keys[p & has_order])
+            np.add.at(product["n_orders"], pair_products, 1)
+            pair_delivered = order_values(orders["known"] & orders["delivered"], pair_orders, False)
+            pair_purchased = order_values(orders["order_purchase_timestamp"], pair_orders, NAT)
+            pair_arrived = order_values(orders["order_delivered_customer_date"], pair_orders, NAT)
+            with np.errstate(invalid="ignore"):
+                pair_wait = np.where((pair_purchased == NAT) | (pair_arrived == NAT), np.nan,
+                                     (pair_arrived - pair_purchased) / 86400e9)[pair_delivered]
+            np.add.at(product["delivered_orders"], pair_products[pair_delivered], 1)
+            np.add.at(product["wait_sum"], pair_products[pair_delivered], np.nan_to_num(pair_wait))
+            np.add.at(product["wait_count"], pair_products[pair_delivered], ~np.isnan(pair_wait))
+            np.add.at(product_stars, pair_products, order_values(order_stars, pair_orders, 0))
+
+        return {
+            "seller": (seller, seller_first, seller_last, seller_stars),
+            "product": (product, product_stars),
+        }
+
+    def _aggregates(self):
+        with self._lock:
+            if self._state is None:
+                self._state = self._aggregate()
+            return self._state
+
+    # -----------------------------
+    # Training sets
+    # -----------------------------
+    def seller_training_data(self):
+        """
+        Returns the columns of `Seller.get_training_data()` (olist/seller_updated.py).
+        """
+        state, first_sale, last_sale, stars = self._aggregates()["seller"]
+        sellers = schema.read_csv(self.data_dir / FILES["sellers"], "sellers",
+                                  columns=["seller_id", "seller_city", "seller_state"])
+        size = ids.size("seller_id")
+        return seller_training_set(
+            sellers.drop_duplicates(),
+            {name: _grow(values, size, 0) for name, values in state.items()},
+            _grow(first_sale, size, np.iinfo(np.int64).max),
+            _grow(last_sale, size, np.iinfo(np.int64).min),
+            _grow(stars, size, 0),
+        )
+
+    def product_training_data(self):
+        """
+        Returns the columns of `Product.get_training_data()` (olist/product_updated.py).
+        """
+        state, stars = self._aggregates()["product"]
+        size = ids.size("product_id")
+        state = {name: _grow(values, size, 0) for name, values in state.items()}
+        stars = _grow(stars, size, 0)
+
+        def frame(present, **columns):
+            keep = np.flatnonzero(present)
+            out = pd.DataFrame({name: values[keep] for name, values in columns.items()})
+            out.insert(0, "product_id", ids.decode(keep, "product_id"))
+            return out
+
+        # Same product features as Product.get_product_features
+        products = schema.read_csv(self.data_dir / FILES["products"], "products")
+        en_category = schema.read_csv(self.data_dir / FILES["product_category_name_translation"],
+                                      "product_category_name_translation")
+        features = products.merge(en_category, on="product_category_name")
+        features = features.drop(columns=["product_category_name"]).rename(columns={
+            "product_category_name_english": "category",
+            "product_name_lenght": "product_name_length",
+            "product_description_lenght": "product_description_length",
+        })
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            wait_time = frame(
+                state["delivered_orders"] > 0,
+                wait_time=state["wait_sum"] / np.where(state["wait_count"] > 0, state["wait_count"], np.nan),
+            )
+            price = frame(
+                state["n_items"] > 0,
+                price=state["price_sum"] / np.where(state["price_count"] > 0, state["price_count"], np.nan),
+            )
+
+        reviewed = stars.sum(axis=1) > 0
+        reviews = star_stats(stars[reviewed])
+        reviews.insert(0, "product_id", ids.decode(np.flatnonzero(reviewed), "product_id"))
+        reviews["cost_of_reviews"] = review_costs(stars[reviewed])
+
+        quantity = frame(state["n_items"] > 0, n_orders=state["n_orders"], quantity=state["quantity"])
+        sales = frame(state["n_items"] > 0, sales=state["sales"])
+
+        training_set = merge_on_keys([features, wait_time, price, reviews, quantity, sales],
+                                     on="product_id")
+        olist_sales_cut = 0.1
+        training_set["revenues"] = olist_sales_cut * training_set["sales"]
+        training_set["profits"] = training_set["revenues"] - training_set["cost_of_reviews"]
+        return training_set
@@ -0,0 +1,214 @@
+import numpy as np
+import pandas as pd
+from olist.join_index import STARS, get_join_index
+from olist.keys import ids
+from olist.seller_incremental import COUNTS, SUMS
+
+NEVER = np.iinfo(np.int64).max
+
+# When a row of each table becomes known, for point-in-time (`as_of`) features
+# - orders: purchase of the order
+# - order_items: purchase of their order
+# - order_reviews: creation of the review
+TIME_COLUMNS = {
+    "orders": "order_purchase_timestamp",
+    "order_items": "order_purchase_timestamp",
+    "order_reviews": "review_creation_date",
+}
+
+
+def as_of_ns(as_of):
+    """
+    Returns the cutoff `as_of` (date string, Timestamp or datetime64) as int64 nanoseconds.
+    """
+    return pd.Timestamp(as_of).as_unit("ns").value
+
+
+def _ns(timestamps):
+    # int64 nanoseconds of a datetime Series or array, with missing timestamps "never" reached
+    values = np.asarray(timestamps, dtype="datetime64[ns]")
+    return np.where(np.isnat(values), NEVER, values.view(np.int64))
+
+
+class TimeIndex:
+    """
+    Rows of a table sorted by timestamp: the rows known at a cutoff are a prefix,
+    found by binary search. Rows without a timestamp are never part of a prefix.
+    """
+
+    def __init__(self, timestamps):
+        times = _ns(timestamps)
+        self.positions = np.argsort(times, kind="stable")
+        self.times = times[self.positions]
+
+    def count(self, as_of):
+        """
+        Returns the number of rows with a timestamp at or before `as_of`.
+        """
+        return int(np.searchsorted(self.times, as_of_ns(as_of), side="right"))
+
+    def prefix(self, as_of):
+        """
+        Returns the positions of the rows known at `as_of`, in time order.
+        """
+        return self.positions[:self.count(as_of)]
+
+    def rows(self, as_of):
+        """
+        Returns the positions of the rows known at `as_of`, in table order.
+        """
+        return np.sort(self.prefix(as_of))
+
+
+def _purchase_times(data):
+    orders = data.table("orders", ["order_id", "order_purchase_timestamp"])
+    return orders.set_index("order_id")["order_purchase_timestamp"]
+
+
+def get_time_index(data, table):
+    """
+    Returns the TimeIndex of `table` ("orders", "order_items" or "order_reviews"), ordered
+    by the timestamp of TIME_COLUMNS, built once per dataset snapshot.
+    """
+    def build(tables):
+        if table == "order_items":
+            order_ids = tables.table("order_items", ["order_id"])["order_id"]
+            return TimeIndex(order_ids.map(_purchase_times(tables)).astype("datetime64[ns]"))
+        return TimeIndex(tables.table(table, [TIME_COLUMNS[table]])[TIME_COLUMNS[table]])
+
+    if table not in TIME_COLUMNS:
+        raise KeyError(table)
+    return data.derived(f"time_index:{table}", build)
+
+
+class _Events:
+    # Seller keys (and values) of events sorted by time: aggregates at a cutoff are bincounts of a prefix
+    def __init__(self, times, sellers, **values):
+        order = np.argsort(times, kind="stable")
+        self.times = times[order]
+        self.sellers = sellers[order]
+        self.values = {name: np.asarray(value)[order] for name, value in values.items()}
+
+    def prefix(self, as_of):
+        return slice(0, int(np.searchsorted(self.times, as_of, side="right")))
+
+
+class SellerTimeline:
+    """
+    Seller events (items sold, deliveries, approvals, reviews) sorted by time, so that the
+    per-seller state of `SellerAggregates` at any cutoff is computed from prefixes with
+    bincounts instead of rerunning the feature pipeline.
+
+    As of a cutoff D, an order counts from its purchase, a delivery from the delivery date
+    (the purchase when an order is marked delivered without one), a first/last sale from
+    the approval date and a review from its creation date.
+    """
+
+    def __init__(self, data):
+        index = get_join_index(data)
+
+        items = data.table("order_items", ["order_id", "seller_id", "shipping_limit_date", "price"])
+        orders = data.table("orders", [
+            "order_id", "order_status", "order_purchase_timestamp", "order_approved_at",
+            "order_delivered_carrier_date", "order_delivered_customer_date",
+        ])
+        orders = orders.set_index("order_id")
+        orders.index = orders.index.astype(object)
+        per_item = orders.reindex(items["order_id"].astype(object))
+
+        sellers = ids.encode(items["seller_id"], "seller_id")
+        purchased = _ns(per_item["order_purchase_timestamp"])
+        known = (sellers >= 0) & (purchased != NEVER)
+
+        # Items sold (quantity, sales)
+        self.items = _Events(purchased[known], sellers[known],
+                             price=np.nan_to_num(items["price"].to_numpy(dtype=float))[known])
+
+        # Deliveries (delay to carrier, wait time), item-level as in get_seller_delay_wait_time
+        one_day = np.timedelta64(1, "D")
+        delay = ((per_item["order_delivered_carrier_date"].to_numpy()
+                  - items["shipping_limit_date"].to_numpy()) / one_day)
+        delay = np.where(np.isnan(delay), np.nan, np.maximum(delay, 0))
+        wait = ((per_item["order_delivered_customer_date"].to_numpy()
+                 - per_item["order_purchase_timestamp"].to_numpy()) / one_day)
+        delivered_at = _ns(per_item["order_delivered_customer_date"])
+        delivered_at = np.where(delivered_at == NEVER, purchased, delivered_at)
+        delivered = known & (per_item["order_status"] == "delivered").to_numpy()
+        self.deliveries = _Events(delivered_at[delivered], sellers[delivered],
+                                  delay=delay[delivered], wait=wait[delivered])
+
+        # Distinct (order, seller) pairs: orders, approvals and reviews
+        pair_orders = index.seller_orders.indices
+        pair_sellers = index.seller_orders.row_ids
+        order_index = orders.reindex(ids.decode(pair_orders, "order_id"))
+        pair_purchased = _ns(order_index["order_purchase_timestamp"])
+        self.orders = _Events(pair_purchased[pair_purchased != NEVER],
+                              pair_sellers[pair_purchased != NEVER])
+        approved = _ns(order_index["order_approved_at"])
+        self.approvals = _Events(approved[approved != NEVER], pair_sellers[approved != NEVER],
+                                 approved=approved[approved != NEVER])
+
+        reviews = data.table("order_reviews", ["order_id", "review_score", "review_creation_date"])
+        review_orders = index.order_keys(reviews["order_id"])
+        scores = reviews["review_score"].to_numpy(dtype=float, na_value=np.nan)
+        created = _ns(reviews["review_creation_date"])
+        valid = (review_orders >= 0) & np.isin(scores, STARS) & (created != NEVER)
+        # One event per (review, seller of the reviewed order)
+        csr = index.order_sellers
+        counts = csr.counts()[review_orders[valid]]
+        starts = csr.offsets[review_orders[valid]]
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        self.reviews = _Events(np.repeat(created[valid], counts),
+                               csr.indices[np.repeat(starts, counts) + within],
+                               star=np.repeat(scores[valid].astype(np.int64) - 1, counts))
+
+    def state(self, as_of):
+        """
+        Returns (state, first_sale, last_sale, stars) of every seller as of `as_of`,
+        as expected by olist.seller_incremental.seller_training_set.
+        """
+        cutoff = as_of_ns(as_of)
+        n = ids.size("seller_id")
+        state = {name: np.zeros(n) for name in SUMS}
+        state.update({name: np.zeros(n, dtype=np.int64) for name in COUNTS})
+
+        def count(sellers, weights=None):
+            counted = np.bincount(sellers, weights=weights, minlength=n)
+            return counted if weights is not None else counted.astype(np.int64)
+
+        known = self.items.prefix(cutoff)
+        state["n_items"] = state["quantity"] = count(self.items.sellers[known])
+        state["sales"] = count(self.items.sellers[known], self.items.values["price"][known])
+
+        known = self.deliveries.prefix(cutoff)
+        sellers = self.deliveries.sellers[known]
+        delay, wait = self.deliveries.values["delay"][known], self.deliveries.values["wait"][known]
+        state["delivered_items"] = count(sellers)
+        state["delay_sum"] = count(sellers, np.nan_to_num(delay))
+        state["delay_count"] = count(sellers, ~np.isnan(delay)).astype(np.int64)
+        state["wait_sum"] = count(sellers, np.nan_to_num(wait))
+        state["wait_count"] = count(sellers, ~np.isnan(wait)).astype(np.int64)
+
+        state["n_orders"] = count(self.orders.sellers[self.orders.prefix(cutoff)])
+
+        known = self.approvals.prefix(cutoff)
+        sellers, approved = self.approvals.sellers[known], self.approvals.values["approved"][known]
+        state["dated_orders"] = count(sellers)
+        first_sale = np.full(n, np.iinfo(np.int64).max)
+        last_sale = np.full(n, np.iinfo(np.int64).min)
+        # Events are sorted by time: the first event of a seller is its first sale
+        unique_sellers, first = np.unique(sellers, return_index=True)
+        first_sale[unique_sellers] = approved[first]
+        np.maximum.at(last_sale, sellers, approved)
+
+        known = self.reviews.prefix(cutoff)
+        stars = np.bincount(self.reviews.sellers[known] * len(STARS) + self.reviews.values["star"][known],
+                            minlength=n * len(STARS)).reshape(n, len(STARS))
+        return state, first_sale, last_sale, stars
+
+
+def get_seller_timeline(data):
+    """
+    Returns the SellerTimeline of the (shared) tables `data`, built on first use only.
+    """
+    return data.derived("seller_timeline", SellerTimeline)
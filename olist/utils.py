@@ -1,18 +1,52 @@
 from math import radians, sin, cos, asin, sqrt
+import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+EARTH_RADIUS_KM = 6371
+
 
 def haversine_distance(lon1, lat1, lon2, lat2):
     """
     Compute distance between two pairs of coordinates (lon1, lat1, lon2, lat2)
     See - (https://en.wikipedia.org/wiki/Haversine_formula)
+    Arrays (or Series) of coordinates are handled by haversine_distances.
     """
+    if not all(np.isscalar(x) for x in (lon1, lat1, lon2, lat2)):
+        return haversine_distances(lon1, lat1, lon2, lat2)
     lon1, lat1, lon2, lat2 = map(radians, [lon1, lat1, lon2, lat2])
     dlon = lon2 - lon1
     dlat = lat2 - lat1
     a = sin(dlat / 2) ** 2 + cos(lat1) * cos(lat2) * sin(dlon / 2) ** 2
-    return 2 * 6371 * asin(sqrt(a))
+    return 2 * EARTH_RADIUS_KM * asin(sqrt(a))
+
+
+def haversine_distances(lon1, lat1, lon2, lat2):
+    """
+    Vectorized haversine_distance: returns the distances (in km) between the
+    coordinate arrays (lon1, lat1) and (lon2, lat2), element-wise (broadcasting applies).
+    Missing coordinates give NaN.
+    """
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(x, dtype=np.float64))
+                              for x in (lon1, lat1, lon2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2
+    a += np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    # Rounding can push `a` marginally above 1 for antipodal points
+    np.clip(a, 0, 1, out=a)
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a, out=a), out=a)
+
+
+def haversine_distances_chunked(lon1, lat1, lon2, lat2, chunk_size=1_000_000):
+    """
+    haversine_distances over 1-D arrays, `chunk_size` pairs at a time, which bounds
+    the memory taken by temporaries for very large inputs.
+    """
+    lon1, lat1, lon2, lat2 = (np.asarray(x, dtype=np.float64) for x in (lon1, lat1, lon2, lat2))
+    out = np.empty(len(lon1), dtype=np.float64)
+    for start in range(0, len(out), chunk_size):
+        chunk = slice(start, start + chunk_size)
+        out[chunk] = haversine_distances(lon1[chunk], lat1[chunk], lon2[chunk], lat2[chunk])
+    return out
 
 
 def return_significative_coef(model):
@@ -1,9 +1,11 @@
 # pages/home.py
 import dash
-from dash import html, dcc
+from dash import html, dcc, Input, Output
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
 
+from olist.cube import get_sales_cube
+from olist.join_index import COST_MAP
 from olist.seller_updated import Seller
 
 dash.register_page(__name__, path="/", name="Finansal Özet")
@@ -39,8 +41,15 @@ ALPHA, BETA = 3157.27, 978.23
 def cost_of_it(n_sellers: int, quantity: float) -> float:
     return ALPHA * (n_sellers**0.5) + BETA * (quantity**0.5)
 
+SELLER = Seller()
+
 def load_sellers():
-    return Seller().get_training_data()
+    return SELLER.get_training_data()
+
+def load_period_sellers(start, end, cost_map=None, categories=None):
+    # Tarih aralığı ve kategoriler: aylık satıcı x kategori küpünden dilimlenir (get_training_data yeniden çalışmaz)
+    period = SELLER.get_period_summary(start, end, categories, cost_map=cost_map)
+    return period[period["seller_id"].isin(PORTFOLIO)]
 
 def brl(value: float) -> str:
     return f"{value:,.0f} BRL"
@@ -120,32 +129,54 @@ def build_waterfall(k):
 
     return fig
 
-# --- Veri Hesaplama Bölümü (Aynı Kaldı) ---
+def compute_kpis(sellers):
+    gelir_satis_komisyonu = sellers["sales"].sum() * 0.10
+    gelir_abonelik = sellers["months_on_olist"].sum() * 80
+    toplam_gelir = float(sellers["revenues"].sum())
+    maliyet_review = float(sellers["cost_of_reviews"].sum())
+    n_sellers = int(sellers["seller_id"].nunique())
+    quantity = float(sellers["quantity"].sum())
+    it_maliyeti = float(cost_of_it(n_sellers, quantity))
+    brut_kar = float(sellers["profits"].sum())
+    net_kar = brut_kar - it_maliyeti
+
+    return {
+        "gelir_satis_komisyonu": float(gelir_satis_komisyonu),
+        "gelir_abonelik": float(gelir_abonelik),
+        "toplam_gelir": toplam_gelir,
+        "maliyet_review": maliyet_review,
+        "it_maliyeti": it_maliyeti,
+        "brut_kar": brut_kar,
+        "net_kar": net_kar,
+        "n_sellers": n_sellers,
+        "quantity": quantity,
+    }
+
+def kpi_cards(k):
+    return [
+        dbc.Col(kpi_card("Toplam Gelir", k["toplam_gelir"], "Abonelik + Komisyon", "💰"), md=3),
+        dbc.Col(kpi_card("Review Maliyeti", k["maliyet_review"], "Gecikme/İade Kaynaklı", "🧾"), md=3),
+        dbc.Col(kpi_card("IT / Operasyon", k["it_maliyeti"], f"{k['n_sellers']} Satıcı Altyapısı", "🖥️"), md=3),
+        dbc.Col(kpi_card("Net Kâr", k["net_kar"], "Final Operasyonel Sonuç", "📈", highlight=True, badge_text="HEDEF KPI"), md=3),
+    ]
+
+# --- Veri Hesaplama Bölümü ---
 sellers = load_sellers()
-gelir_satis_komisyonu = sellers["sales"].sum() * 0.10
-gelir_abonelik = sellers["months_on_olist"].sum() * 80
-toplam_gelir = float(sellers["revenues"].sum())
-maliyet_review = float(sellers["cost_of_reviews"].sum())
-n_sellers = int(sellers["seller_id"].nunique())
-quantity = float(sellers["quantity"].sum())
-it_maliyeti = float(cost_of_it(n_sellers, quantity))
-brut_kar = float(sellers["profits"].sum())
-net_kar = brut_kar - it_maliyeti
-
-k = {
-    "gelir_satis_komisyonu": float(gelir_satis_komisyonu),
-    "gelir_abonelik": float(gelir_abonelik),
-    "toplam_gelir": toplam_gelir,
-    "maliyet_review": maliyet_review,
-    "it_maliyeti": it_maliyeti,
-    "brut_kar": brut_kar,
-    "net_kar": net_kar,
-    "n_sellers": n_sellers,
-    "quantity": quantity,
-}
+PORTFOLIO = sellers["seller_id"]
+k = compute_kpis(sellers)
 
 wf_fig = build_waterfall(k)
 
+# Tarih ve kategori filtresi: küpteki aylar (slider değerleri ay sırası) ve kategoriler
+CUBE = get_sales_cube(SELLER.data)
+MONTHS = list(CUBE.months)
+CATEGORIES = [str(category) for category in CUBE.categories]
+MONTH_MARKS = {
+    i: month.strftime("%Y-%m")
+    for i, month in enumerate(MONTHS)
+    if i % 3 == 0 or i == len(MONTHS) - 1
+}
+
 # -----------------------------
 # Layout (Geliştirilmiş İçerik)
 # -----------------------------
@@ -156,16 +187,42 @@ layout = dbc.Container(
             html.P("Operasyonel maliyetlerin kârlılık üzerindeki doğrudan etkisini analiz edin.", className="text-muted mb-4"),
         ]),
 
-        dbc.Row(
-            [
-                dbc.Col(kpi_card("Toplam Gelir", k["toplam_gelir"], "Abonelik + Komisyon", "💰"), md=3),
-                dbc.Col(kpi_card("Review Maliyeti", k["maliyet_review"], "Gecikme/İade Kaynaklı", "🧾"), md=3),
-                dbc.Col(kpi_card("IT / Operasyon", k["it_maliyeti"], f"{k['n_sellers']} Satıcı Altyapısı", "🖥️"), md=3),
-                dbc.Col(kpi_card("Net Kâr", k["net_kar"], "Final Operasyonel Sonuç", "📈", highlight=True, badge_text="HEDEF KPI"), md=3),
-            ],
-            className="g-3",
+        dbc.Card(
+            dbc.CardBody(
+                [
+                    html.Div("📅 Dönem: Satın alma ayına göre tarih aralığı seçin", className="text-muted small"),
+                    dcc.RangeSlider(
+                        id="home_date_range", min=0, max=max(len(MONTHS) - 1, 0), step=1,
+                        value=[0, max(len(MONTHS) - 1, 0)], marks=MONTH_MARKS, allowCross=False,
+                    ),
+                    html.Div("🏷️ Kategori: boş bırakılırsa tüm kategoriler", className="text-muted small mt-3"),
+                    dcc.Dropdown(
+                        id="home_categories", options=CATEGORIES, value=[], multi=True,
+                        placeholder="Tüm kategoriler",
+                    ),
+                    html.Div(id="home_period_line", className="text-center mt-2 fw-bold text-primary"),
+                    html.Div("🧾 Review maliyet varsayımı (yıldız başına BRL)", className="text-muted small mt-3"),
+                    dbc.Row(
+                        [
+                            dbc.Col(
+                                dbc.InputGroup([
+                                    dbc.InputGroupText(f"{star} ★"),
+                                    dbc.Input(id=f"home_cost_{star}", type="number", value=cost, debounce=True),
+                                ], size="sm"),
+                                md=2,
+                            )
+                            for star, cost in COST_MAP.items()
+                        ],
+                        className="g-2",
+                    ),
+                ]
+            ),
+            className="shadow-sm border-0 mb-3",
+            style=CARD_STYLE,
         ),
 
+        dbc.Row(kpi_cards(k), id="home_kpi_row", className="g-3"),
+
         dbc.Card(
             dbc.CardBody(
                 [
@@ -173,7 +230,7 @@ layout = dbc.Container(
                         html.Span("💡 İpucu: ", className="fw-bold text-primary"),
                         "Kırmızı blokları (Review) küçültmek için teslimat süresini optimize etmek en hızlı kâr artış yoludur."
                     ], className="alert alert-light border-0 mb-0 small"),
-                    dcc.Graph(figure=wf_fig, className="mt-2", config={"displayModeBar": False}),
+                    dcc.Graph(id="home_waterfall", figure=wf_fig, className="mt-2", config={"displayModeBar": False}),
                 ]
             ),
             className=SECTION_CARD_CLASS,
@@ -219,4 +276,36 @@ layout = dbc.Container(
     ],
     fluid=True,
     className="pb-5 px-4",
-)
\ No newline at end of file
+)
+
+# -----------------------------
+# Callback (Tarih Filtresi)
+# -----------------------------
+@dash.callback(
+    Output("home_kpi_row", "children"),
+    Output("home_waterfall", "figure"),
+    Output("home_period_line", "children"),
+    Input("home_date_range", "value"),
+    Input("home_categories", "value"),
+    *[Input(f"home_cost_{star}", "value") for star in COST_MAP],
+)
+def update_period(month_range, categories, *costs):
+    # Boş bırakılan maliyet 0 kabul edilir; review maliyeti yıldız histogramları ile yeniden fiyatlanır
+    cost_map = {star: float(cost or 0) for star, cost in zip(COST_MAP, costs)}
+    default_costs = cost_map == COST_MAP
+
+    full_range = not MONTHS or month_range is None or list(month_range) == [0, len(MONTHS) - 1]
+    if full_range and not categories:
+        # Tüm dönem, tüm kategoriler: get_training_data ile hesaplanan mevcut durum
+        if default_costs:
+            return kpi_cards(k), wf_fig, "Tüm dönem"
+        repriced_k = compute_kpis(SELLER.reprice(cost_map, sellers))
+        return kpi_cards(repriced_k), build_waterfall(repriced_k), "Tüm dönem | alternatif review maliyetleri"
+
+    start, end = (None, None) if full_range else (MONTHS[month_range[0]], MONTHS[month_range[1]])
+    period_k = compute_kpis(load_period_sellers(start, end, cost_map, categories or None))
+    period_line = "Tüm dönem" if full_range else f"{start:%Y-%m} — {end:%Y-%m}"
+    if categories:
+        period_line += f" | {len(categories)} kategori"
+    period_line += f" | {period_k['n_sellers']} aktif satıcı"
+    return kpi_cards(period_k), build_waterfall(period_k), period_line
@@ -0,0 +1,204 @@
+import dash
+from dash import html, dcc, Input, Output, Patch, ctx
+import dash_bootstrap_components as dbc
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# Ürün tarafı senaryo motoru (sıralı önek toplamları, bkz. olist/portfolio.py)
+from olist.portfolio import LEVELS, RemovalCurve
+from olist.product_updated import Product
+
+# Sayfa Kaydı
+dash.register_page(__name__, path="/urun-etkisi", name="Ürün Çıkarma Etkisi")
+
+# -----------------------------
+# Styling helpers
+# -----------------------------
+CARD_STYLE = {"borderRadius": "14px"}
+
+LEVEL_LABELS = {"product": "Ürün", "category": "Kategori"}
+
+def brl(x: float) -> str:
+    return f"{x:,.0f} BRL"
+
+def kpi_card(title: str, value: str, subtitle: str = "", icon: str = ""):
+    return dbc.Card(
+        dbc.CardBody(
+            [
+                html.Div(
+                    [
+                        html.Span(icon, style={"fontSize": "18px", "marginRight": "8px"}) if icon else None,
+                        html.Span(title, className="text-muted fw-semibold"),
+                    ],
+                    style={"display": "flex", "alignItems": "center"},
+                ),
+                html.H3(value, className="mt-2 mb-1 fw-bold"),
+                html.Div(subtitle, className="text-muted"),
+            ]
+        ),
+        className="shadow-sm h-100",
+        style=CARD_STYLE,
+    )
+
+# -----------------------------
+# Data load: tüm senaryo eğrisi tek geçişte (ürün ve kategori seviyesi)
+# -----------------------------
+try:
+    CURVES = {level: Product().get_removal_curve(level) for level in LEVELS}
+except Exception:
+    # Veri yüklenemezse boş eğriler (0 birim): sayfa sıfır değerlerle açılır
+    CURVES = {level: RemovalCurve([], [], [], []) for level in LEVELS}
+
+# -----------------------------
+# Figures
+# -----------------------------
+def build_profit_curve_fig(level: str, kept_count: int):
+    curve = CURVES[level]
+    frame = curve.frame()
+    label = LEVEL_LABELS[level]
+
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(x=frame["n_kept"], y=frame["gross_profit"], mode="lines", name="Kâr (IT hariç)", line=dict(color="#6c757d")))
+    fig.add_trace(go.Scattergl(x=frame["n_kept"], y=frame["net_profit"], mode="lines", name="Net Kâr (IT dahil)", line=dict(color="#0d6efd")))
+
+    # İdeal Nokta Yıldızı
+    fig.add_trace(go.Scatter(
+        x=[len(curve) - curve.best_remove],
+        y=[curve.best_net_profit],
+        mode="markers",
+        marker=dict(symbol="star", size=15, color="gold", line=dict(width=1, color="black")),
+        name="İdeal Nokta (Peak Profit)"
+    ))
+
+    fig.add_vline(x=kept_count, line_width=2, line_dash="dash", line_color="red")
+
+    fig.update_layout(
+        title=f"📈 {label} Portföyü Boyutu vs Kârlılık",
+        height=400, margin=dict(l=20, r=20, t=60, b=40),
+        paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)",
+        legend=dict(orientation="h", y=1.1, x=0.02)
+    )
+    return fig
+
+def build_pl_snapshot_fig(totals: dict):
+    dfp = pd.DataFrame({
+        "Kalem": ["Gelir", "Review", "IT/Oper.", "Net Kâr"],
+        "Tutar": [totals["revenue"], -totals["review_cost"], -totals["it_cost"], totals["net_profit"]],
+    })
+    fig = px.bar(dfp, x="Tutar", y="Kalem", orientation="h", text="Tutar", color="Kalem",
+                 color_discrete_map={"Gelir": "#2ecc71", "Review": "#e74c3c", "IT/Oper.": "#e67e22", "Net Kâr": "#3498db"})
+    fig.update_traces(texttemplate="%{text:,.0s} BRL", textposition="outside")
+    fig.update_layout(showlegend=False, height=400, margin=dict(l=10, r=60, t=40, b=40),
+                      paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
+    return fig
+
+# Eğri figürleri başlangıçta bir kez çizilir; slider yalnızca dikey çizgiyi (Patch) taşır
+CURVE_FIGS = {level: build_profit_curve_fig(level, len(curve)) for level, curve in CURVES.items()}
+
+# -----------------------------
+# Layout
+# -----------------------------
+layout = dbc.Container([
+    html.H2("Ürün Çıkarma Etkisi — Senaryo Analizi", className="mt-4 mb-1 fw-bold"),
+    html.P("Net kârı aşağı çeken ürünleri veya kategorileri tespit edip portföyü optimize edin.", className="text-muted mb-3"),
+
+    # İdeal Senaryo Rozeti
+    dbc.Alert(id="product_best_line", color="primary", className="shadow-sm border-0 mb-3", style={"borderRadius": "12px"}),
+
+    dbc.Card(dbc.CardBody([
+        dbc.RadioItems(
+            id="product_level",
+            options=[{"label": LEVEL_LABELS[level], "value": level} for level in LEVELS],
+            value="product", inline=True, className="mb-2",
+        ),
+        html.Div(id="product_slider_label", className="text-muted small"),
+        dcc.Slider(
+            id="remove_products", min=0, max=1, step=1, value=0,
+            tooltip={"placement": "bottom", "always_visible": True},
+        ),
+        html.Div(id="product_scenario_line", className="text-center mt-2 fw-bold text-primary")
+    ]), className="shadow-sm border-0 mb-3", style=CARD_STYLE),
+
+    dbc.Row(id="product_kpi_row", className="g-3 mb-3"),
+
+    dbc.Row([
+        dbc.Col(dcc.Graph(id="product_profit_curve", config={"displayModeBar": False}), md=7),
+        dbc.Col(dcc.Graph(id="product_pl_snapshot", config={"displayModeBar": False}), md=5),
+    ]),
+
+    dbc.Alert(
+        "💡 İpucu: Kategori seviyesinde bir kategori çıkarıldığında, yalnızca o kategoride satış yapan satıcılar da portföyden düşer.",
+        color="info", className="mt-3 shadow-sm border-0", style={"borderRadius": "12px"}
+    )
+], fluid=True)
+
+# -----------------------------
+# Callbacks
+# -----------------------------
+@dash.callback(
+    Output("remove_products", "max"),
+    Output("remove_products", "marks"),
+    Output("remove_products", "value"),
+    Output("product_slider_label", "children"),
+    Output("product_best_line", "children"),
+    Input("product_level", "value"),
+)
+def update_level(level):
+    curve = CURVES[level]
+    label = LEVEL_LABELS[level].lower()
+    total = len(curve)
+    marks = {0: "0", curve.best_remove: {"label": "İDEAL", "style": {"color": "#0d6efd", "fontWeight": "bold"}}, total: str(total)}
+    best_line = html.Div([
+        html.I(className="bi bi-graph-up-arrow me-2"),
+        html.B("Optimum Senaryo: "),
+        f"En düşük performanslı {curve.best_remove} {label} çıkarıldığında Net Kâr ",
+        html.B(brl(curve.best_net_profit)), " seviyesine ulaşarak maksimize ediliyor."
+    ])
+    slider_label = f"🎛️ Senaryo: En düşük performanslı kaç {label} portföyden çıkarılsın?"
+    return total, marks, 0, slider_label, best_line
+
+@dash.callback(
+    Output("product_profit_curve", "figure"),
+    Output("product_pl_snapshot", "figure"),
+    Output("product_scenario_line", "children"),
+    Output("product_kpi_row", "children"),
+    Input("remove_products", "value"),
+    Input("product_level", "value"),
+)
+def update_scenario(remove_n, level):
+    if remove_n is None: remove_n = 0
+
+    # Senaryo = önceden hesaplanmış eğride tek bir indeks
+    curve = CURVES[level]
+    label = LEVEL_LABELS[level].lower()
+    totals = curve.totals(remove_n)
+
+    if "remove_products.value" in ctx.triggered_prop_ids and "product_level.value" not in ctx.triggered_prop_ids:
+        # Sadece slider değişti: figürler yerine dikey çizginin konumu ve çubuk değerleri gönderilir
+        fig_left = Patch()
+        fig_left["layout"]["shapes"][0]["x0"] = totals["n_kept"]
+        fig_left["layout"]["shapes"][0]["x1"] = totals["n_kept"]
+        fig_right = Patch()
+        values = [totals["revenue"], -totals["review_cost"], -totals["it_cost"], totals["net_profit"]]
+        for i, value in enumerate(values):
+            fig_right["data"][i]["x"] = [value]
+            fig_right["data"][i]["text"] = [value]
+    else:
+        fig_left = CURVE_FIGS[level]
+        fig_right = build_pl_snapshot_fig(totals)
+    base = curve.totals(0)
+
+    delta = totals["net_profit"] - base["net_profit"]
+    delta_txt = f"{'+' if delta >= 0 else ''}{brl(delta)}"
+
+    scenario_text = f"🧹 {totals['n_removed']} {label} çıkarıldı | 🏪 {totals['n_sellers']} satıcı kaldı | 📈 Yeni Net Kâr: {brl(totals['net_profit'])}"
+
+    kpis = [
+        dbc.Col(kpi_card("Çıkarılan", f"{totals['n_removed']}", "En kötü performanslı", "🧹"), md=3),
+        dbc.Col(kpi_card("Kalan", f"{totals['n_kept']}", f"Aktif {label} sayısı", "📦"), md=3),
+        dbc.Col(kpi_card("Net Kâr", brl(totals["net_profit"]), "Simüle edilen durum", "📈"), md=3),
+        dbc.Col(kpi_card("Değişim", delta_txt, "Baz duruma kıyasla", "🧭"), md=3),
+    ]
+
+    return fig_left, fig_right, scenario_text, kpis
@@ -1,12 +1,15 @@
+import functools
+
 import dash
-from dash import html, dcc, Input, Output
+from dash import html, dcc, Input, Output, State, Patch
 import dash_bootstrap_components as dbc
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import numpy as np
 
 # Veri çekme sınıfınızı içe aktarın
+from olist.cube import get_sales_cube
+from olist.portfolio import ALPHA, BETA, COMPOSITE, COMPOSITE_WEIGHTS, RANKINGS, it_cost, seller_removal_curve, seller_subset_optimum
 from olist.seller_updated import Seller
 
 # Sayfa Kaydı
@@ -18,10 +21,21 @@ dash.register_page(__name__, path="/satici-etkisi", name="Satıcı Çıkarma Etk
 CARD_STYLE = {"borderRadius": "14px"}
 SECTION_CARD_CLASS = "shadow-sm mt-3"
 
+# Satıcıları sıralayan metrikler (en kötüler önce çıkarılır)
+RANKING_LABELS = {
+    "profits": "Kâr",
+    "review_score": "Ortalama Puan",
+    "share_of_one_stars": "1 Yıldız Oranı",
+    "delay_to_carrier": "Kargoya Teslim Gecikmesi",
+    "wait_time": "Teslimat Süresi",
+    COMPOSITE: "Bileşik Skor",
+}
+DEFAULT_RANKING = "profits"
+
 def brl(x: float) -> str:
     return f"{x:,.0f} BRL"
 
-def kpi_card(title: str, value: str, subtitle: str = "", icon: str = ""):
+def kpi_card(title: str, value: str, subtitle: str = "", icon: str = "", value_id: str | None = None):
     return dbc.Card(
         dbc.CardBody(
             [
@@ -32,7 +46,7 @@ def kpi_card(title: str, value: str, subtitle: str = "", icon: str = ""):
                     ],
                     style={"display": "flex", "alignItems": "center"},
                 ),
-                html.H3(value, className="mt-2 mb-1 fw-bold"),
+                html.H3(value, className="mt-2 mb-1 fw-bold", **({"id": value_id} if value_id else {})),
                 html.Div(subtitle, className="text-muted"),
             ]
         ),
@@ -43,77 +57,143 @@ def kpi_card(title: str, value: str, subtitle: str = "", icon: str = ""):
 # -----------------------------
 # Data load
 # -----------------------------
+SELLER = Seller()
+
 try:
-    SELLERS_DF = Seller().get_training_data().copy()
+    SELLERS_DF = SELLER.get_training_data().copy()
 except Exception:
-    SELLERS_DF = pd.DataFrame(columns=["seller_id", "revenues", "cost_of_reviews", "quantity", "profits"])
+    SELLERS_DF = pd.DataFrame(columns=["seller_id", "revenues", "cost_of_reviews", "quantity", *RANKINGS])
 
-SELLERS_DF["gross_profit"] = SELLERS_DF["revenues"] - SELLERS_DF["cost_of_reviews"]
-SELLERS_ASC = SELLERS_DF.sort_values("gross_profit", ascending=True).reset_index(drop=True)
-SELLERS_DESC = SELLERS_DF.sort_values("gross_profit", ascending=False).reset_index(drop=True)
-TOTAL_SELLERS = int(SELLERS_DF["seller_id"].nunique()) if not SELLERS_DF.empty else 0
+# Dönem ve kategori filtresi: küpteki aylar (slider değerleri ay sırası) ve kategoriler
+try:
+    CUBE = get_sales_cube(SELLER.data)
+    MONTHS = list(CUBE.months)
+    CATEGORIES = [str(category) for category in CUBE.categories]
+except Exception:
+    MONTHS, CATEGORIES = [], []
+MONTH_MARKS = {
+    i: month.strftime("%Y-%m")
+    for i, month in enumerate(MONTHS)
+    if i % 3 == 0 or i == len(MONTHS) - 1
+}
 
 # -----------------------------
-# IT cost (Geliştirilmiş Model)
+# IT cost (Geliştirilmiş Model) — olist/portfolio.py
 # -----------------------------
-ALPHA, BETA = 3157.27, 978.23
-
 def compute_it_cost(n_sellers: int, n_items: int) -> float:
-    return ALPHA * np.sqrt(n_sellers) + BETA * np.sqrt(n_items)
-
-def scenario_totals(df: pd.DataFrame) -> dict:
-    n_sellers = int(df["seller_id"].nunique())
-    n_items = int(df["quantity"].sum())
-    revenue = float(df["revenues"].sum())
-    review_cost = float(df["cost_of_reviews"].sum())
-    gross_profit = float(df["gross_profit"].sum())
-    it_cost = float(compute_it_cost(n_sellers, n_items))
-    net_profit = gross_profit - it_cost
-    return {
-        "n_sellers": n_sellers, "n_items": n_items, "revenue": revenue,
-        "review_cost": review_cost, "gross_profit": gross_profit,
-        "it_cost": it_cost, "net_profit": net_profit,
+    return it_cost(n_sellers, n_items)
+
+# -----------------------------
+# Senaryolar: tüm dönem ve dönem/kategori dilimleri
+# -----------------------------
+def build_scenario(sellers: pd.DataFrame) -> dict:
+    """
+    Bir satıcı kümesinin senaryosu: her sıralama metriği için senaryo eğrisi (sıralama
+    permütasyonu + ters kümülatif toplamlar + vektörize IT maliyeti, O(n log n)), baz
+    toplamlar, önceden çizilmiş eğri figürleri ve alt küme optimumu. Yalnızca kümede
+    bulunan metrikler sıralanır (dönem dilimlerinde gecikme ve teslimat süresi yoktur).
+    """
+    sellers = sellers.copy()
+    sellers["gross_profit"] = sellers["revenues"] - sellers["cost_of_reviews"]
+    weights = {name: weight for name, weight in COMPOSITE_WEIGHTS.items() if name in sellers.columns}
+    curves = {
+        metric: seller_removal_curve(sellers, metric, weights)
+        for metric in RANKING_LABELS
+        if metric in sellers.columns or (metric == COMPOSITE and weights)
+    }
+    scenario = {
+        "sellers": sellers,
+        "total": int(sellers["seller_id"].nunique()) if not sellers.empty else 0,
+        "curves": curves,
+        "subset": seller_subset_optimum(sellers),
     }
+    scenario["base"] = scenario_totals(0, DEFAULT_RANKING, scenario)
+    # Figürler bir kez çizilir; slider yalnızca değişen kısımları (Patch) gönderir
+    scenario["figs"] = {metric: build_profit_curve_fig(scenario["base"]["n_sellers"], metric, scenario) for metric in curves}
+    return scenario
+
+@functools.lru_cache(maxsize=16)
+def period_scenario(start, end, categories: tuple | None) -> dict:
+    # Dönem/kategori dilimi: aylık satıcı x kategori küpünden (get_training_data yeniden çalışmaz)
+    period = SELLER.get_period_summary(start, end, categories)
+    return build_scenario(period[period["seller_id"].isin(SELLERS_DF["seller_id"])])
+
+def get_scenario(scope: dict | None = None) -> dict:
+    """`scope` ({start, end, categories}; None tüm dönem) senaryosu; her dilim bir kez hesaplanır"""
+    if not scope:
+        return ALL_TIME
+    start = pd.Timestamp(scope["start"]) if scope.get("start") else None
+    end = pd.Timestamp(scope["end"]) if scope.get("end") else None
+    return period_scenario(start, end, tuple(scope.get("categories") or ()) or None)
+
+def scenario_metric(metric: str, scenario: dict) -> str:
+    # Dilimde bulunmayan metrik seçiliyse varsayılan sıralama kullanılır
+    return metric if metric in scenario["curves"] else DEFAULT_RANKING
 
-BASE = scenario_totals(SELLERS_DF) if not SELLERS_DF.empty else {}
+def scenario_totals(remove_n: int, metric: str = DEFAULT_RANKING, scenario: dict | None = None) -> dict:
+    """`metric` sıralamasında en kötü `remove_n` satıcı çıkarıldıktan sonraki toplamlar (eğride tek indeks)"""
+    scenario = scenario or ALL_TIME
+    return scenario["curves"][scenario_metric(metric, scenario)].totals(remove_n)
 
 # -----------------------------
 # İdeal Nokta Hesaplama (Optimization)
 # -----------------------------
-def find_optimal_point():
-    """Kârı maksimize eden noktayı önceden hesaplar"""
-    profits = []
-    # Performans için her 10 satıcıda bir örnekle (isteğe bağlı hassaslaştırılabilir)
-    for i in range(0, TOTAL_SELLERS, 10):
-        test_df = SELLERS_ASC.iloc[i:]
-        res = scenario_totals(test_df)
-        profits.append((i, res["net_profit"]))
-    
-    if not profits: return 0, 0
-    best_remove, best_val = max(profits, key=lambda x: x[1])
-    return best_remove, best_val
+def find_optimal_point(metric: str = DEFAULT_RANKING, scenario: dict | None = None):
+    """Kârı maksimize eden kesimi `metric` sıralamasının tüm kesimleri üzerinden tam olarak bulur"""
+    scenario = scenario or ALL_TIME
+    if not scenario["total"]: return 0, 0
+    curve = scenario["curves"][scenario_metric(metric, scenario)]
+    return curve.best_remove, curve.best_net_profit
+
+def best_line(metric: str, scenario: dict | None = None):
+    scenario = scenario or ALL_TIME
+    best_remove, best_net = find_optimal_point(metric, scenario)
+    return html.Div([
+        html.I(className="bi bi-graph-up-arrow me-2"),
+        html.B("Optimum Senaryo: "),
+        f"{RANKING_LABELS[scenario_metric(metric, scenario)]} sıralamasında en düşük performanslı {best_remove} satıcı çıkarıldığında Net Kâr ",
+        html.B(brl(best_net)), " seviyesine ulaşarak maksimize ediliyor."
+    ])
+
+def best_share(metric: str, scenario: dict | None = None):
+    scenario = scenario or ALL_TIME
+    best_remove, _ = find_optimal_point(metric, scenario)
+    share = best_remove / scenario["total"] * 100 if scenario["total"] else 0
+    return [html.B("Altın Oran: "), f"Portföyün %{share:.1f} kadarını temizlemek teknik olarak en kârlı noktadır."]
+
+def subset_note(scenario: dict | None = None):
+    subset = (scenario or ALL_TIME)["subset"]
+    return [html.B("Alt Küme Optimumu: "), f"Satıcılar tek tek seçildiğinde (sıralı kesim yerine) {subset.totals()['n_removed']} satıcı çıkarılarak Net Kâr ",
+            html.B(brl(subset.net_profit)), f" olur; ideal kesime göre fark: +{brl(subset.gap)}."]
 
-BEST_REMOVE_N, BEST_NET_VAL = find_optimal_point()
+def slider_marks(metric: str, scenario: dict | None = None) -> dict:
+    scenario = scenario or ALL_TIME
+    best_remove, _ = find_optimal_point(metric, scenario)
+    return {0: '0', best_remove: {'label': 'İDEAL', 'style': {'color': '#0d6efd', 'fontWeight': 'bold'}}, scenario["total"]: str(scenario["total"])}
+
+def ranking_options(scenario: dict | None = None) -> list:
+    # Dilimde bulunmayan metrikler (gecikme, teslimat süresi) seçilemez
+    curves = (scenario or ALL_TIME)["curves"]
+    return [{"label": label, "value": metric, "disabled": metric not in curves} for metric, label in RANKING_LABELS.items()]
 
 # -----------------------------
 # Figures
 # -----------------------------
-def build_profit_curve_fig(kept_count: int):
-    tmp = SELLERS_DESC.copy()
-    tmp["cum_sellers"] = range(1, len(tmp) + 1)
-    tmp["cum_items"] = tmp["quantity"].cumsum()
-    tmp["cum_gross_profit"] = tmp["revenues"].cumsum() - tmp["cost_of_reviews"].cumsum()
-    tmp["cum_it_cost"] = tmp.apply(lambda r: compute_it_cost(int(r["cum_sellers"]), int(r["cum_items"])), axis=1)
-    tmp["cum_net_profit"] = tmp["cum_gross_profit"] - tmp["cum_it_cost"]
+def build_profit_curve_fig(kept_count: int, metric: str = DEFAULT_RANKING, scenario: dict | None = None):
+    # En iyi satıcılardan başlayarak: k satıcı tutulduğunda kâr (0 satıcı noktası hariç)
+    scenario = scenario or ALL_TIME
+    metric = scenario_metric(metric, scenario)
+    tmp = scenario["curves"][metric].frame().iloc[:-1]
+    best_remove, best_net = find_optimal_point(metric, scenario)
 
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=tmp["cum_sellers"], y=tmp["cum_gross_profit"], mode="lines", name="Kâr (IT hariç)", line=dict(color="#6c757d")))
-    fig.add_trace(go.Scatter(x=tmp["cum_sellers"], y=tmp["cum_net_profit"], mode="lines", name="Net Kâr (IT dahil)", line=dict(color="#0d6efd")))
+    fig.add_trace(go.Scatter(x=tmp["n_kept"], y=tmp["gross_profit"], mode="lines", name="Kâr (IT hariç)", line=dict(color="#6c757d")))
+    fig.add_trace(go.Scatter(x=tmp["n_kept"], y=tmp["net_profit"], mode="lines", name="Net Kâr (IT dahil)", line=dict(color="#0d6efd")))
     
     # İdeal Nokta Yıldızı
     fig.add_trace(go.Scatter(
-        x=[TOTAL_SELLERS - BEST_REMOVE_N], 
-        y=[BEST_NET_VAL],
+        x=[scenario["total"] - best_remove],
+        y=[best_net],
         mode="markers",
         marker=dict(symbol="star", size=15, color="gold", line=dict(width=1, color="black")),
         name="İdeal Nokta (Peak Profit)"
@@ -122,7 +202,7 @@ def build_profit_curve_fig(kept_count: int):
     fig.add_vline(x=kept_count, line_width=2, line_dash="dash", line_color="red")
     
     fig.update_layout(
-        title="📈 Portföy Boyutu vs Kârlılık",
+        title=f"📈 Portföy Boyutu vs Kârlılık ({RANKING_LABELS[metric]} sıralaması)",
         height=400, margin=dict(l=20, r=20, t=60, b=40),
         paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)",
         legend=dict(orientation="h", y=1.1, x=0.02)
@@ -141,6 +221,39 @@ def build_pl_snapshot_fig(totals: dict):
                       paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)")
     return fig
 
+def scenario_texts(totals: dict, scenario: dict | None = None) -> tuple:
+    """Senaryo satırı ve KPI değerleri (çıkarılan, kalan, net kâr, değişim)"""
+    scenario = scenario or ALL_TIME
+    kept_count = totals["n_sellers"]
+    removed_count = scenario["total"] - kept_count
+
+    delta = totals["net_profit"] - scenario["base"]["net_profit"]
+    delta_txt = f"{'+' if delta >= 0 else ''}{brl(delta)}"
+
+    scenario_text = f"🧹 {removed_count} satıcı çıkarıldı | 📈 Yeni Net Kâr: {brl(totals['net_profit'])}"
+    return scenario_text, f"{removed_count}", f"{kept_count}", brl(totals["net_profit"]), delta_txt
+
+# Tüm dönem senaryosu başlangıçta bir kez hesaplanır; metrik değişimi bir sözlük erişimi
+ALL_TIME = build_scenario(SELLERS_DF)
+TOTAL_SELLERS = ALL_TIME["total"]
+BASE = ALL_TIME["base"]
+PROFIT_CURVE_FIG = ALL_TIME["figs"][DEFAULT_RANKING]
+PL_SNAPSHOT_FIG = build_pl_snapshot_fig(BASE)
+BASE_TEXTS = scenario_texts(BASE)
+
+def scenario_arrays(metric: str = DEFAULT_RANKING, scenario: dict | None = None) -> dict:
+    """Tarayıcı modu için kompakt diziler: `metric` sıralamasında k satıcı çıkarıldığında kalan gelir, review maliyeti ve ürün adedi"""
+    scenario = scenario or ALL_TIME
+    curve = scenario["curves"][scenario_metric(metric, scenario)]
+    return {
+        "total": scenario["total"],
+        "revenue": [round(float(x), 2) for x in curve.revenues],
+        "review_cost": [round(float(x), 2) for x in curve.cost_of_reviews],
+        "quantity": [int(x) for x in curve.n_items],
+        "alpha": ALPHA, "beta": BETA,
+        "base_net_profit": scenario["base"]["net_profit"],
+    }
+
 # -----------------------------
 # Layout
 # -----------------------------
@@ -149,30 +262,54 @@ layout = dbc.Container([
     html.P("Net kârı aşağı çeken satıcıları tespit edip portföyü optimize edin.", className="text-muted mb-3"),
 
     # İdeal Senaryo Rozeti
-    dbc.Alert([
-        html.Div([
-            html.I(className="bi bi-graph-up-arrow me-2"),
-            html.B("Optimum Senaryo: "),
-            f"En düşük performanslı {BEST_REMOVE_N} satıcı çıkarıldığında Net Kâr ",
-            html.B(brl(BEST_NET_VAL)), " seviyesine ulaşarak maksimize ediliyor."
-        ])
-    ], color="primary", className="shadow-sm border-0 mb-3", style={"borderRadius": "12px"}),
+    dbc.Alert(best_line(DEFAULT_RANKING), id="best_line", color="primary", className="shadow-sm border-0 mb-3", style={"borderRadius": "12px"}),
+
+    dbc.Card(dbc.CardBody([
+        html.Div("📅 Dönem: Satın alma ayına göre tarih aralığı seçin", className="text-muted small"),
+        dcc.RangeSlider(
+            id="impact_date_range", min=0, max=max(len(MONTHS) - 1, 0), step=1,
+            value=[0, max(len(MONTHS) - 1, 0)], marks=MONTH_MARKS, allowCross=False,
+        ),
+        html.Div("🏷️ Kategori: boş bırakılırsa tüm kategoriler", className="text-muted small mt-2"),
+        dcc.Dropdown(id="impact_categories", options=CATEGORIES, value=[], multi=True, placeholder="Tüm kategoriler"),
+        html.Div("Tüm dönem", id="impact_scope_line", className="text-center mt-2 fw-bold text-primary"),
+        # Seçili dilim (None: tüm dönem, tüm kategoriler)
+        dcc.Store(id="impact_scope"),
+    ]), className="shadow-sm border-0 mb-3", style=CARD_STYLE),
 
     dbc.Card(dbc.CardBody([
+        html.Div("📊 Satıcılar hangi metriğe göre sıralansın?", className="text-muted small"),
+        dbc.RadioItems(
+            id="ranking_metric",
+            options=ranking_options(),
+            value=DEFAULT_RANKING, inline=True, className="mb-2",
+        ),
         html.Div("🎛️ Senaryo: En düşük performanslı kaç satıcıyı portföyden çıkaralım?", className="text-muted small"),
         dcc.Slider(
             id="remove_sellers", min=0, max=TOTAL_SELLERS, step=1, value=0,
             tooltip={"placement": "bottom", "always_visible": True},
-            marks={0: '0', BEST_REMOVE_N: {'label': 'İDEAL', 'style': {'color': '#0d6efd', 'fontWeight': 'bold'}}, TOTAL_SELLERS: str(TOTAL_SELLERS)}
+            marks=slider_marks(DEFAULT_RANKING)
+        ),
+        html.Div(BASE_TEXTS[0], id="scenario_line", className="text-center mt-2 fw-bold text-primary"),
+        dbc.Switch(
+            id="client_mode", value=False, className="mt-2 small text-muted",
+            label="⚡ Tarayıcıda hesapla (senaryo dizileri bir kez indirilir, slider sunucuya istek göndermez)",
         ),
-        html.Div(id="scenario_line", className="text-center mt-2 fw-bold text-primary")
+        # Tarayıcı modu: metrik başına önek toplamı dizileri (her metrik için bir kez doldurulur) ve sunucu modu istekleri
+        dcc.Store(id="scenario_arrays", data={}),
+        dcc.Store(id="scenario_request"),
     ]), className="shadow-sm border-0 mb-3", style=CARD_STYLE),
 
-    dbc.Row(id="kpi_row", className="g-3 mb-3"),
+    dbc.Row([
+        dbc.Col(kpi_card("Çıkarılan", BASE_TEXTS[1], "En kötü performanslı", "🧹", value_id="kpi_removed"), md=3),
+        dbc.Col(kpi_card("Kalan", BASE_TEXTS[2], "Aktif satıcı sayısı", "🏪", value_id="kpi_kept"), md=3),
+        dbc.Col(kpi_card("Net Kâr", BASE_TEXTS[3], "Simüle edilen durum", "📈", value_id="kpi_net_profit"), md=3),
+        dbc.Col(kpi_card("Değişim", BASE_TEXTS[4], "Baz duruma kıyasla", "🧭", value_id="kpi_delta"), md=3),
+    ], id="kpi_row", className="g-3 mb-3"),
 
     dbc.Row([
-        dbc.Col(dcc.Graph(id="profit_curve", config={"displayModeBar": False}), md=7),
-        dbc.Col(dcc.Graph(id="pl_snapshot", config={"displayModeBar": False}), md=5),
+        dbc.Col(dcc.Graph(id="profit_curve", figure=PROFIT_CURVE_FIG, config={"displayModeBar": False}), md=7),
+        dbc.Col(dcc.Graph(id="pl_snapshot", figure=PL_SNAPSHOT_FIG, config={"displayModeBar": False}), md=5),
     ]),
 
     # Stratejik Notlar Bölümü
@@ -183,7 +320,8 @@ layout = dbc.Container([
                 html.Ul([
                     html.Li([html.B("Operasyonel Yük: "), "Zarar eden satıcılar sadece ciro kaybı değil, yüksek 'Review' maliyeti ile Net Kâr'ı eritiyor."]),
                     html.Li([html.B("Ölçek Ekonomisi: "), "IT maliyetleri satıcı sayısı ile doğrusal değil, karekök oranında azalıyor."]),
-                    html.Li([html.B("Altın Oran: "), f"Portföyün %{(BEST_REMOVE_N/TOTAL_SELLERS)*100:.1f} kadarını temizlemek teknik olarak en kârlı noktadır."]),
+                    html.Li(best_share(DEFAULT_RANKING), id="best_share"),
+                    html.Li(subset_note(), id="subset_note"),
                 ])
             ]), className="shadow-sm border-0 mt-3", style=CARD_STYLE),
             md=12
@@ -197,37 +335,164 @@ layout = dbc.Container([
 ], fluid=True)
 
 # -----------------------------
-# Callback
+# Callbacks
 # -----------------------------
+@dash.callback(
+    Output("impact_scope", "data"),
+    Output("impact_scope_line", "children"),
+    Input("impact_date_range", "value"),
+    Input("impact_categories", "value"),
+    prevent_initial_call=True,
+)
+def update_scope(month_range, categories):
+    full_range = not MONTHS or month_range is None or list(month_range) == [0, len(MONTHS) - 1]
+    if full_range and not categories:
+        return None, "Tüm dönem"
+    start, end = (None, None) if full_range else (MONTHS[month_range[0]], MONTHS[month_range[1]])
+    scope = {
+        "start": start.strftime("%Y-%m-%d") if start is not None else None,
+        "end": end.strftime("%Y-%m-%d") if end is not None else None,
+        "categories": sorted(categories or []),
+    }
+    scope_line = "Tüm dönem" if full_range else f"{start:%Y-%m} — {end:%Y-%m}"
+    if categories:
+        scope_line += f" | {len(categories)} kategori"
+    scope_line += f" | {get_scenario(scope)['total']} aktif satıcı"
+    return scope, scope_line
+
+@dash.callback(
+    Output("remove_sellers", "marks"),
+    Output("remove_sellers", "max"),
+    Output("ranking_metric", "options"),
+    Output("best_line", "children"),
+    Output("best_share", "children"),
+    Output("subset_note", "children"),
+    Input("ranking_metric", "value"),
+    Input("impact_scope", "data"),
+    prevent_initial_call=True,
+)
+def update_ranking(metric, scope):
+    # Eğriler dilim başına bir kez hesaplanır: metrik değişimi yalnızca ideal noktanın okunması
+    scenario = get_scenario(scope)
+    return (slider_marks(metric, scenario), scenario["total"], ranking_options(scenario),
+            best_line(metric, scenario), best_share(metric, scenario), subset_note(scenario))
+
+# Slider önce tarayıcıda karşılanır: tarayıcı modunda senaryo burada hesaplanır (sunucuya istek yok),
+# aksi halde değer `scenario_request` üzerinden sunucu callback'ine iletilir. Metrik ve dilim
+# değişimi (eğri figürü yeniden gönderilir) her zaman sunucuda karşılanır.
+dash.clientside_callback(
+    """
+    function(removeN, clientMode, store, metric, scope, curveFig, plFig) {
+        const noUpdate = window.dash_clientside.no_update;
+        const triggered = (window.dash_clientside.callback_context.triggered || []).map((t) => t.prop_id);
+        const fullChange = triggered.includes("ranking_metric.value") || triggered.includes("impact_scope.data");
+        const scopeKey = (s) => s ? [s.start, s.end, (s.categories || []).join("|")].join("/") : "";
+        const sameScope = store && scopeKey(store.scope) === scopeKey(scope);
+        const arrays = sameScope && store[metric];
+        if (!clientMode || !arrays || fullChange) {
+            const request = {remove_n: removeN || 0, metric: metric, scope: scope || null, full: fullChange};
+            return [noUpdate, noUpdate, noUpdate, noUpdate, noUpdate, noUpdate, noUpdate, request];
+        }
+        const fmt = new Intl.NumberFormat("en-US", {maximumFractionDigits: 0});
+        const brl = (x) => fmt.format(x) + " BRL";
+
+        const k = Math.max(0, Math.min(removeN || 0, arrays.total));
+        const kept = arrays.total - k;
+        const revenue = arrays.revenue[k];
+        const reviewCost = arrays.review_cost[k];
+        const itCost = arrays.alpha * Math.sqrt(kept) + arrays.beta * Math.sqrt(arrays.quantity[k]);
+        const netProfit = revenue - reviewCost - itCost;
+        const delta = netProfit - arrays.base_net_profit;
+
+        const left = {...curveFig, layout: {...curveFig.layout}};
+        left.layout.shapes = curveFig.layout.shapes.map((shape, i) => i === 0 ? {...shape, x0: kept, x1: kept} : shape);
+        const values = [revenue, -reviewCost, -itCost, netProfit];
+        const right = {...plFig, data: plFig.data.map((trace, i) => ({...trace, x: [values[i]], text: [values[i]]}))};
+
+        return [
+            left, right,
+            `🧹 ${k} satıcı çıkarıldı | 📈 Yeni Net Kâr: ${brl(netProfit)}`,
+            `${k}`, `${kept}`, brl(netProfit), `${delta >= 0 ? "+" : ""}${brl(delta)}`,
+            noUpdate,
+        ];
+    }
+    """,
+    Output("profit_curve", "figure", allow_duplicate=True),
+    Output("pl_snapshot", "figure", allow_duplicate=True),
+    Output("scenario_line", "children", allow_duplicate=True),
+    Output("kpi_removed", "children", allow_duplicate=True),
+    Output("kpi_kept", "children", allow_duplicate=True),
+    Output("kpi_net_profit", "children", allow_duplicate=True),
+    Output("kpi_delta", "children", allow_duplicate=True),
+    Output("scenario_request", "data"),
+    Input("remove_sellers", "value"),
+    Input("client_mode", "value"),
+    Input("scenario_arrays", "data"),
+    Input("ranking_metric", "value"),
+    Input("impact_scope", "data"),
+    State("profit_curve", "figure"),
+    State("pl_snapshot", "figure"),
+    prevent_initial_call=True,
+)
+
+@dash.callback(
+    Output("scenario_arrays", "data"),
+    Input("client_mode", "value"),
+    Input("ranking_metric", "value"),
+    Input("impact_scope", "data"),
+    State("scenario_arrays", "data"),
+    prevent_initial_call=True,
+)
+def load_scenario_arrays(client_mode, metric, scope, arrays):
+    # Her metriğin dizileri yalnızca ilk ihtiyaç duyulduğunda bir kez gönderilir (Patch ile eklenir);
+    # dilim değişince depo o dilimin dizileriyle baştan kurulur
+    arrays = arrays or {}
+    if not client_mode:
+        raise dash.exceptions.PreventUpdate
+    if arrays.get("scope") != scope:
+        return {"scope": scope, metric: scenario_arrays(metric, get_scenario(scope))}
+    if metric in arrays:
+        raise dash.exceptions.PreventUpdate
+    store = Patch()
+    store[metric] = scenario_arrays(metric, get_scenario(scope))
+    return store
+
 @dash.callback(
     Output("profit_curve", "figure"),
     Output("pl_snapshot", "figure"),
     Output("scenario_line", "children"),
-    Output("kpi_row", "children"),
-    Input("remove_sellers", "value"),
+    Output("kpi_removed", "children"),
+    Output("kpi_kept", "children"),
+    Output("kpi_net_profit", "children"),
+    Output("kpi_delta", "children"),
+    Input("scenario_request", "data"),
+    prevent_initial_call=True,
 )
-def update_scenario(remove_n):
-    if remove_n is None: remove_n = 0
-    
-    kept_df = SELLERS_ASC.iloc[int(remove_n):].copy()
-    totals = scenario_totals(kept_df)
-    
-    kept_count = totals["n_sellers"]
-    removed_count = TOTAL_SELLERS - kept_count
-    
-    fig_left = build_profit_curve_fig(kept_count)
-    fig_right = build_pl_snapshot_fig(totals)
-    
-    delta = totals["net_profit"] - BASE["net_profit"]
-    delta_txt = f"{'+' if delta >= 0 else ''}{brl(delta)}"
-    
-    scenario_text = f"🧹 {removed_count} satıcı çıkarıldı | 📈 Yeni Net Kâr: {brl(totals['net_profit'])}"
-    
-    kpis = [
-        dbc.Col(kpi_card("Çıkarılan", f"{removed_count}", "En kötü performanslı", "🧹"), md=3),
-        dbc.Col(kpi_card("Kalan", f"{kept_count}", "Aktif satıcı sayısı", "🏪"), md=3),
-        dbc.Col(kpi_card("Net Kâr", brl(totals["net_profit"]), "Simüle edilen durum", "📈"), md=3),
-        dbc.Col(kpi_card("Değişim", delta_txt, "Baz duruma kıyasla", "🧭"), md=3),
-    ]
-    
-    return fig_left, fig_right, scenario_text, kpis
\ No newline at end of file
+def update_scenario(request):
+    request = request or {}
+    remove_n = int(request.get("remove_n") or 0)
+    scenario = get_scenario(request.get("scope"))
+    metric = scenario_metric(request.get("metric") or DEFAULT_RANKING, scenario)
+
+    # Eğri dilim başına bir kez hesaplanır: senaryo tek bir indeks, gecikme satıcı sayısından bağımsız
+    totals = scenario_totals(remove_n, metric, scenario)
+
+    if request.get("full"):
+        # Metrik veya dilim değişti: o eğrinin önceden çizilmiş figürü, dikey çizgi mevcut kesimde
+        fig_left = go.Figure(scenario["figs"][metric])
+        fig_left.layout.shapes[0].update(x0=totals["n_sellers"], x1=totals["n_sellers"])
+        return (fig_left, build_pl_snapshot_fig(totals), *scenario_texts(totals, scenario))
+
+    # Sol grafik: yalnızca dikey çizginin konumu
+    fig_left = Patch()
+    fig_left["layout"]["shapes"][0]["x0"] = totals["n_sellers"]
+    fig_left["layout"]["shapes"][0]["x1"] = totals["n_sellers"]
+
+    # Sağ grafik: yalnızca 4 çubuğun değerleri (Gelir, Review, IT/Oper., Net Kâr)
+    fig_right = Patch()
+    values = [totals["revenue"], -totals["review_cost"], -totals["it_cost"], totals["net_profit"]]
+    for i, value in enumerate(values):
+        fig_right["data"][i]["x"] = [value]
+        fig_right["data"][i]["text"] = [value]
+
+    return (fig_left, fig_right, *scenario_texts(totals, scenario))